@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+历史近似重复索引基准测试
+题库按模板批量生成（同一模板、不同数字的题目彼此相似，会形成大的 LSH 桶），逐级扩大题库规模：
+1. LSH 索引查找的延迟（应随题库规模基本不变）
+2. 与逐条计算 Jaccard 的线性扫描对比（只在小规模上实际测量）
+3. 对已入库题目做轻微改写后的召回率，以及全新题目的误判率
+
+用法: python benchmarks/bench_dedup_index.py [--questions 200000] [--db bench_dedup.db] [--keep]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+from typing import List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.database.db_manager import DatabaseManager
+from src.utils.dedup import char_shingles, jaccard
+
+SUBJECTS = ["小明", "小红", "甲车", "乙车", "水池", "工厂", "果园", "商店", "学校", "仓库"]
+TEMPLATES = [
+    "已知二次函数 f(x)=x^2-{a}x+{b}，求其在区间 [{c}, {d}] 上的最小值。",
+    "{s}以每小时 {a} 千米的速度行驶 {b} 小时后又行驶了 {c} 千米，求总路程与平均速度（共用时 {d} 小时）。",
+    "一个长方体的长、宽、高分别为 {a} cm、{b} cm、{c} cm，求它的表面积和体积。",
+    "{s}有 {a} 个苹果，第一天卖出 {b} 个，第二天又运来 {c} 个，第三天卖出 {d} 个，还剩多少个？",
+    "解方程组：{a}x + {b}y = {c}，{d}x - y = {a}。",
+    "等差数列的首项为 {a}，公差为 {b}，求前 {c} 项的和以及第 {d} 项。",
+    "从 {a} 个红球和 {b} 个白球中任取 {c} 个，求恰好有 {d} 个红球的概率。",
+    "证明：对任意正整数 n ≥ {a}，{b}^n > n^{c} 成立（提示：数学归纳法，从 n = {d} 开始）。",
+]
+
+
+def random_question(rng: random.Random) -> str:
+    values = {key: rng.randint(2, 999) for key in "abcd"}
+    return rng.choice(TEMPLATES).format(s=rng.choice(SUBJECTS), **values)
+
+
+def perturb(question: str, rng: random.Random) -> str:
+    """轻微改写：去掉空格与句末标点，并改动一个数字"""
+    question = question.replace(" ", "").rstrip("。？")
+    digits = [i for i, ch in enumerate(question) if ch.isdigit()]
+    i = rng.choice(digits)
+    return question[:i] + str((int(question[i]) + 1) % 10) + question[i + 1:]
+
+
+def _fill(db_manager: DatabaseManager, original_id: int, questions: List[str], batch_size: int = 1000):
+    for i in range(0, len(questions), batch_size):
+        db_manager.insert_generated_questions(
+            original_id, [(question, ["数学"], "计算题") for question in questions[i:i + batch_size]]
+        )
+
+
+def _median_ms(fn, queries: List[str]) -> float:
+    samples = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def run(db_path: str, questions: int, threshold: float, queries: int):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    rng = random.Random(42)
+    db_manager = DatabaseManager(db_path)
+    original_id = db_manager.insert_original_question("种子问题", "思维链", "答案", ["数学"], "计算题")
+    
+    sizes = []
+    size = 10_000
+    while size < questions:
+        sizes.append(size)
+        size *= 10
+    sizes.append(questions)
+    
+    corpus: List[str] = []
+    print(f"{'题库规模':>10}{'建索引':>10}{'LSH 查找':>12}{'线性扫描':>12}{'召回率':>10}{'误判率':>10}")
+    for size in sizes:
+        batch = [random_question(rng) for _ in range(size - len(corpus))]
+        start = time.perf_counter()
+        _fill(db_manager, original_id, batch)
+        build = time.perf_counter() - start
+        corpus.extend(batch)
+        db_manager.get_connection().execute("ANALYZE")
+        
+        sources = [rng.choice(corpus) for _ in range(queries)]
+        near = [perturb(source, rng) for source in sources]
+        fresh = [random_question(rng) for _ in range(queries)]
+        lookup = lambda text: db_manager.find_similar_generated_question(text, threshold)
+        lsh_ms = _median_ms(lookup, near + fresh)
+        
+        # 召回：与原题的相似度确实达到阈值的改写中，被索引找到的比例
+        expected = [text for text, source in zip(near, sources)
+                    if jaccard(char_shingles(text), char_shingles(source)) >= threshold]
+        recall = sum(1 for text in expected if lookup(text)) / max(1, len(expected))
+        false_positive = sum(1 for text in fresh if lookup(text)) / len(fresh)
+        
+        if size <= 10_000:
+            corpus_shingles = [char_shingles(q) for q in corpus]
+            scan = lambda text: max(jaccard(char_shingles(text), s) for s in corpus_shingles)
+            scan_ms = f"{_median_ms(scan, near[:20]):.2f}ms"
+        else:
+            scan_ms = "(跳过)"
+        print(f"{size:>10}{build:>9.1f}s{lsh_ms:>10.2f}ms{scan_ms:>12}{recall:>10.1%}{false_positive:>10.1%}")
+    
+    db_manager.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="历史近似重复索引基准测试")
+    parser.add_argument("--questions", type=int, default=200_000, help="最大题库规模")
+    parser.add_argument("--db", default="bench_dedup.db", help="测试数据库文件（会被覆盖）")
+    parser.add_argument("--threshold", type=float, default=0.8, help="近似重复的相似度阈值")
+    parser.add_argument("--queries", type=int, default=200, help="每个规模下的查询数")
+    parser.add_argument("--keep", action="store_true", help="结束后保留测试数据库")
+    args = parser.parse_args()
+    
+    try:
+        run(args.db, args.questions, args.threshold, args.queries)
+    finally:
+        if not args.keep:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(args.db + suffix):
+                    os.remove(args.db + suffix)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+JSON 容错解析基准测试
+对比旧版 parse_json_response（逐字符清洗 + 正则回退）与单趟修复解析器 loads_tolerant：
+1. 在格式不规范的响应样本（malformed_responses.jsonl）上比较正确性与吞吐量
+2. 在被截断、含大量 LaTeX 反斜杠的思维链上比较最坏情况的耗时增长
+
+用法: python benchmarks/bench_json_repair.py [--repeat 200] [--max-legacy-escapes 22]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import re
+import sys
+import time
+from typing import Any, Callable, Dict
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils.json_repair import loads_tolerant
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "malformed_responses.jsonl")
+
+
+def legacy_parse_json_response(response: str) -> Dict[str, Any]:
+    """旧版 LLMClient.parse_json_response 的实现，仅用于对比"""
+    try:
+        start_idx = response.find('{')
+        end_idx = response.rfind('}') + 1
+        if start_idx != -1 and end_idx != 0:
+            json_str = response[start_idx:end_idx]
+            
+            def _sanitize_for_json(s: str) -> str:
+                out = []
+                in_string = False
+                escape = False
+                for ch in s:
+                    if in_string:
+                        if escape:
+                            out.append(ch)
+                            escape = False
+                        else:
+                            if ch == '\\':
+                                out.append(ch)
+                                escape = True
+                            elif ch == '"':
+                                out.append(ch)
+                                in_string = False
+                            elif ch == '\n':
+                                out.append('\\n')
+                            elif ch == '\r':
+                                continue
+                            else:
+                                out.append(ch)
+                    else:
+                        if ch == '"':
+                            out.append(ch)
+                            in_string = True
+                        else:
+                            out.append(ch)
+                res = ''.join(out)
+                res = re.sub(r',\s*([}\]])', r'\1', res)
+                return res
+            
+            json_str = _sanitize_for_json(json_str)
+            json_str = re.sub(r'\\(?!["\\/bfnrtu])', r'\\\\', json_str)
+            return json.loads(json_str)
+        else:
+            return json.loads(response)
+    except json.JSONDecodeError as e:
+        if '"questions"' in response:
+            matches = re.findall(r'\"question\"\s*:\s*\"([^\"\n\r]*)\"', response)
+            if matches:
+                return {"questions": matches}
+        tc_match = re.search(r'"thinking_chain"\s*:\s*"((?:[^"\\]|\\.|\\[^"])*)"', response, re.DOTALL)
+        ans_match = re.search(r'"answer"\s*:\s*"((?:[^"\\]|\\.|\\[^"])*)"', response, re.DOTALL)
+        if tc_match or ans_match:
+            def _clean_content(s: str) -> str:
+                s = s.replace('\\"', '"')
+                s = s.replace('\\\\', '\\')
+                s = s.replace('\\n', '\n')
+                s = s.replace('\\t', '\t')
+                s = s.replace('\\r', '\r')
+                return s
+            
+            result = {}
+            if tc_match:
+                result['thinking_chain'] = _clean_content(tc_match.group(1))
+            if ans_match:
+                result['answer'] = _clean_content(ans_match.group(1))
+            return result
+        raise e
+
+
+def _meets(result: Any, expect: Dict[str, Any]) -> bool:
+    """检查解析结果是否满足样本的预期（questions_len 表示 questions 数组的长度）"""
+    if not isinstance(result, dict):
+        return False
+    for key, value in expect.items():
+        if key == "questions_len":
+            if len(result.get("questions", [])) != value:
+                return False
+        elif result.get(key) != value:
+            return False
+    return True
+
+
+def _run(parser: Callable[[str], Any], response: str):
+    """执行一次解析，返回 (结果, 异常)"""
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            return parser(response), None
+    except Exception as e:
+        return None, e
+
+
+def _time_per_call(parser: Callable[[str], Any], response: str, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        _run(parser, response)
+    return (time.perf_counter() - start) / repeat
+
+
+def bench_corpus(repeat: int):
+    """样本集：正确性与单次耗时"""
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+    
+    print(f"📊 样本集（{len(cases)} 条，每条重复 {repeat} 次）")
+    print(f"{'样本':<32}{'旧实现':>14}{'新实现':>14}{'加速比':>10}  旧/新是否正确")
+    total_bytes = 0
+    total_legacy = 0.0
+    total_new = 0.0
+    for case in cases:
+        response = case["response"]
+        legacy_ok = _meets(_run(legacy_parse_json_response, response)[0], case["expect"])
+        new_ok = _meets(_run(loads_tolerant, response)[0], case["expect"])
+        legacy_time = _time_per_call(legacy_parse_json_response, response, repeat)
+        new_time = _time_per_call(loads_tolerant, response, repeat)
+        total_bytes += len(response.encode("utf-8"))
+        total_legacy += legacy_time
+        total_new += new_time
+        print(f"{case['name']:<32}{legacy_time * 1e6:>12.1f}µs{new_time * 1e6:>12.1f}µs"
+              f"{legacy_time / new_time:>9.1f}x  {'✅' if legacy_ok else '❌'}/{'✅' if new_ok else '❌'}")
+    
+    mb = total_bytes / 1024 / 1024
+    print(f"吞吐量: 旧实现 {mb / total_legacy:.1f} MB/s，新实现 {mb / total_new:.1f} MB/s")
+
+
+def _worst_case_response(escapes: int) -> str:
+    """被截断的思维链，包含 escapes 个 LaTeX 反斜杠且没有结束引号"""
+    return '{"thinking_chain": "' + "\\a" * escapes + " 未完"
+
+
+def bench_worst_case(max_legacy_escapes: int):
+    """最坏情况：旧实现的回退正则随反斜杠数量指数增长，新实现保持线性"""
+    print()
+    print("📈 最坏情况（截断的 LaTeX 思维链）")
+    print(f"{'反斜杠数':>10}{'旧实现':>14}{'新实现':>14}")
+    for escapes in range(8, max_legacy_escapes + 1, 2):
+        response = _worst_case_response(escapes)
+        legacy_time = _time_per_call(legacy_parse_json_response, response, 1)
+        new_time = _time_per_call(loads_tolerant, response, 1)
+        print(f"{escapes:>10}{legacy_time * 1e3:>12.2f}ms{new_time * 1e3:>12.2f}ms")
+    for escapes in (10_000, 100_000):
+        response = _worst_case_response(escapes)
+        new_time = _time_per_call(loads_tolerant, response, 1)
+        print(f"{escapes:>10}{'(跳过)':>12}{new_time * 1e3:>12.2f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="JSON 容错解析基准测试")
+    parser.add_argument("--repeat", type=int, default=200, help="样本集中每条样本的重复次数")
+    parser.add_argument("--max-legacy-escapes", type=int, default=22,
+                        help="最坏情况测试中旧实现的最大反斜杠数（每增加 2 个耗时约翻 4 倍）")
+    args = parser.parse_args()
+    
+    bench_corpus(args.repeat)
+    bench_worst_case(args.max_legacy_escapes)
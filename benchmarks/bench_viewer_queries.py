@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+查看工具查询基准测试
+在百万级解答的数据库上对比加索引前后 db_viewer 常用查询的延迟：
+1. 旧结构（无索引）+ 旧查询：ORDER BY datetime(created_at) 需要全表扫描再排序
+2. 新结构（DatabaseManager 建立的索引）+ 新查询：LIMIT 结果直接来自索引倒序扫描
+
+用法: python benchmarks/bench_viewer_queries.py [--solutions 1000000] [--db bench_viewer.db] [--keep]
+"""
+
+import argparse
+import json
+import os
+import random
+import sqlite3
+import sys
+import time
+from typing import Callable, List
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.database.db_manager import DatabaseManager
+
+# 旧版建表语句（没有任何索引），与引入索引之前的 init_database 一致
+LEGACY_SCHEMA = """
+CREATE TABLE original_questions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    question TEXT NOT NULL,
+    thinking_chain TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    domain_tags TEXT NOT NULL,
+    question_type TEXT NOT NULL,
+    content_hash TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE generated_questions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    original_question_id INTEGER,
+    question TEXT NOT NULL,
+    domain_tags TEXT NOT NULL,
+    question_type TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (original_question_id) REFERENCES original_questions (id)
+);
+CREATE TABLE question_solutions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    question_id INTEGER NOT NULL,
+    thinking_chain TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    verification_score INTEGER,
+    verification_passed BOOLEAN,
+    verification_feedback TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (question_id) REFERENCES generated_questions (id)
+);
+CREATE VIEW qa_overview AS
+SELECT qs.id AS solution_id, qs.question_id AS question_id, gq.question AS question,
+       qs.thinking_chain AS thinking_chain, qs.answer AS answer, qs.created_at AS created_at
+FROM question_solutions qs
+JOIN generated_questions gq ON qs.question_id = gq.id;
+"""
+
+LEGACY_QA_OVERVIEW = (
+    "SELECT solution_id, question_id, question, thinking_chain, answer, created_at "
+    "FROM qa_overview ORDER BY datetime(created_at) DESC LIMIT 20"
+)
+LEGACY_SOLUTIONS = """
+    SELECT qs.id, qs.question_id, gq.question, qs.thinking_chain, qs.answer, qs.created_at
+    FROM question_solutions qs
+    JOIN generated_questions gq ON qs.question_id = gq.id
+    ORDER BY qs.created_at DESC
+    LIMIT 20
+"""
+LEGACY_BY_ORIGINAL = """
+    SELECT qs.id, qs.question_id, gq.question, qs.thinking_chain, qs.answer, qs.created_at
+    FROM question_solutions qs
+    JOIN generated_questions gq ON qs.question_id = gq.id
+    WHERE gq.original_question_id = ?
+    ORDER BY qs.created_at DESC
+"""
+LEGACY_BY_QUESTION = """
+    SELECT qs.id, qs.question_id, gq.question, qs.thinking_chain, qs.answer
+    FROM question_solutions qs
+    JOIN generated_questions gq ON qs.question_id = gq.id
+    WHERE qs.question_id = ?
+"""
+
+
+def build_database(db_path: str, solutions: int):
+    """按 原始:生成:解答 = 1:5:50 的比例生成测试数据，创建时间按秒递增"""
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(db_path + suffix):
+            os.remove(db_path + suffix)
+    generated = max(1, solutions // 10)
+    originals = max(1, generated // 5)
+
+    print(f"🏗️ 生成测试数据: {originals} 原始问题 / {generated} 生成问题 / {solutions} 解答")
+    start = time.perf_counter()
+    conn = sqlite3.connect(db_path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+    tags = json.dumps(["数学", "代数"], ensure_ascii=False)
+    base = time.mktime((2024, 1, 1, 0, 0, 0, 0, 0, -1))
+
+    def _ts(i: int, total: int) -> str:
+        # 数据跨度约一年，相邻记录的时间可能相同（同一秒内生成多条）
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(base + i * 31_536_000 // total))
+
+    conn.executemany(
+        "INSERT INTO original_questions (id, question, thinking_chain, answer, domain_tags, question_type, created_at) "
+        "VALUES (?, ?, '思维链', '答案', ?, '计算题', ?)",
+        ((i, f"原始问题{i}", tags, _ts(i, originals)) for i in range(1, originals + 1))
+    )
+    conn.executemany(
+        "INSERT INTO generated_questions (id, original_question_id, question, domain_tags, question_type, created_at) "
+        "VALUES (?, ?, ?, ?, '计算题', ?)",
+        ((i, (i - 1) // 5 + 1, f"生成问题{i}：求解方程 x + {i} = 0", tags, _ts(i, generated))
+         for i in range(1, generated + 1))
+    )
+    conn.executemany(
+        "INSERT INTO question_solutions (id, question_id, thinking_chain, answer, created_at) "
+        "VALUES (?, ?, ?, ?, ?)",
+        ((i, (i - 1) // 10 + 1, f"第{i}个解答的思维链：移项得到结果", f"x = -{i}", _ts(i, solutions))
+         for i in range(1, solutions + 1))
+    )
+    conn.commit()
+    conn.close()
+    print(f"   用时 {time.perf_counter() - start:.1f}s")
+
+
+def _time(fn: Callable[[], object], repeat: int) -> float:
+    """多次执行取中位数（毫秒）"""
+    samples: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def _plan(conn: sqlite3.Connection, sql: str, params=()) -> str:
+    return "; ".join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+
+
+def run(db_path: str, solutions: int, repeat: int):
+    build_database(db_path, solutions)
+    generated = max(1, solutions // 10)
+    originals = max(1, generated // 5)
+    rng = random.Random(42)
+    original_id = rng.randint(1, originals)
+    question_id = rng.randint(1, generated)
+
+    conn = sqlite3.connect(db_path)
+    legacy = [
+        ("qa 总览（LIMIT 20）", lambda: conn.execute(LEGACY_QA_OVERVIEW).fetchall(), LEGACY_QA_OVERVIEW, ()),
+        ("全部解答（LIMIT 20）", lambda: conn.execute(LEGACY_SOLUTIONS).fetchall(), LEGACY_SOLUTIONS, ()),
+        ("按原始问题查解答", lambda: conn.execute(LEGACY_BY_ORIGINAL, (original_id,)).fetchall(),
+         LEGACY_BY_ORIGINAL, (original_id,)),
+        ("按生成问题查解答", lambda: conn.execute(LEGACY_BY_QUESTION, (question_id,)).fetchall(),
+         LEGACY_BY_QUESTION, (question_id,)),
+    ]
+    print()
+    print("🐢 加索引前（旧查询）")
+    before = []
+    for name, fn, sql, params in legacy:
+        before.append(_time(fn, repeat))
+        print(f"  {name:<20}{before[-1]:>10.2f}ms  计划: {_plan(conn, sql, params)}")
+    conn.close()
+
+    print()
+    start = time.perf_counter()
+    db_manager = DatabaseManager(db_path)
+    print(f"🔧 建立索引用时 {time.perf_counter() - start:.1f}s")
+    conn = db_manager.get_connection()
+    conn.execute("ANALYZE")
+
+    current = [
+        ("qa 总览（LIMIT 20）", lambda: db_manager.get_qa_overview(limit=20)),
+        ("全部解答（LIMIT 20）", lambda: db_manager.get_all_solutions_with_questions(limit=20)),
+        ("按原始问题查解答", lambda: db_manager.get_all_solutions_with_questions(original_id)),
+        ("按生成问题查解答", lambda: db_manager.get_question_solutions(question_id)),
+    ]
+    print()
+    print("🚀 加索引后（新查询，含构造结果对象的开销）")
+    print(f"  {'查询':<20}{'之前':>10}{'之后':>12}{'加速比':>10}")
+    for (name, fn), old in zip(current, before):
+        new = _time(fn, repeat)
+        print(f"  {name:<20}{old:>8.2f}ms{new:>10.2f}ms{old / new:>9.0f}x")
+    print()
+    print("  qa 总览的查询计划: " + _plan(
+        conn,
+        "SELECT solution_id FROM qa_overview ORDER BY created_at DESC, solution_id DESC LIMIT 20"
+    ))
+    db_manager.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="查看工具查询基准测试")
+    parser.add_argument("--solutions", type=int, default=1_000_000, help="解答数量")
+    parser.add_argument("--db", default="bench_viewer.db", help="测试数据库文件（会被覆盖）")
+    parser.add_argument("--repeat", type=int, default=5, help="每个查询的重复次数（取中位数）")
+    parser.add_argument("--keep", action="store_true", help="结束后保留测试数据库")
+    args = parser.parse_args()
+
+    try:
+        run(args.db, args.solutions, args.repeat)
+    finally:
+        if not args.keep:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(args.db + suffix):
+                    os.remove(args.db + suffix)
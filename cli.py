@@ -107,6 +107,23 @@ def run_from_file(file_path):
         print(f"❌ 错误: {e}")
 
 
+def run_batch(file_path, workers=None, resume=True):
+    """批量运行 JSONL 文件（每行一条 question/thinking_chain/answer 记录）"""
+    print(f"📦 批量运行: {file_path}")
+    
+    if not os.path.exists(file_path):
+        print(f"❌ 错误: 找不到文件 {file_path}")
+        return
+    
+    from src.batch import BatchRunner
+    
+    runner = BatchRunner(workers=workers)
+    stats = runner.run(file_path, resume=resume)
+    
+    print(f"\n💾 结果已保存到: {stats['output_path']}")
+    print(f"🧾 进度已记录到: {stats['progress_path']}（重新运行同一命令即可断点续跑）")
+
+
 def display_results(results):
     """显示结果"""
     if "error" in results:
@@ -177,6 +194,12 @@ def main():
                        help="交互模式运行")
     parser.add_argument("-f", "--file", type=str, 
                        help="从JSON文件读取输入")
+    parser.add_argument("-b", "--batch", type=str,
+                       help="从JSONL文件批量读取输入（每行一条记录）")
+    parser.add_argument("-w", "--workers", type=int,
+                       help="批量模式下并发运行的工作流数量（默认读取 BATCH_WORKERS，否则为4）")
+    parser.add_argument("--restart", action="store_true",
+                       help="批量模式下忽略已有进度，从头开始处理")
     parser.add_argument("--create-sample", action="store_true",
                        help="创建示例输入文件")
     
@@ -188,11 +211,14 @@ def main():
         run_interactive()
     elif args.file:
         run_from_file(args.file)
+    elif args.batch:
+        run_batch(args.batch, workers=args.workers, resume=not args.restart)
     else:
         print("🤖 问题生成工作流CLI工具")
         print("\n使用方法:")
         print("  python cli.py -i                    # 交互模式")
         print("  python cli.py -f input.json         # 从文件运行")
+        print("  python cli.py -b input.jsonl -w 8   # 批量运行JSONL（支持断点续跑）")
         print("  python cli.py --create-sample       # 创建示例文件")
         print("\n更多信息请使用: python cli.py --help")
 
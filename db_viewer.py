@@ -3,9 +3,11 @@
 用于查看和分析存储的问题和解答数据
 """
 
+import gzip
 import json
-import sqlite3
+import time
 from datetime import datetime
+from typing import Optional, Tuple
 from src.database.db_manager import DatabaseManager
 
 
@@ -15,15 +17,15 @@ class DatabaseViewer:
     def __init__(self, db_path: str = "questions.db"):
         self.db_manager = DatabaseManager(db_path)
     
-    def show_all_solutions_with_questions(self):
-        """显示所有解答及其对应的问题"""
+    def show_all_solutions_with_questions(self, page_size: int = 20, after_id: Optional[int] = None):
+        """分页显示解答及其对应的问题（最新在前），after_id 为上一页最后一条解答的ID"""
         print("📚 所有问题解答（包含问题内容）")
         print("=" * 80)
         
-        solutions = self.db_manager.get_all_solutions_with_questions()
+        solutions = self.db_manager.get_solutions_page(after_id=after_id, limit=page_size)
         
         if not solutions:
-            print("暂无数据")
+            print("暂无数据" if after_id is None else "没有更多数据")
             return
         
         for i, solution in enumerate(solutions, 1):
@@ -33,6 +35,9 @@ class DatabaseViewer:
             print(f"✅ 答案: {solution.answer}")
             print(f"⏰ 创建时间: {solution.created_at}")
             print("-" * 60)
+        
+        if len(solutions) == page_size:
+            print(f"\n➡️ 下一页: python db_viewer.py solutions {page_size} {solutions[-1].id}")
     
     def show_solution_with_full_context(self, solution_id: int):
         """显示解答的完整上下文"""
@@ -68,7 +73,7 @@ class DatabaseViewer:
         print("📊 数据库统计")
         print("=" * 50)
         
-        with sqlite3.connect(self.db_manager.db_path) as conn:
+        with self.db_manager.get_connection() as conn:
             cursor = conn.cursor()
             
             # 统计原始问题数量
@@ -82,19 +87,9 @@ class DatabaseViewer:
             # 统计解答数量
             cursor.execute("SELECT COUNT(*) FROM question_solutions")
             solution_count = cursor.fetchone()[0]
-            
-            # 统计领域分布
-            cursor.execute("SELECT domain_tags FROM original_questions")
-            tags_data = cursor.fetchall()
-            
-            all_tags = []
-            for tags_str in tags_data:
-                tags = json.loads(tags_str[0])
-                all_tags.extend(tags)
-            
-            tag_counts = {}
-            for tag in all_tags:
-                tag_counts[tag] = tag_counts.get(tag, 0) + 1
+        
+        # 统计领域分布（在标签关联表上聚合，无需逐行解析 domain_tags）
+        tag_counts = self.db_manager.get_tag_counts()
         
         print(f"📝 原始问题: {original_count}")
         print(f"🔄 生成问题: {generated_count}")
@@ -102,36 +97,111 @@ class DatabaseViewer:
         
         if tag_counts:
             print(f"\n🏷️ 领域分布:")
-            for tag, count in sorted(tag_counts.items(), key=lambda x: x[1], reverse=True):
+            for tag, count in tag_counts:
                 print(f"  {tag}: {count}")
     
+    def show_questions_with_tag(self, tag: str, limit: int = 20):
+        """显示带有指定领域标签的问题数量与最近生成的问题"""
+        original_count, generated_count = self.db_manager.count_questions_with_tag(tag)
+        print(f"🏷️ 标签「{tag}」: 原始问题 {original_count} 道，生成问题 {generated_count} 道")
+        print("=" * 80)
+        
+        questions = self.db_manager.get_generated_questions_by_tag(tag, limit=limit)
+        if not questions:
+            print("暂无数据")
+            return
+        
+        for i, question in enumerate(questions, 1):
+            print(f"{i}. 问题ID: {question.id} | {question.question_type} | {', '.join(question.domain_tags)}")
+            print(f"📝 {question.question}")
+            print("-" * 60)
+    
+    @staticmethod
+    def _export_record(row: Tuple[int, int, str, str, str, str]) -> dict:
+        solution_id, question_id, question, thinking_chain, answer, created_at = row
+        return {
+            "solution_id": solution_id,
+            "question_id": question_id,
+            "question": question,
+            "thinking_chain": thinking_chain,
+            "answer": answer,
+            "created_at": datetime.fromisoformat(created_at).isoformat() if created_at else None
+        }
+    
+    @staticmethod
+    def _open_export(filename: str):
+        """以 .gz 结尾的文件名按 gzip 压缩写入"""
+        if filename.endswith(".gz"):
+            return gzip.open(filename, "wt", encoding="utf-8")
+        return open(filename, "w", encoding="utf-8")
+    
     def export_to_json(self, filename: str = "database_export.json"):
-        """导出数据到JSON文件"""
+        """导出数据到JSON文件
+        
+        逐条流式写出，格式与一次性 json.dump 相同，内存占用与数据量无关；
+        导出范围固定为开始导出时已存在的解答。
+        """
         print(f"💾 导出数据到 {filename}")
         
-        solutions = self.db_manager.get_all_solutions_with_questions()
+        max_id = self.db_manager.get_max_solution_id()
+        total = self.db_manager.count_solutions(max_id)
         
-        export_data = {
-            "export_time": datetime.now().isoformat(),
-            "total_solutions": len(solutions),
-            "solutions": []
-        }
+        with self._open_export(filename) as f:
+            f.write("{\n")
+            f.write(f'  "export_time": {json.dumps(datetime.now().isoformat())},\n')
+            f.write(f'  "total_solutions": {total},\n')
+            f.write('  "solutions": [')
+            count = 0
+            for row in self.db_manager.iter_solution_rows(max_id=max_id):
+                item = json.dumps(self._export_record(row), ensure_ascii=False, indent=2)
+                f.write(",\n" if count else "\n")
+                f.write("\n".join("    " + line for line in item.splitlines()))
+                count += 1
+            f.write("\n  ]\n}" if count else "]\n}")
         
-        for solution in solutions:
-            export_data["solutions"].append({
-                "solution_id": solution.id,
-                "question_id": solution.question_id,
-                "question": solution.question,
-                "thinking_chain": solution.thinking_chain,
-                "answer": solution.answer,
-                "created_at": solution.created_at.isoformat() if solution.created_at else None
-            })
+        print(f"✅ 成功导出 {count} 条解答数据")
+    
+    def export_to_jsonl(self, filename: str = "database_export.jsonl"):
+        """流式导出为 JSON Lines（每行一条解答），文件名以 .gz 结尾时 gzip 压缩"""
+        print(f"💾 导出数据到 {filename}")
         
-        with open(filename, "w", encoding="utf-8") as f:
-            json.dump(export_data, f, ensure_ascii=False, indent=2)
+        count = 0
+        with self._open_export(filename) as f:
+            for row in self.db_manager.iter_solution_rows(max_id=self.db_manager.get_max_solution_id()):
+                f.write(json.dumps(self._export_record(row), ensure_ascii=False))
+                f.write("\n")
+                count += 1
         
-        print(f"✅ 成功导出 {len(solutions)} 条解答数据")
-
+        print(f"✅ 成功导出 {count} 条解答数据")
+    
+    def search(self, query: str, limit: int = 20):
+        """全文搜索问题、思维链与答案，按相关度显示命中"""
+        start = time.perf_counter()
+        try:
+            hits = self.db_manager.search(query, limit=limit)
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            return
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"🔎 搜索「{query}」: {len(hits)} 条结果 ({elapsed:.1f}ms)")
+        print("=" * 80)
+        if not hits:
+            print("暂无数据" if self.db_manager.fts_enabled else "当前 SQLite 不支持 FTS5，无法搜索")
+            return
+        
+        labels = {"original_question": "原始问题", "generated_question": "生成问题", "solution": "解答"}
+        for i, hit in enumerate(hits, 1):
+            print(f"{i}. {labels[hit['type']]} ID: {hit['id']}")
+            print(f"   {hit['snippet']}")
+        print("\n💡 查看解答的完整上下文: python db_viewer.py context <解答ID>")
+    
+    def rebuild_dedup_index(self):
+        """重建生成问题的近似重复（LSH）索引"""
+        print("🔧 重建近似重复索引...")
+        start = time.perf_counter()
+        count = self.db_manager.rebuild_dedup_index()
+        print(f"✅ 已为 {count} 道生成问题建立索引 ({time.perf_counter() - start:.1f}s)")
+    
     def show_qa_overview(self, limit: int | None = None):
         """显示 QA 总览（问题/思维链/答案）"""
         data = self.db_manager.get_qa_overview(limit=limit)
@@ -158,10 +228,13 @@ def main():
         print("📚 数据库查看工具")
         print("使用方法:")
         print("  python db_viewer.py stats              - 显示统计信息")
-        print("  python db_viewer.py solutions          - 显示所有解答")
+        print("  python db_viewer.py solutions [n] [id] - 分页显示解答（每页 n 条，从解答 id 之后开始）")
         print("  python db_viewer.py context <id>       - 显示解答的完整上下文")
-        print("  python db_viewer.py export [filename]  - 导出数据到JSON")
+        print("  python db_viewer.py export [filename]  - 导出数据到JSON（.jsonl 为逐行格式，.gz 结尾时压缩）")
         print("  python db_viewer.py qa [limit]         - 显示问题/思维链/答案总览")
+        print("  python db_viewer.py tag <name> [limit] - 显示带有指定领域标签的问题")
+        print("  python db_viewer.py search <关键词>... - 全文搜索问题、思维链与答案（多个关键词需同时出现）")
+        print("  python db_viewer.py dedup-rebuild      - 重建生成问题的近似重复索引")
         return
     
     command = sys.argv[1]
@@ -169,7 +242,13 @@ def main():
     if command == "stats":
         viewer.show_statistics()
     elif command == "solutions":
-        viewer.show_all_solutions_with_questions()
+        try:
+            page_size = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+            after_id = int(sys.argv[3]) if len(sys.argv) > 3 else None
+        except ValueError:
+            print("每页条数与解答ID必须是数字")
+            return
+        viewer.show_all_solutions_with_questions(page_size, after_id)
     elif command == "context":
         if len(sys.argv) < 3:
             print("请提供解答ID")
@@ -181,7 +260,10 @@ def main():
             print("解答ID必须是数字")
     elif command == "export":
         filename = sys.argv[2] if len(sys.argv) > 2 else "database_export.json"
-        viewer.export_to_json(filename)
+        if filename.endswith((".jsonl", ".jsonl.gz")):
+            viewer.export_to_jsonl(filename)
+        else:
+            viewer.export_to_json(filename)
     elif command == "qa":
         limit = None
         if len(sys.argv) > 2:
@@ -190,6 +272,23 @@ def main():
             except ValueError:
                 limit = None
         viewer.show_qa_overview(limit)
+    elif command == "search":
+        if len(sys.argv) < 3:
+            print("请提供搜索关键词")
+            return
+        viewer.search(" ".join(sys.argv[2:]))
+    elif command == "tag":
+        if len(sys.argv) < 3:
+            print("请提供标签名称")
+            return
+        try:
+            limit = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+        except ValueError:
+            print("条数必须是数字")
+            return
+        viewer.show_questions_with_tag(sys.argv[2], limit)
+    elif command == "dedup-rebuild":
+        viewer.rebuild_dedup_index()
     else:
         print(f"未知命令: {command}")
 
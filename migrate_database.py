@@ -7,6 +7,9 @@
 import sqlite3
 import os
 
+from src.database.db_manager import DatabaseManager
+from src.utils.text_utils import question_content_hash
+
 
 def migrate_database(db_path: str = "questions.db"):
     """迁移数据库结构"""
@@ -57,8 +60,58 @@ def migrate_database(db_path: str = "questions.db"):
                 else:
                     print(f"❌ 添加 question_solutions.{field_name} 字段失败: {e}")
         
+        # 为 original_questions 表添加 content_hash 字段，用于复用已有标签
+        try:
+            cursor.execute("ALTER TABLE original_questions ADD COLUMN content_hash TEXT")
+            print("✅ 为 original_questions 表添加 content_hash 字段")
+        except sqlite3.OperationalError as e:
+            if "duplicate column name" in str(e):
+                print("ℹ️ original_questions.content_hash 字段已存在")
+            else:
+                print(f"❌ 添加 original_questions.content_hash 字段失败: {e}")
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_original_questions_content_hash ON original_questions (content_hash)"
+        )
+        
+        # 回填存量原始问题的内容哈希
+        cursor.execute("SELECT id, question, thinking_chain, answer FROM original_questions WHERE content_hash IS NULL")
+        rows = cursor.fetchall()
+        cursor.executemany(
+            "UPDATE original_questions SET content_hash = ? WHERE id = ?",
+            [(question_content_hash(q, tc, a), row_id) for row_id, q, tc, a in rows]
+        )
+        if rows:
+            print(f"✅ 回填 {len(rows)} 条原始问题的 content_hash")
+        
+        # 创建 问题↔领域标签 关联表，并用 domain_tags 回填存量问题（SQL 端展开 JSON，已存在的关联跳过）
+        DatabaseManager.create_tag_tables(cursor)
+        for table, parent in (("original_question_tags", "original_questions"),
+                              ("generated_question_tags", "generated_questions")):
+            cursor.execute(f"""
+                INSERT OR IGNORE INTO {table} (tag, question_id)
+                SELECT tags.value, q.id
+                FROM {parent} q, json_each(q.domain_tags) tags
+                WHERE json_valid(q.domain_tags) AND tags.type = 'text'
+            """)
+            if cursor.rowcount > 0:
+                print(f"✅ 回填 {cursor.rowcount} 条 {table} 标签关联")
+        
+        # 创建生成问题的 LSH 分桶表，为尚未建立索引的存量问题补建（历史近似重复检测使用）
+        DatabaseManager.create_dedup_table(cursor)
+        indexed = DatabaseManager.backfill_dedup_index(cursor)
+        if indexed:
+            print(f"✅ 为 {indexed} 道生成问题建立近似重复索引")
+        
         conn.commit()
-        print("🎉 数据库迁移完成！")
+    
+    # 为已有数据建立全文索引：打开数据库时只创建索引表与触发器，存量数据在这里重建（数据量大时耗时较长）
+    db_manager = DatabaseManager(db_path)
+    try:
+        for table in db_manager.rebuild_fts_index():
+            print(f"✅ 用已有数据建立全文索引 {table}")
+    finally:
+        db_manager.close()
+    print("🎉 数据库迁移完成！")
 
 
 if __name__ == "__main__":
@@ -1,56 +1,108 @@
+import asyncio
 import json
-from typing import List
-from ..models.schemas import WorkflowState, TaggedQuestion, GeneratedQuestion, QuestionSolution, VerificationResult
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple, Union
+from ..models.schemas import (
+    WorkflowState, QuestionInput, TaggedQuestion, GeneratedQuestion, QuestionSolution, VerificationResult,
+    TaggingResponse, GeneratedQuestionItem, GenerationResponse, SolutionResponse, VerificationResponse
+)
 from ..prompts.prompt_manager import PromptManager
-from ..utils.llm_client import LLMClient
-from ..database.db_manager import DatabaseManager
+from ..utils.llm_client import get_llm_client, get_async_llm_client
+from ..utils.json_stream import StreamingJSONArrayParser
+from ..utils.text_utils import extract_partial_json_string
+from ..utils.dedup import NearDuplicateFilter
+from ..database.db_manager import DatabaseManager, UnitOfWork, get_db_manager
 
 
 class QuestionTaggingAgent:
     """问题标签识别代理"""
     
     def __init__(self):
-        self.llm_client = LLMClient()
+        self.llm_client = get_llm_client()
+        self.async_llm_client = get_async_llm_client()
         self.prompt_manager = PromptManager()
+        self.db_manager = get_db_manager()
+    
+    def _find_stored_tags(self, input_question: Optional[QuestionInput]) -> Optional[Tuple[List[str], str]]:
+        """查找同一种子问题（规范化后内容相同）已保存的标签，命中时可跳过LLM调用"""
+        if not input_question:
+            raise ValueError("输入问题为空")
+        
+        return self.db_manager.find_original_question_tags(
+            input_question.question,
+            input_question.thinking_chain,
+            input_question.answer
+        )
+    
+    def _build_messages(self, input_question: QuestionInput) -> List[Dict[str, str]]:
+        """生成标签识别的对话消息"""
+        prompt = self.prompt_manager.get_tagging_prompt(
+            input_question.question,
+            input_question.thinking_chain,
+            input_question.answer
+        )
+        return [{"role": "user", "content": prompt}]
+    
+    def _parse_tags(self, response: str) -> Tuple[List[str], str]:
+        """解析标签识别结果"""
+        result = self.llm_client.parse_structured(response, TaggingResponse)
+        return result.domain_tags, result.question_type
+    
+    @staticmethod
+    def _apply_tags(state: WorkflowState, domain_tags: List[str], question_type: str) -> WorkflowState:
+        """创建带标签的问题并写入状态"""
+        input_question = state.input_question
+        tagged_question = TaggedQuestion(
+            question=input_question.question,
+            thinking_chain=input_question.thinking_chain,
+            answer=input_question.answer,
+            domain_tags=domain_tags,
+            question_type=question_type
+        )
+        
+        state.tagged_question = tagged_question
+        state.current_step = "tagged"
+        
+        print(f"问题标签识别完成: 领域标签={domain_tags}, 题型={question_type}")
+        return state
     
     def tag_question(self, state: WorkflowState) -> WorkflowState:
         """为问题打标签"""
         try:
-            input_question = state.input_question
-            if not input_question:
-                raise ValueError("输入问题为空")
-            
-            # 生成标签识别提示词
-            prompt = self.prompt_manager.get_tagging_prompt(
-                input_question.question,
-                input_question.thinking_chain,
-                input_question.answer
-            )
+            stored = self._find_stored_tags(state.input_question)
+            if stored:
+                print("♻️ 该问题已打过标签，复用已保存的标签")
+                return self._apply_tags(state, *stored)
             
             # 调用LLM进行标签识别
-            messages = [{"role": "user", "content": prompt}]
-            response = self.llm_client.chat_completion(messages)
-            
-            # 解析响应
-            result = self.llm_client.parse_json_response(response)
-            domain_tags = result.get("domain_tags", [])
-            question_type = result.get("question_type", "简答题")
-            
-            # 创建带标签的问题
-            tagged_question = TaggedQuestion(
-                question=input_question.question,
-                thinking_chain=input_question.thinking_chain,
-                answer=input_question.answer,
-                domain_tags=domain_tags,
-                question_type=question_type
+            messages = self._build_messages(state.input_question)
+            response = self.llm_client.chat_completion(
+                messages, json_mode=True, agent="tagging", response_model=TaggingResponse
             )
-            
-            state.tagged_question = tagged_question
-            state.current_step = "tagged"
-            
-            print(f"问题标签识别完成: 领域标签={domain_tags}, 题型={question_type}")
+            return self._apply_tags(state, *self._parse_tags(response))
+        
+        except Exception as e:
+            state.error = f"标签识别失败: {str(e)}"
+            print(f"标签识别错误: {e}")
             return state
+    
+    async def atag_question(self, state: WorkflowState) -> WorkflowState:
+        """为问题打标签（异步）"""
+        try:
+            stored = await asyncio.to_thread(self._find_stored_tags, state.input_question)
+            if stored:
+                print("♻️ 该问题已打过标签，复用已保存的标签")
+                return self._apply_tags(state, *stored)
             
+            # 调用LLM进行标签识别
+            messages = self._build_messages(state.input_question)
+            response = await self.async_llm_client.chat_completion(
+                messages, json_mode=True, agent="tagging", response_model=TaggingResponse
+            )
+            return self._apply_tags(state, *self._parse_tags(response))
+        
         except Exception as e:
             state.error = f"标签识别失败: {str(e)}"
             print(f"标签识别错误: {e}")
@@ -61,88 +113,463 @@ class QuestionGenerationAgent:
     """问题生成代理"""
     
     def __init__(self):
-        self.llm_client = LLMClient()
+        self.llm_client = get_llm_client()
+        self.async_llm_client = get_async_llm_client()
         self.prompt_manager = PromptManager()
-        self.db_manager = DatabaseManager()
+        self.db_manager = get_db_manager()
+        # 流式生成：questions 数组中每道题一完整到达就立即入库并交给回调（如提交解答）
+        self.streaming = os.getenv("GENERATION_STREAMING", "false").lower() in ("1", "true", "yes")
+        # 近似重复过滤：与本次已保留问题的字符 n-gram 相似度达到阈值的问题在入库和解答之前丢弃
+        self.dedup_enabled = os.getenv("DEDUP_ENABLED", "true").lower() in ("1", "true", "yes")
+        self.dedup_threshold = float(os.getenv("DEDUP_THRESHOLD", "0.8"))
+        # 同时与数据库中已有解答的历史生成问题比较（LSH 索引查找），重复出现的问题不再入库和解答；
+        # 默认关闭：开启响应缓存（LLM_CACHE_ENABLED）后重跑同一种子会拿回相同的生成结果，全部题目都会与上次运行重复
+        self.dedup_history = os.getenv("DEDUP_HISTORY", "false").lower() in ("1", "true", "yes")
+    
+    def _save_original_question(self, tagged_question: Optional[TaggedQuestion]) -> int:
+        """保存原始问题到数据库"""
+        if not tagged_question:
+            raise ValueError("标签问题为空")
+        
+        return self.db_manager.insert_original_question(
+            tagged_question.question,
+            tagged_question.thinking_chain,
+            tagged_question.answer,
+            tagged_question.domain_tags,
+            tagged_question.question_type
+        )
+    
+    def _build_messages(self, tagged_question: TaggedQuestion) -> List[Dict[str, str]]:
+        """生成问题生成的对话消息"""
+        prompt = self.prompt_manager.get_question_generation_prompt(
+            tagged_question.domain_tags,
+            tagged_question.question_type,
+            tagged_question.question,
+            tagged_question.thinking_chain,
+            tagged_question.answer
+        )
+        return [{"role": "user", "content": prompt}]
+    
+    @staticmethod
+    def _question_row(tagged_question: TaggedQuestion, question_data) -> Tuple[str, List[str], str]:
+        """单道生成结果的 (问题, 领域标签, 题型)
+        
+        题型采用模型返回的值，与原题题型不一致时输出提示；缺省的标签与题型沿用原问题
+        """
+        if isinstance(question_data, GeneratedQuestionItem):
+            domain_tags = question_data.domain_tags if question_data.domain_tags is not None \
+                else tagged_question.domain_tags
+            question_type = question_data.question_type or tagged_question.question_type
+            if question_type != tagged_question.question_type:
+                print(f"⚠️ 生成问题的题型（{question_type}）与原题（{tagged_question.question_type}）不一致: "
+                      f"{question_data.question[:30]}")
+            return question_data.question, domain_tags, question_type
+        # 兼容旧格式（纯字符串）
+        return str(question_data), tagged_question.domain_tags, tagged_question.question_type
+    
+    @staticmethod
+    def _to_generated_question(question_id: int, original_id: int,
+                               row: Tuple[str, List[str], str]) -> GeneratedQuestion:
+        question_text, domain_tags, question_type = row
+        return GeneratedQuestion(
+            id=question_id,
+            original_question_id=original_id,
+            question=question_text,
+            domain_tags=domain_tags,
+            question_type=question_type
+        )
     
-    def generate_questions(self, state: WorkflowState) -> WorkflowState:
-        """生成相似问题"""
+    def _new_dedup_filter(self) -> Optional[NearDuplicateFilter]:
+        return NearDuplicateFilter(self.dedup_threshold) if self.dedup_enabled else None
+    
+    def _is_duplicate(self, dedup: Optional[NearDuplicateFilter], row: Tuple[str, List[str], str]) -> bool:
+        """检查问题是否与历史问题或本次已保留的问题近似重复，重复时输出提示"""
+        if dedup is None:
+            return False
+        if self.dedup_history:
+            # 只与已有解答的问题比较：此前运行失败、尚未解答的问题重跑时仍会重新解答
+            similar = self.db_manager.find_similar_generated_question(row[0], dedup.threshold, solved_only=True)
+            if similar is not None:
+                dedup.dropped += 1
+                dedup.history_dropped += 1
+                print(f"🧹 丢弃与历史问题 #{similar[0]} 近似重复的问题（相似度 {similar[1]:.2f}）: {row[0][:40]}")
+                return True
+        match = dedup.check_and_add(row[0])
+        if match is None:
+            return False
+        index, similarity = match
+        print(f"🧹 丢弃近似重复的问题（与第 {index + 1} 道相似度 {similarity:.2f}）: {row[0][:40]}")
+        return True
+    
+    def _save_generated_question(self, tagged_question: TaggedQuestion, original_id: int, question_data,
+                                 dedup: Optional[NearDuplicateFilter] = None) -> Optional[GeneratedQuestion]:
+        """创建单道生成的问题对象并保存到数据库，近似重复时不保存并返回 None"""
+        row = self._question_row(tagged_question, question_data)
+        if self._is_duplicate(dedup, row):
+            return None
+        question_id = self.db_manager.insert_generated_question(original_id, *row)
+        return self._to_generated_question(question_id, original_id, row)
+    
+    def _save_generated_questions(self, tagged_question: TaggedQuestion, original_id: int, response: str,
+                                  start: int = 0, dedup: Optional[NearDuplicateFilter] = None) -> List[GeneratedQuestion]:
+        """解析生成结果，创建生成的问题对象并在一个事务内批量保存（跳过前 start 道已保存的问题与近似重复的问题）"""
+        questions_data = self.llm_client.parse_structured(response, GenerationResponse).questions
+        rows = [self._question_row(tagged_question, question_data) for question_data in questions_data[start:]]
+        rows = [row for row in rows if not self._is_duplicate(dedup, row)]
+        question_ids = self.db_manager.insert_generated_questions(original_id, rows)
+        return [
+            self._to_generated_question(question_id, original_id, row)
+            for question_id, row in zip(question_ids, rows)
+        ]
+    
+    def _new_stream_parser(self) -> StreamingJSONArrayParser:
+        # 单道题同样先按结构化输出校验，含 LaTeX 等非法转义时再容错解析
+        return StreamingJSONArrayParser(
+            "questions", loads=lambda text: self.llm_client.parse_structured(text, GeneratedQuestionItem)
+        )
+    
+    def _save_remaining_questions(self, tagged_question: TaggedQuestion, original_id: int, response: str,
+                                  parser: StreamingJSONArrayParser, saved: List[GeneratedQuestion],
+                                  dedup: Optional[NearDuplicateFilter] = None) -> List[GeneratedQuestion]:
+        """增量解析未覆盖到的题目（数组未闭合或某道题格式有误）由完整响应的整体解析兜底"""
+        if parser.complete and not parser.broken:
+            return []
+        try:
+            return self._save_generated_questions(
+                tagged_question, original_id, response, start=parser.emitted, dedup=dedup
+            )
+        except Exception:
+            if saved:
+                print(f"⚠️ 生成结果的剩余部分无法解析，保留已解析的 {len(saved)} 道问题")
+                return []
+            raise
+    
+    def _stream_questions(self, tagged_question: TaggedQuestion, original_id: int,
+                          on_question: Optional[Callable[[GeneratedQuestion], None]],
+                          dedup: Optional[NearDuplicateFilter] = None) -> List[GeneratedQuestion]:
+        """流式生成问题：每道题完整到达即入库并回调 on_question
+        
+        LLM 调用重试时已入库的题目保留，重新生成的响应中只接收其后位置的题目
+        """
+        parser = self._new_stream_parser()
+        generated_questions: List[GeneratedQuestion] = []
+        
+        def _accept(question: Optional[GeneratedQuestion]):
+            if question is None:
+                return
+            generated_questions.append(question)
+            if on_question:
+                on_question(question)
+        
+        def _on_delta(delta: str):
+            for question_data in parser.feed(delta):
+                _accept(self._save_generated_question(tagged_question, original_id, question_data, dedup))
+        
+        response = self.llm_client.stream_chat_completion(
+            self._build_messages(tagged_question), on_delta=_on_delta, on_retry=parser.reset,
+            json_mode=True, agent="generation", response_model=GenerationResponse
+        )
+        for question in self._save_remaining_questions(
+            tagged_question, original_id, response, parser, generated_questions, dedup
+        ):
+            _accept(question)
+        return generated_questions
+    
+    async def _astream_questions(self, tagged_question: TaggedQuestion, original_id: int,
+                                 on_question: Optional[Callable[[GeneratedQuestion], None]],
+                                 dedup: Optional[NearDuplicateFilter] = None) -> List[GeneratedQuestion]:
+        """_stream_questions 的异步版本，数据库写入放到线程中执行"""
+        parser = self._new_stream_parser()
+        generated_questions: List[GeneratedQuestion] = []
+        
+        def _accept(question: Optional[GeneratedQuestion]):
+            if question is None:
+                return
+            generated_questions.append(question)
+            if on_question:
+                on_question(question)
+        
+        async def _on_delta(delta: str):
+            for question_data in parser.feed(delta):
+                _accept(await asyncio.to_thread(
+                    self._save_generated_question, tagged_question, original_id, question_data, dedup
+                ))
+        
+        response = await self.async_llm_client.stream_chat_completion(
+            self._build_messages(tagged_question), on_delta=_on_delta, on_retry=parser.reset,
+            json_mode=True, agent="generation", response_model=GenerationResponse
+        )
+        remaining = await asyncio.to_thread(
+            self._save_remaining_questions, tagged_question, original_id, response, parser, generated_questions, dedup
+        )
+        for question in remaining:
+            _accept(question)
+        return generated_questions
+    
+    @staticmethod
+    def _record_duplicates(state: WorkflowState, dedup: Optional[NearDuplicateFilter]):
+        """记录本次丢弃的近似重复问题数：每道题至少节省一次解答和一次检查调用"""
+        if dedup is None or not dedup.dropped:
+            return
+        state.duplicates_removed = dedup.dropped
+        history = f"（其中 {dedup.history_dropped} 道与历史问题重复）" if dedup.history_dropped else ""
+        print(f"🧹 过滤 {dedup.dropped} 道近似重复的问题{history}，节省至少 {2 * dedup.dropped} 次LLM调用")
+    
+    def generate_questions(self, state: WorkflowState,
+                           on_question: Optional[Callable[[GeneratedQuestion], None]] = None) -> WorkflowState:
+        """生成相似问题；on_question 在每道题入库后按顺序回调（流式模式下边生成边回调）"""
         try:
             tagged_question = state.tagged_question
-            if not tagged_question:
-                raise ValueError("标签问题为空")
             
             # 首先保存原始问题到数据库
-            original_id = self.db_manager.insert_original_question(
-                tagged_question.question,
-                tagged_question.thinking_chain,
-                tagged_question.answer,
-                tagged_question.domain_tags,
-                tagged_question.question_type
-            )
-            
-            # 生成问题生成提示词
-            prompt = self.prompt_manager.get_question_generation_prompt(
-                tagged_question.domain_tags,
-                tagged_question.question_type,
-                tagged_question.question,
-                tagged_question.thinking_chain,
-                tagged_question.answer
-            )
+            original_id = self._save_original_question(tagged_question)
             
             # 调用LLM生成问题
-            messages = [{"role": "user", "content": prompt}]
-            response = self.llm_client.chat_completion(messages)
-            
-            # 解析响应
-            result = self.llm_client.parse_json_response(response)
-            questions_data = result.get("questions", [])
-            
-            # 创建生成的问题对象并保存到数据库
-            generated_questions = []
-            for question_data in questions_data:
-                if isinstance(question_data, dict):
-                    question_text = question_data.get("question", "")
-                    domain_tags = question_data.get("domain_tags", tagged_question.domain_tags)
-                    question_type = question_data.get("question_type", tagged_question.question_type)
-                else:
-                    # 兼容旧格式（纯字符串）
-                    question_text = str(question_data)
-                    domain_tags = tagged_question.domain_tags
-                    question_type = tagged_question.question_type
-                
-                question_id = self.db_manager.insert_generated_question(
-                    original_id, question_text, domain_tags, question_type
+            dedup = self._new_dedup_filter()
+            if self.streaming:
+                state.generated_questions = self._stream_questions(tagged_question, original_id, on_question, dedup)
+            else:
+                messages = self._build_messages(tagged_question)
+                response = self.llm_client.chat_completion(
+                    messages, json_mode=True, agent="generation", response_model=GenerationResponse
                 )
                 
-                generated_question = GeneratedQuestion(
-                    id=question_id,
-                    original_question_id=original_id,
-                    question=question_text,
-                    domain_tags=domain_tags,
-                    question_type=question_type
+                state.generated_questions = self._save_generated_questions(
+                    tagged_question, original_id, response, dedup=dedup
                 )
-                generated_questions.append(generated_question)
-            
-            state.generated_questions = generated_questions
+                if on_question:
+                    for question in state.generated_questions:
+                        on_question(question)
             state.current_step = "questions_generated"
+            self._record_duplicates(state, dedup)
             
-            print(f"生成了 {len(generated_questions)} 道相似问题")
+            print(f"生成了 {len(state.generated_questions)} 道相似问题")
+            return state
+        
+        except Exception as e:
+            state.error = f"问题生成失败: {str(e)}"
+            print(f"问题生成错误: {e}")
             return state
+    
+    async def agenerate_questions(self, state: WorkflowState,
+                                  on_question: Optional[Callable[[GeneratedQuestion], None]] = None) -> WorkflowState:
+        """生成相似问题（异步），数据库写入放到线程中执行，避免阻塞事件循环"""
+        try:
+            tagged_question = state.tagged_question
+            
+            # 首先保存原始问题到数据库
+            original_id = await asyncio.to_thread(self._save_original_question, tagged_question)
+            
+            # 调用LLM生成问题
+            dedup = self._new_dedup_filter()
+            if self.streaming:
+                state.generated_questions = await self._astream_questions(
+                    tagged_question, original_id, on_question, dedup
+                )
+            else:
+                messages = self._build_messages(tagged_question)
+                response = await self.async_llm_client.chat_completion(
+                    messages, json_mode=True, agent="generation", response_model=GenerationResponse
+                )
+                
+                state.generated_questions = await asyncio.to_thread(
+                    self._save_generated_questions, tagged_question, original_id, response, 0, dedup
+                )
+                if on_question:
+                    for question in state.generated_questions:
+                        on_question(question)
+            state.current_step = "questions_generated"
+            self._record_duplicates(state, dedup)
             
+            print(f"生成了 {len(state.generated_questions)} 道相似问题")
+            return state
+        
         except Exception as e:
             state.error = f"问题生成失败: {str(e)}"
             print(f"问题生成错误: {e}")
             return state
 
 
+class _PartialSolutionBuffer:
+    """累积流式解答的增量文本，按时间间隔节流产出 (思维链, 答案) 的部分快照"""
+    
+    def __init__(self, flush_interval: float):
+        self.flush_interval = flush_interval
+        self.parts: List[str] = []
+        self.last_flush = time.monotonic()
+    
+    def feed(self, delta: str) -> Optional[Tuple[str, str]]:
+        """追加增量文本，距上次写入超过间隔时返回当前快照"""
+        self.parts.append(delta)
+        now = time.monotonic()
+        if now - self.last_flush < self.flush_interval:
+            return None
+        self.last_flush = now
+        return self.snapshot()
+    
+    def snapshot(self) -> Tuple[str, str]:
+        text = "".join(self.parts)
+        return (
+            extract_partial_json_string(text, "thinking_chain") or "",
+            extract_partial_json_string(text, "answer") or ""
+        )
+    
+    def reset(self):
+        """LLM 调用重试时从头开始累积"""
+        self.parts = []
+
+
 class QuestionSolvingAgent:
     """问题解答代理"""
     
-    def __init__(self):
-        self.llm_client = LLMClient()
+    def __init__(self, max_workers: Optional[int] = None):
+        self.llm_client = get_llm_client()
+        self.async_llm_client = get_async_llm_client()
         self.prompt_manager = PromptManager()
-        self.db_manager = DatabaseManager()
+        self.db_manager = get_db_manager()
+        # 解答阶段以等待LLM响应为主（IO密集），使用线程池并发解答；1 表示逐题串行
+        self.max_workers = max_workers or int(os.getenv("SOLVE_MAX_WORKERS", "5"))
+        # 流式解答：边生成边把部分思维链写入数据库，长解答可实时查看，中断后也保留已生成的进度
+        self.streaming = os.getenv("SOLVE_STREAMING", "false").lower() in ("1", "true", "yes")
+        self.stream_flush_interval = float(os.getenv("SOLVE_STREAM_FLUSH_INTERVAL", "1.0"))
+    
+    def _build_messages(self, question: GeneratedQuestion) -> List[Dict[str, str]]:
+        """生成解题的对话消息"""
+        prompt = self.prompt_manager.get_solution_prompt(
+            question.domain_tags,
+            question.question_type,
+            question.question
+        )
+        return [{"role": "user", "content": prompt}]
+    
+    def _parse_solution(self, question: GeneratedQuestion, response: str) -> QuestionSolution:
+        """解析解答为尚未入库（没有ID）的解答对象"""
+        result = self.llm_client.parse_structured(response, SolutionResponse)
+        return QuestionSolution(
+            question_id=question.id,
+            question=question.question,  # 添加问题内容
+            thinking_chain=result.thinking_chain,
+            answer=result.answer
+        )
+    
+    def _save_solution(self, question: GeneratedQuestion, response: str,
+                       solution_id: Optional[int] = None) -> QuestionSolution:
+        """解析解答并保存到数据库；流式解答已有占位记录时传入 solution_id 覆盖其内容"""
+        solution = self._parse_solution(question, response)
+        
+        # 保存解答到数据库（暂不设置验证信息）
+        if solution_id is None:
+            solution_id = self.db_manager.insert_question_solution(
+                question.id,
+                solution.thinking_chain,
+                solution.answer
+            )
+        else:
+            self.db_manager.update_solution_content(solution_id, solution.thinking_chain, solution.answer)
+        solution.id = solution_id
+        
+        print(f"完成问题解答: {question.question[:50]}...")
+        return solution
+    
+    def _save_solutions(self, solutions: List[QuestionSolution]) -> List[QuestionSolution]:
+        """在一个事务内批量保存解答，并回填ID"""
+        if not solutions:
+            return solutions
+        solution_ids = self.db_manager.insert_question_solutions(
+            [(solution.question_id, solution.thinking_chain, solution.answer) for solution in solutions]
+        )
+        for solution, solution_id in zip(solutions, solution_ids):
+            solution.id = solution_id
+        return solutions
+    
+    def _finish_stage(self, results: List[Union[QuestionSolution, BaseException]]) -> List[QuestionSolution]:
+        """汇总阶段结果：非流式模式下批量保存完成的解答；有题目失败时先保存其余已完成的解答，再抛出首个错误"""
+        solutions = [result for result in results if isinstance(result, QuestionSolution)]
+        if not self.streaming:
+            solutions = self._save_solutions(solutions)
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            if solutions:
+                print(f"⚠️ {len(errors)} 道问题解答失败，已保存其余 {len(solutions)} 道完成的解答")
+            raise errors[0]
+        return solutions
+    
+    def _solve_unsaved(self, question: GeneratedQuestion) -> QuestionSolution:
+        """解答单道问题但暂不入库，由 solve_questions 统一批量写入"""
+        response = self.llm_client.chat_completion(
+            self._build_messages(question), json_mode=True, agent="solving", response_model=SolutionResponse
+        )
+        solution = self._parse_solution(question, response)
+        print(f"完成问题解答: {question.question[:50]}...")
+        return solution
+    
+    async def _asolve_unsaved(self, question: GeneratedQuestion) -> QuestionSolution:
+        response = await self.async_llm_client.chat_completion(
+            self._build_messages(question), json_mode=True, agent="solving", response_model=SolutionResponse
+        )
+        solution = self._parse_solution(question, response)
+        print(f"完成问题解答: {question.question[:50]}...")
+        return solution
+    
+    def _finish_partial(self, solution_id: int, buffer: _PartialSolutionBuffer):
+        """流式解答失败时保留已收到的部分内容；尚未收到任何内容则删除占位记录"""
+        if buffer.parts:
+            self.db_manager.update_solution_content(solution_id, *buffer.snapshot())
+        else:
+            self.db_manager.delete_question_solution(solution_id)
+    
+    def solve_question(self, question: GeneratedQuestion) -> QuestionSolution:
+        """解答单道生成的问题并保存到数据库"""
+        if not self.streaming:
+            response = self.llm_client.chat_completion(
+                self._build_messages(question), json_mode=True, agent="solving", response_model=SolutionResponse
+            )
+            return self._save_solution(question, response)
+        
+        # 先插入占位记录，生成过程中按间隔写入部分思维链
+        solution_id = self.db_manager.insert_question_solution(question.id, "", "")
+        buffer = _PartialSolutionBuffer(self.stream_flush_interval)
+        
+        def _on_delta(delta: str):
+            snapshot = buffer.feed(delta)
+            if snapshot:
+                self.db_manager.update_solution_content(solution_id, *snapshot)
+        
+        try:
+            response = self.llm_client.stream_chat_completion(
+                self._build_messages(question), on_delta=_on_delta, on_retry=buffer.reset,
+                json_mode=True, agent="solving", response_model=SolutionResponse
+            )
+        except Exception:
+            self._finish_partial(solution_id, buffer)
+            raise
+        return self._save_solution(question, response, solution_id)
+    
+    async def asolve_question(self, question: GeneratedQuestion) -> QuestionSolution:
+        """解答单道生成的问题并保存到数据库（异步）"""
+        if not self.streaming:
+            response = await self.async_llm_client.chat_completion(
+                self._build_messages(question), json_mode=True, agent="solving", response_model=SolutionResponse
+            )
+            return await asyncio.to_thread(self._save_solution, question, response)
+        
+        solution_id = await asyncio.to_thread(self.db_manager.insert_question_solution, question.id, "", "")
+        buffer = _PartialSolutionBuffer(self.stream_flush_interval)
+        
+        async def _on_delta(delta: str):
+            snapshot = buffer.feed(delta)
+            if snapshot:
+                await asyncio.to_thread(self.db_manager.update_solution_content, solution_id, *snapshot)
+        
+        try:
+            response = await self.async_llm_client.stream_chat_completion(
+                self._build_messages(question), on_delta=_on_delta, on_retry=buffer.reset,
+                json_mode=True, agent="solving", response_model=SolutionResponse
+            )
+        except Exception:
+            await asyncio.to_thread(self._finish_partial, solution_id, buffer)
+            raise
+        return await asyncio.to_thread(self._save_solution, question, response, solution_id)
     
     def solve_questions(self, state: WorkflowState) -> WorkflowState:
         """解答生成的问题"""
@@ -151,48 +578,59 @@ class QuestionSolvingAgent:
             if not generated_questions:
                 raise ValueError("生成的问题为空")
             
-            solutions = []
-            for question in generated_questions:
-                # 生成解题提示词
-                prompt = self.prompt_manager.get_solution_prompt(
-                    question.domain_tags,
-                    question.question_type,
-                    question.question
-                )
-                
-                # 调用LLM解题
-                messages = [{"role": "user", "content": prompt}]
-                response = self.llm_client.chat_completion(messages)
-                
-                # 解析响应
-                result = self.llm_client.parse_json_response(response)
-                thinking_chain = result.get("thinking_chain", "")
-                answer = result.get("answer", "")
-                
-                # 保存解答到数据库（暂不设置验证信息）
-                solution_id = self.db_manager.insert_question_solution(
-                    question.id,
-                    thinking_chain,
-                    answer
-                )
-                
-                solution = QuestionSolution(
-                    id=solution_id,
-                    question_id=question.id,
-                    question=question.question,  # 添加问题内容
-                    thinking_chain=thinking_chain,
-                    answer=answer
-                )
-                solutions.append(solution)
-                
-                print(f"完成问题解答: {question.question[:50]}...")
+            # 非流式模式下解答全部完成后在一个事务内批量入库；流式模式需要占位记录，逐题写入
+            solve = self.solve_question if self.streaming else self._solve_unsaved
+            workers = min(self.max_workers, len(generated_questions))
+            results: List[Union[QuestionSolution, BaseException]] = []
+            if workers <= 1:
+                for question in generated_questions:
+                    try:
+                        results.append(solve(question))
+                    except Exception as e:
+                        results.append(e)
+                        break
+            else:
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    futures = [executor.submit(solve, question) for question in generated_questions]
+                # 按提交顺序取结果，保证解答与问题按下标一一对应
+                results = [future.exception() or future.result() for future in futures]
+            solutions = self._finish_stage(results)
             
             state.solutions = solutions
             state.current_step = "completed"
             
             print(f"完成了 {len(solutions)} 道问题的解答")
             return state
+        
+        except Exception as e:
+            state.error = f"问题解答失败: {str(e)}"
+            print(f"问题解答错误: {e}")
+            return state
+    
+    async def asolve_questions(self, state: WorkflowState) -> WorkflowState:
+        """解答生成的问题（异步），并发数同样受 max_workers 限制"""
+        try:
+            generated_questions = state.generated_questions
+            if not generated_questions:
+                raise ValueError("生成的问题为空")
+            
+            semaphore = asyncio.Semaphore(max(1, self.max_workers))
+            solve = self.asolve_question if self.streaming else self._asolve_unsaved
+            
+            async def _bounded_solve(question: GeneratedQuestion) -> QuestionSolution:
+                async with semaphore:
+                    return await solve(question)
+            
+            # gather 按输入顺序返回结果，保证解答与问题按下标一一对应
+            results = await asyncio.gather(*(_bounded_solve(q) for q in generated_questions), return_exceptions=True)
+            solutions = await asyncio.to_thread(self._finish_stage, list(results))
+            
+            state.solutions = solutions
+            state.current_step = "completed"
             
+            print(f"完成了 {len(solutions)} 道问题的解答")
+            return state
+        
         except Exception as e:
             state.error = f"问题解答失败: {str(e)}"
             print(f"问题解答错误: {e}")
@@ -202,10 +640,166 @@ class QuestionSolvingAgent:
 class QuestionVerificationAgent:
     """思维链检查代理"""
     
-    def __init__(self):
-        self.llm_client = LLMClient()
+    def __init__(self, max_workers: Optional[int] = None):
+        self.llm_client = get_llm_client()
+        self.async_llm_client = get_async_llm_client()
         self.prompt_manager = PromptManager()
-        self.db_manager = DatabaseManager()
+        self.db_manager = get_db_manager()
+        self.max_attempts = 2  # 最多重试2次
+        # 每道题的 检查→重新解答→再检查 循环作为独立任务并发执行，共享同一并发上限
+        self.max_workers = max_workers or int(os.getenv("VERIFY_MAX_WORKERS", "5"))
+    
+    def _build_verification_messages(self, question: GeneratedQuestion,
+                                     solution: QuestionSolution) -> List[Dict[str, str]]:
+        """生成检查提示词对应的对话消息"""
+        prompt = self.prompt_manager.get_verification_prompt(
+            question.domain_tags,
+            question.question_type,
+            question.question,
+            solution.thinking_chain,
+            solution.answer
+        )
+        return [{"role": "user", "content": prompt}]
+    
+    def _build_solution_messages(self, question: GeneratedQuestion) -> List[Dict[str, str]]:
+        """生成重新解答的对话消息"""
+        prompt = self.prompt_manager.get_solution_prompt(
+            question.domain_tags,
+            question.question_type,
+            question.question
+        )
+        return [{"role": "user", "content": prompt}]
+    
+    def _record_verification(self, solution: QuestionSolution, response: str,
+                             writer: Optional[Union[DatabaseManager, UnitOfWork]] = None) -> VerificationResult:
+        """解析检查结果并更新数据库中的验证信息（writer 为工作单元时延后到提交时批量写入）"""
+        result = self.llm_client.parse_structured(response, VerificationResponse)
+        verification_result = VerificationResult(
+            score=result.score,
+            passed=result.passed,
+            feedback=result.feedback,
+            suggestions=result.suggestions
+        )
+        
+        # 更新数据库中的验证信息
+        (writer or self.db_manager).update_solution_verification(
+            solution.id, verification_result.score, verification_result.passed, verification_result.feedback
+        )
+        return verification_result
+    
+    def _record_resolution(self, question: GeneratedQuestion, solution: QuestionSolution, response: str,
+                           writer: Optional[Union[DatabaseManager, UnitOfWork]] = None):
+        """用重新生成的解答更新解答对象并写入数据库"""
+        result = self.llm_client.parse_structured(response, SolutionResponse)
+        solution.thinking_chain = result.thinking_chain
+        solution.answer = result.answer
+        
+        # 更新数据库
+        (writer or self.db_manager).insert_question_solution(
+            question.id,
+            solution.thinking_chain,
+            solution.answer
+        )
+    
+    @staticmethod
+    def _apply_verification(solution: QuestionSolution, verification_result: VerificationResult):
+        """将检查结果写回解答对象"""
+        solution.verification_score = verification_result.score
+        solution.verification_passed = verification_result.passed
+        solution.verification_feedback = verification_result.feedback
+    
+    def verify_solution(self, index: int, question: GeneratedQuestion, solution: QuestionSolution,
+                        writer: Optional[UnitOfWork] = None) -> VerificationResult:
+        """检查单道题的解答，未通过时重新解答并再次检查；传入 writer 时数据库写入延后批量提交"""
+        attempt = 0
+        while True:
+            attempt += 1
+            print(f"检查第{index+1}题解答 (第{attempt}次尝试)...")
+            
+            # 调用LLM进行检查
+            response = self.llm_client.chat_completion(
+                self._build_verification_messages(question, solution), json_mode=True, agent="verification",
+                response_model=VerificationResponse
+            )
+            verification_result = self._record_verification(solution, response, writer)
+            
+            if verification_result.passed:
+                # 检查通过，更新解答对象
+                self._apply_verification(solution, verification_result)
+                print(f"✅ 第{index+1}题检查通过 (得分: {verification_result.score})")
+                return verification_result
+            
+            print(f"❌ 第{index+1}题检查未通过 (得分: {verification_result.score}), 重新生成解答...")
+            
+            # 重新生成解答（绕过响应缓存，否则会拿回同一份未通过的解答）
+            response = self.llm_client.chat_completion(
+                self._build_solution_messages(question), use_cache=False, json_mode=True, agent="solving"
+            )
+            self._record_resolution(question, solution, response, writer)
+            
+            if attempt >= self.max_attempts:
+                # 达到最大重试次数，仍然记录结果
+                self._apply_verification(solution, verification_result)
+                print(f"⚠️ 第{index+1}题达到最大重试次数，保留最后结果 (得分: {verification_result.score})")
+                return verification_result
+    
+    async def averify_solution(self, index: int, question: GeneratedQuestion,
+                           solution: QuestionSolution, writer: Optional[UnitOfWork] = None) -> VerificationResult:
+        """检查单道题的解答（异步），流程与 verify_solution 相同"""
+        attempt = 0
+        while True:
+            attempt += 1
+            print(f"检查第{index+1}题解答 (第{attempt}次尝试)...")
+            
+            # 调用LLM进行检查
+            response = await self.async_llm_client.chat_completion(
+                self._build_verification_messages(question, solution), json_mode=True, agent="verification",
+                response_model=VerificationResponse
+            )
+            verification_result = await asyncio.to_thread(self._record_verification, solution, response, writer)
+            
+            if verification_result.passed:
+                # 检查通过，更新解答对象
+                self._apply_verification(solution, verification_result)
+                print(f"✅ 第{index+1}题检查通过 (得分: {verification_result.score})")
+                return verification_result
+            
+            print(f"❌ 第{index+1}题检查未通过 (得分: {verification_result.score}), 重新生成解答...")
+            
+            # 重新生成解答（绕过响应缓存，否则会拿回同一份未通过的解答）
+            response = await self.async_llm_client.chat_completion(
+                self._build_solution_messages(question), use_cache=False, json_mode=True, agent="solving"
+            )
+            await asyncio.to_thread(self._record_resolution, question, solution, response, writer)
+            
+            if attempt >= self.max_attempts:
+                # 达到最大重试次数，仍然记录结果
+                self._apply_verification(solution, verification_result)
+                print(f"⚠️ 第{index+1}题达到最大重试次数，保留最后结果 (得分: {verification_result.score})")
+                return verification_result
+    
+    @staticmethod
+    def _completed_results(results: List[Union[VerificationResult, BaseException]]) -> List[VerificationResult]:
+        """工作单元提交之后调用：有题目检查失败时，其余题目的检查结果与重新生成的解答已经写入，再抛出首个错误"""
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            completed = len(results) - len(errors)
+            if completed:
+                print(f"⚠️ {len(errors)} 道题检查失败，已保存其余 {completed} 道题的检查结果")
+            raise errors[0]
+        return results
+    
+    @staticmethod
+    def _finish(state: WorkflowState, verified_solutions: List[QuestionSolution],
+                verification_results: List[VerificationResult]) -> WorkflowState:
+        """汇总检查结果写入状态"""
+        state.solutions = verified_solutions
+        state.verification_results = verification_results
+        state.current_step = "verified"
+        
+        passed_count = sum(1 for r in verification_results if r.passed)
+        print(f"✅ 思维链检查完成: {passed_count}/{len(verification_results)} 题通过检查")
+        return state
     
     def verify_solutions(self, state: WorkflowState) -> WorkflowState:
         """检查解答的思维链质量"""
@@ -216,103 +810,65 @@ class QuestionVerificationAgent:
             if not solutions or not generated_questions:
                 raise ValueError("解答或问题为空")
             
-            verification_results = []
-            verified_solutions = []
+            # 解答数多于问题数时，多余的解答不参与检查
+            verified_solutions = solutions[:len(generated_questions)]
+            questions = generated_questions[:len(verified_solutions)]
             
-            for i, solution in enumerate(solutions):
-                if i >= len(generated_questions):
-                    break
-                    
-                question = generated_questions[i]
-                max_attempts = 2  # 最多重试2次
-                attempt = 0
-                
-                while attempt < max_attempts:
-                    attempt += 1
-                    print(f"检查第{i+1}题解答 (第{attempt}次尝试)...")
-                    
-                    # 生成检查提示词
-                    prompt = self.prompt_manager.get_verification_prompt(
-                        question.domain_tags,
-                        question.question_type,
-                        question.question,
-                        solution.thinking_chain,
-                        solution.answer
-                    )
-                    
-                    # 调用LLM进行检查
-                    messages = [{"role": "user", "content": prompt}]
-                    response = self.llm_client.chat_completion(messages)
-                    
-                    # 解析检查结果
-                    result = self.llm_client.parse_json_response(response)
-                    score = result.get("score", 0)
-                    passed = result.get("passed", False)
-                    feedback = result.get("feedback", "")
-                    suggestions = result.get("suggestions", [])
-                    
-                    verification_result = VerificationResult(
-                        score=score,
-                        passed=passed,
-                        feedback=feedback,
-                        suggestions=suggestions
-                    )
-                    
-                    # 更新数据库中的验证信息
-                    self.db_manager.update_solution_verification(
-                        solution.id, score, passed, feedback
-                    )
-                    
-                    if passed:
-                        # 检查通过，更新解答对象
-                        solution.verification_score = score
-                        solution.verification_passed = passed
-                        solution.verification_feedback = feedback
-                        verified_solutions.append(solution)
-                        verification_results.append(verification_result)
-                        print(f"✅ 第{i+1}题检查通过 (得分: {score})")
-                        break
-                    else:
-                        print(f"❌ 第{i+1}题检查未通过 (得分: {score}), 重新生成解答...")
-                        
-                        # 重新生成解答
-                        prompt = self.prompt_manager.get_solution_prompt(
-                            question.domain_tags,
-                            question.question_type,
-                            question.question
-                        )
-                        
-                        messages = [{"role": "user", "content": prompt}]
-                        response = self.llm_client.chat_completion(messages)
-                        
-                        result = self.llm_client.parse_json_response(response)
-                        solution.thinking_chain = result.get("thinking_chain", "")
-                        solution.answer = result.get("answer", "")
-                        
-                        # 更新数据库
-                        self.db_manager.insert_question_solution(
-                            question.id,
-                            solution.thinking_chain,
-                            solution.answer
-                        )
-                        
-                        if attempt == max_attempts:
-                            # 达到最大重试次数，仍然记录结果
-                            solution.verification_score = score
-                            solution.verification_passed = passed
-                            solution.verification_feedback = feedback
-                            verified_solutions.append(solution)
-                            verification_results.append(verification_result)
-                            print(f"⚠️ 第{i+1}题达到最大重试次数，保留最后结果 (得分: {score})")
-            
-            state.solutions = verified_solutions
-            state.verification_results = verification_results
-            state.current_step = "verified"
-            
-            passed_count = sum(1 for r in verification_results if r.passed)
-            print(f"✅ 思维链检查完成: {passed_count}/{len(verification_results)} 题通过检查")
+            workers = min(self.max_workers, len(verified_solutions))
+            # 检查结果与重新生成的解答先登记在工作单元中，阶段结束时在一个事务内批量写入
+            with self.db_manager.unit_of_work() as writer:
+                if workers <= 1:
+                    results = []
+                    for i, (question, solution) in enumerate(zip(questions, verified_solutions)):
+                        try:
+                            results.append(self.verify_solution(i, question, solution, writer))
+                        except Exception as e:
+                            results.append(e)
+                            break
+                else:
+                    # 按输入顺序收集结果，阶段耗时取决于最慢的一道题
+                    with ThreadPoolExecutor(max_workers=workers) as executor:
+                        futures = [
+                            executor.submit(self.verify_solution, i, question, solution, writer)
+                            for i, (question, solution) in enumerate(zip(questions, verified_solutions))
+                        ]
+                    results = [future.exception() or future.result() for future in futures]
+            
+            return self._finish(state, verified_solutions, self._completed_results(results))
+        
+        except Exception as e:
+            state.error = f"思维链检查失败: {str(e)}"
+            print(f"思维链检查错误: {e}")
             return state
+    
+    async def averify_solutions(self, state: WorkflowState) -> WorkflowState:
+        """检查解答的思维链质量（异步）"""
+        try:
+            solutions = state.solutions
+            generated_questions = state.generated_questions
+            
+            if not solutions or not generated_questions:
+                raise ValueError("解答或问题为空")
+            
+            # 解答数多于问题数时，多余的解答不参与检查
+            verified_solutions = solutions[:len(generated_questions)]
+            semaphore = asyncio.Semaphore(max(1, self.max_workers))
+            writer = self.db_manager.unit_of_work()
+            
+            async def _bounded_verify(index: int, question: GeneratedQuestion,
+                                      solution: QuestionSolution) -> VerificationResult:
+                async with semaphore:
+                    return await self.averify_solution(index, question, solution, writer)
+            
+            # gather 按输入顺序返回结果，阶段耗时取决于最慢的一道题
+            results = await asyncio.gather(*(
+                _bounded_verify(i, generated_questions[i], solution)
+                for i, solution in enumerate(verified_solutions)
+            ), return_exceptions=True)
+            await asyncio.to_thread(writer.commit)
             
+            return self._finish(state, verified_solutions, self._completed_results(list(results)))
+        
         except Exception as e:
             state.error = f"思维链检查失败: {str(e)}"
             print(f"思维链检查错误: {e}")
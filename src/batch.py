@@ -0,0 +1,157 @@
+"""
+JSONL 批量运行器
+逐行读取 {question, thinking_chain, answer} 记录，用多个工作流并发处理，
+逐条记录进度以便中断后断点续跑，并实时输出吞吐量
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Dict, Iterator, Optional, Set, Tuple
+
+
+class BatchRunner:
+    """JSONL 批量运行器"""
+    
+    def __init__(self, workflow=None, workers: Optional[int] = None,
+                 report_interval: float = 30.0):
+        if workflow is None:
+            from .workflow import QuestionGenerationWorkflow
+            workflow = QuestionGenerationWorkflow()
+        # 工作流及其代理均为无状态对象，可被多个线程共享
+        self.workflow = workflow
+        self.workers = workers or int(os.getenv("BATCH_WORKERS", "4"))
+        self.report_interval = report_interval
+    
+    @staticmethod
+    def default_paths(input_path: str) -> Tuple[str, str]:
+        """根据输入文件推导 结果文件 与 进度文件 路径"""
+        base = input_path[:-len(".jsonl")] if input_path.endswith(".jsonl") else input_path
+        return f"{base}_results.jsonl", f"{base}.progress"
+    
+    @staticmethod
+    def load_progress(progress_path: str) -> Set[int]:
+        """读取已完成（成功或无效）记录的行号；失败的记录在续跑时会重新处理"""
+        done = set()
+        if not os.path.exists(progress_path):
+            return done
+        with open(progress_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # 进程被杀时最后一行可能写了一半，忽略即可
+                    continue
+                if entry.get("status") in ("ok", "invalid"):
+                    done.add(entry["line"])
+        return done
+    
+    @staticmethod
+    def iter_records(input_path: str, done: Set[int]) -> Iterator[Tuple[int, Optional[Dict[str, str]], str]]:
+        """流式读取 JSONL，跳过已完成的行；返回 (行号, 记录, 错误信息)"""
+        with open(input_path, "r", encoding="utf-8") as f:
+            for line_no, line in enumerate(f, 1):
+                if line_no in done or not line.strip():
+                    continue
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError as e:
+                    yield line_no, None, f"无效的JSON: {e}"
+                    continue
+                if not isinstance(data, dict) or not all(data.get(k) for k in ("question", "thinking_chain", "answer")):
+                    yield line_no, None, "记录必须包含question, thinking_chain, answer字段"
+                    continue
+                yield line_no, data, ""
+    
+    def _process(self, line_no: int, record: Dict[str, str]) -> Dict[str, Any]:
+        """运行单条记录的工作流"""
+        state = self.workflow.run(record["question"], record["thinking_chain"], record["answer"])
+        results = self.workflow.get_results(state)
+        return {"line": line_no, **results}
+    
+    def run(self, input_path: str, output_path: Optional[str] = None,
+            progress_path: Optional[str] = None, resume: bool = True) -> Dict[str, Any]:
+        """批量处理 JSONL 文件，返回统计信息"""
+        default_output, default_progress = self.default_paths(input_path)
+        output_path = output_path or default_output
+        progress_path = progress_path or default_progress
+        
+        if not resume:
+            for path in (output_path, progress_path):
+                if os.path.exists(path):
+                    os.remove(path)
+        done = self.load_progress(progress_path)
+        if done:
+            print(f"♻️ 断点续跑: 跳过已完成的 {len(done)} 条记录")
+        
+        stats = {"ok": 0, "error": 0, "invalid": 0, "skipped": len(done)}
+        start_time = time.time()
+        last_report = start_time
+        
+        with open(output_path, "a", encoding="utf-8") as out_f, \
+                open(progress_path, "a", encoding="utf-8") as progress_f:
+            
+            def _record(line_no: int, status: str, result: Optional[Dict[str, Any]] = None, error: str = ""):
+                # 结果只在主线程写入；先写结果再写进度，进度中出现的记录一定已经落盘
+                if result is not None:
+                    out_f.write(json.dumps(result, ensure_ascii=False) + "\n")
+                    out_f.flush()
+                entry = {"line": line_no, "status": status}
+                if error:
+                    entry["error"] = error
+                progress_f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                progress_f.flush()
+                stats[status] += 1
+            
+            def _report(final: bool = False):
+                elapsed = max(time.time() - start_time, 1e-6)
+                finished = stats["ok"] + stats["error"]
+                rate = finished / elapsed * 60
+                prefix = "🏁 批量处理完成" if final else "📈 批量进度"
+                print(f"{prefix}: 成功 {stats['ok']}，失败 {stats['error']}，无效 {stats['invalid']}，"
+                      f"吞吐 {rate:.1f} 条/分钟")
+            
+            def _drain(in_flight: Dict[Any, int]):
+                nonlocal last_report
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    self._collect(future, in_flight.pop(future), _record)
+                if time.time() - last_report >= self.report_interval:
+                    _report()
+                    last_report = time.time()
+            
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                in_flight = {}
+                for line_no, record, error in self.iter_records(input_path, done):
+                    if record is None:
+                        _record(line_no, "invalid", error=error)
+                        continue
+                    
+                    # 限制在途任务数量，避免一次性把整个文件读入内存
+                    while len(in_flight) >= self.workers * 2:
+                        _drain(in_flight)
+                    in_flight[executor.submit(self._process, line_no, record)] = line_no
+                
+                while in_flight:
+                    _drain(in_flight)
+            
+            _report(final=True)
+        
+        stats["elapsed"] = time.time() - start_time
+        stats["output_path"] = output_path
+        stats["progress_path"] = progress_path
+        return stats
+    
+    @staticmethod
+    def _collect(future, line_no: int, record_fn):
+        """记录单个任务的结果"""
+        try:
+            result = future.result()
+        except Exception as e:
+            record_fn(line_no, "error", error=str(e))
+            return
+        if "error" in result:
+            record_fn(line_no, "error", error=str(result["error"]))
+        else:
+            record_fn(line_no, "ok", result=result)
@@ -1 +1 @@
-from .db_manager import DatabaseManager
+from .db_manager import DatabaseManager, UnitOfWork, get_db_manager
@@ -1,20 +1,421 @@
 import sqlite3
 import json
+import atexit
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Optional
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
 from ..models.schemas import GeneratedQuestion, QuestionSolution
+from ..utils.text_utils import question_content_hash
+from ..utils.dedup import char_shingles, jaccard, lsh_buckets
+
+
+# 全文索引：FTS5 外部内容表（不重复存储正文），由触发器与内容表保持同步
+FTS_TABLES = {
+    "original_questions_fts": ("original_questions", ("question", "thinking_chain", "answer")),
+    "generated_questions_fts": ("generated_questions", ("question",)),
+    "question_solutions_fts": ("question_solutions", ("thinking_chain", "answer")),
+}
+# 搜索结果类型
+FTS_HIT_TYPES = {
+    "original_questions_fts": "original_question",
+    "generated_questions_fts": "generated_question",
+    "question_solutions_fts": "solution",
+}
+
+# 批量写入的行格式
+GeneratedQuestionRow = Tuple[str, List[str], str]  # (问题, 领域标签, 题型)
+SolutionRow = Tuple[int, str, str]  # (问题ID, 思维链, 答案)
+VerificationRow = Tuple[int, int, bool, str]  # (解答ID, 得分, 是否通过, 反馈)
+
+
+class _FlushBarrier:
+    """flush 放入后台写入队列的屏障：写线程提交完它之前的写操作后通知等待方"""
+    
+    def __init__(self):
+        self.done = threading.Event()
+        self.errors: List[str] = []
 
 
 class DatabaseManager:
     """SQLite数据库管理器"""
     
+    JOURNAL_MODES = {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF"}
+    SYNCHRONOUS_LEVELS = {"OFF", "NORMAL", "FULL", "EXTRA"}
+    MAX_ROWID = 2 ** 63 - 1
+    
     def __init__(self, db_path: str = "questions.db"):
         self.db_path = db_path
+        # WAL 模式下读不阻塞写；NORMAL 在 WAL 下只在检查点时 fsync，掉电最多丢失最近的事务
+        self.journal_mode = os.getenv("DB_JOURNAL_MODE", "WAL").upper()
+        if self.journal_mode not in self.JOURNAL_MODES:
+            raise ValueError(f"DB_JOURNAL_MODE 必须是 {sorted(self.JOURNAL_MODES)} 之一: {self.journal_mode}")
+        self.busy_timeout_ms = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+        self.synchronous = os.getenv("DB_SYNCHRONOUS", "NORMAL").upper()
+        if self.synchronous not in self.SYNCHRONOUS_LEVELS:
+            raise ValueError(f"DB_SYNCHRONOUS 必须是 {sorted(self.SYNCHRONOUS_LEVELS)} 之一: {self.synchronous}")
+        # 多线程并发解答时串行化写操作，避免 "database is locked"
+        self._write_lock = threading.Lock()
+        # 每个线程复用一个长连接，省去每条语句重新建立连接的开销
+        self._local = threading.local()
+        self._connections: List[Tuple[threading.Thread, sqlite3.Connection]] = []
+        self._connections_lock = threading.Lock()
+        # 后台写入：不需要返回值的写操作（更新检查结果、流式部分内容等）放入有界队列，
+        # 由单一写线程按批次在事务中执行，调用方不再等待磁盘；队列满时入队阻塞（背压）
+        self.write_behind = os.getenv("DB_WRITE_BEHIND", "false").lower() in ("1", "true", "yes")
+        self.write_batch_size = int(os.getenv("DB_WRITE_BATCH_SIZE", "500"))
+        self.write_queue_size = int(os.getenv("DB_WRITE_QUEUE_SIZE", "10000"))
+        # flush 等待自己的屏障的最长秒数
+        self.flush_timeout = float(os.getenv("DB_FLUSH_TIMEOUT", "300"))
+        # 每启动一个写线程新建一个队列，close() 之后重新启动的写线程不会与旧线程争抢同一个队列
+        self._write_queue: queue.Queue = queue.Queue(maxsize=self.write_queue_size)
+        self._writer: Optional[threading.Thread] = None
+        self._writer_lock = threading.Lock()
+        self.write_stats = {"writes": 0, "batches": 0, "failed": 0}
         self.init_database()
     
+    def _connect(self) -> sqlite3.Connection:
+        """新建连接并设置 busy_timeout / journal_mode / synchronous"""
+        # check_same_thread=False 仅为了能在 close() 中从其他线程关闭，连接本身只在所属线程内使用
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout_ms / 1000, check_same_thread=False)
+        conn.execute(f"PRAGMA busy_timeout = {self.busy_timeout_ms}")
+        conn.execute(f"PRAGMA journal_mode = {self.journal_mode}")
+        conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        return conn
+    
+    def get_connection(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接（首次调用时创建）
+        
+        用作 with 语句时与 sqlite3 连接的默认行为一致：正常结束提交、异常回滚，连接保持打开。
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._connect()
+            self._local.conn = conn
+            with self._connections_lock:
+                # 顺带关闭已退出线程（如用完的线程池）遗留的连接
+                alive = []
+                for thread, other in self._connections:
+                    if thread.is_alive():
+                        alive.append((thread, other))
+                    else:
+                        other.close()
+                alive.append((threading.current_thread(), conn))
+                self._connections = alive
+        return conn
+    
+    def _defer(self, method: Callable[..., Any], *args) -> bool:
+        """后台写入模式下把写操作放入队列由写线程执行，返回 True 表示已入队
+        
+        写线程自身、以及处于 transaction() 块内的调用直接执行，保证事务内的写操作一起提交或回滚。
+        入队与 close() 放入停止标记都持有 _writer_lock，不会有写操作排在停止标记之后而被丢弃。
+        """
+        if not self.write_behind or getattr(self._local, "is_writer", False) \
+                or getattr(self._local, "in_transaction", False):
+            return False
+        with self._writer_lock:
+            if self._writer is None:
+                self._write_queue = queue.Queue(maxsize=self.write_queue_size)
+                self._writer = threading.Thread(
+                    target=self._write_loop, args=(self._write_queue,), name="db-writer", daemon=True
+                )
+                self._writer.start()
+            # 队列满时在此阻塞（背压）；写线程取出写操作不需要这把锁
+            self._write_queue.put((method, args))
+        return True
+    
+    def _write_loop(self, write_queue: queue.Queue):
+        """写线程：取出队列中已积压的写操作（最多 write_batch_size 条），在一个事务内执行
+        
+        取到 flush 屏障或停止标记（None）时结束本批：先提交之前的写操作，再通知屏障或退出。
+        """
+        self._local.is_writer = True
+        # 上一个屏障之后失败的写操作，交给下一个屏障报告
+        errors: List[str] = []
+        while True:
+            batch = [write_queue.get()]
+            while len(batch) < self.write_batch_size and isinstance(batch[-1], tuple):
+                try:
+                    batch.append(write_queue.get_nowait())
+                except queue.Empty:
+                    break
+            ops = [item for item in batch if isinstance(item, tuple)]
+            if ops:
+                errors.extend(self._apply_writes(ops))
+            marker = batch[-1]
+            if isinstance(marker, _FlushBarrier):
+                marker.errors, errors = errors, []
+                marker.done.set()
+            elif marker is None:
+                return
+    
+    def _apply_writes(self, ops: List[Tuple[Callable[..., Any], tuple]]) -> List[str]:
+        """在一个事务内执行一批写操作，返回失败写操作的错误信息"""
+        errors = []
+        try:
+            with self.transaction():
+                for method, args in ops:
+                    method(*args)
+            self.write_stats["writes"] += len(ops)
+        except Exception:
+            # 整批已回滚，逐条重新执行以隔离失败的写操作
+            for method, args in ops:
+                try:
+                    with self.transaction():
+                        method(*args)
+                    self.write_stats["writes"] += 1
+                except Exception as e:
+                    self.write_stats["failed"] += 1
+                    errors.append(f"{method.__name__}: {e}")
+                    print(f"❌ 后台写入失败 ({method.__name__}): {e}")
+        finally:
+            self.write_stats["batches"] += 1
+        return errors
+    
+    def flush(self, timeout: Optional[float] = None):
+        """屏障：等待本次调用之前入队的后台写入全部提交（工作流结束时调用）
+        
+        只等待自己的屏障，不受其他工作流随后入队的写入影响。写线程已退出、超过 timeout 秒
+        （默认 flush_timeout），或上一次 flush 之后有后台写操作失败时抛出 RuntimeError。
+        """
+        if getattr(self._local, "is_writer", False):
+            return
+        with self._writer_lock:
+            writer = self._writer
+            if writer is None:
+                return
+            barrier = _FlushBarrier()
+            self._write_queue.put(barrier)
+        timeout = self.flush_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        while not barrier.done.wait(0.1):
+            if not writer.is_alive():
+                raise RuntimeError("后台写线程已退出，队列中的写操作未能提交")
+            if time.monotonic() >= deadline:
+                raise RuntimeError(f"等待后台写入超时（{timeout:g} 秒）")
+        if barrier.errors:
+            raise RuntimeError(f"{len(barrier.errors)} 个后台写操作失败，首个错误: {barrier.errors[0]}")
+    
+    def get_write_stats(self) -> Dict[str, int]:
+        """后台写入统计：已写入/失败的操作数、事务批次数与当前队列长度"""
+        return {**self.write_stats, "queued": self._write_queue.qsize()}
+    
+    def close(self):
+        """写完后台队列并停止写线程，关闭所有线程的连接；之后再访问数据库会重新建立连接"""
+        with self._writer_lock:
+            writer, self._writer = self._writer, None
+            if writer is not None:
+                self._write_queue.put(None)
+        if writer is not None:
+            writer.join()
+        with self._connections_lock:
+            for _, conn in self._connections:
+                conn.close()
+            self._connections = []
+        self._local = threading.local()
+    
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """写事务：块内的全部写操作在同一事务中提交（只 fsync 一次），异常时整体回滚
+        
+        持有写锁；同一线程内嵌套调用（包括块内调用的单行写入方法）并入外层事务。
+        """
+        if getattr(self._local, "in_transaction", False):
+            yield self.get_connection()
+            return
+        with self._write_lock:
+            conn = self.get_connection()
+            # IMMEDIATE：事务开始即取得写锁，批量插入期间自增ID不会被其他连接占用
+            conn.execute("BEGIN IMMEDIATE")
+            self._local.in_transaction = True
+            try:
+                yield conn
+            except BaseException:
+                conn.rollback()
+                raise
+            else:
+                conn.commit()
+            finally:
+                self._local.in_transaction = False
+    
+    def unit_of_work(self) -> "UnitOfWork":
+        """创建工作单元：先收集写操作，提交时在一个事务内批量写入"""
+        return UnitOfWork(self)
+    
+    @staticmethod
+    def _inserted_ids(cursor: sqlite3.Cursor, count: int) -> List[int]:
+        """executemany 插入的行ID：事务持有写锁且主键自增，新行ID连续分配"""
+        if count == 0:
+            return []
+        last_id = cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+        return list(range(last_id - count + 1, last_id + 1))
+    
+    @staticmethod
+    def _limit(limit: Optional[int]) -> int:
+        """LIMIT 参数：非正数或未指定时返回 -1（SQLite 中表示不限制）"""
+        return int(limit) if isinstance(limit, int) and limit > 0 else -1
+    
+    @staticmethod
+    def create_tag_tables(cursor: sqlite3.Cursor):
+        """创建 问题↔领域标签 关联表：domain_tags JSON 字段的规范化副本，供按标签统计与查找问题
+        
+        主键 (tag, question_id) 同时是按标签计数、按标签分页查找问题所需的覆盖索引。
+        """
+        for table, parent in (("original_question_tags", "original_questions"),
+                              ("generated_question_tags", "generated_questions")):
+            cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    tag TEXT NOT NULL,
+                    question_id INTEGER NOT NULL,
+                    PRIMARY KEY (tag, question_id),
+                    FOREIGN KEY (question_id) REFERENCES {parent} (id)
+                ) WITHOUT ROWID
+            """)
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_question_id ON {table} (question_id)")
+    
+    @staticmethod
+    def _insert_tags(cursor: sqlite3.Cursor, table: str, tagged_ids: Sequence[Tuple[int, List[str]]]):
+        """写入问题的领域标签关联（与问题插入处于同一事务，保持同步）"""
+        cursor.executemany(
+            f"INSERT OR IGNORE INTO {table} (tag, question_id) VALUES (?, ?)",
+            [(tag, question_id) for question_id, domain_tags in tagged_ids for tag in dict.fromkeys(domain_tags)]
+        )
+    
+    @staticmethod
+    def create_dedup_table(cursor: sqlite3.Cursor):
+        """创建生成问题的 LSH 分桶表：每道题每个带一行，近似重复的问题大概率共享至少一个桶
+        
+        主键 (bucket, question_id) 使按桶查找候选只需索引查找，耗时取决于命中桶的大小而非题库规模。
+        """
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS generated_question_lsh (
+                bucket INTEGER NOT NULL,
+                question_id INTEGER NOT NULL,
+                PRIMARY KEY (bucket, question_id),
+                FOREIGN KEY (question_id) REFERENCES generated_questions (id)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_generated_question_lsh_question_id ON generated_question_lsh (question_id)"
+        )
+    
+    @staticmethod
+    def _insert_dedup_buckets(cursor: sqlite3.Cursor, question_buckets: Sequence[Tuple[int, List[int]]]):
+        """写入生成问题的 LSH 桶号（与问题插入处于同一事务，保持同步）
+        
+        桶号由调用方在事务外用 lsh_buckets 预先计算，避免持有写锁期间做哈希计算。
+        """
+        cursor.executemany(
+            "INSERT OR IGNORE INTO generated_question_lsh (bucket, question_id) VALUES (?, ?)",
+            [(bucket, question_id) for question_id, buckets in question_buckets for bucket in buckets]
+        )
+    
+    @classmethod
+    def backfill_dedup_index(cls, cursor: sqlite3.Cursor, batch_size: int = 1000) -> int:
+        """为尚未建立 LSH 桶号的生成问题补建索引（按ID分批），返回补建的问题数"""
+        total = 0
+        last_id = 0
+        while True:
+            cursor.execute("""
+                SELECT id, question FROM generated_questions gq
+                WHERE id > ? AND NOT EXISTS (SELECT 1 FROM generated_question_lsh WHERE question_id = gq.id)
+                ORDER BY id
+                LIMIT ?
+            """, (last_id, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                return total
+            cls._insert_dedup_buckets(
+                cursor, [(question_id, lsh_buckets(char_shingles(question))) for question_id, question in rows]
+            )
+            total += len(rows)
+            last_id = rows[-1][0]
+    
+    def _create_fts_tables(self, cursor: sqlite3.Cursor):
+        """创建全文索引表与同步触发器
+        
+        中文没有空格分词，优先使用 trigram 分词器（任意 3 个字符以上的子串都能走索引），
+        SQLite 不支持时退回 unicode61；不支持 FTS5 时不启用搜索。
+        在已有数据的旧数据库上新建的索引表先记入 fts_pending_rebuild，存量数据由 migrate_database.py 重建，
+        避免打开数据库（工作流、查看工具）时长时间阻塞。
+        """
+        existing = dict(cursor.execute(
+            f"SELECT name, sql FROM sqlite_master WHERE type = 'table' AND name IN ({', '.join('?' * len(FTS_TABLES))})",
+            tuple(FTS_TABLES)
+        ).fetchall())
+        if existing:
+            self.fts_trigram = "trigram" in next(iter(existing.values())).lower()
+        else:
+            self.fts_trigram = self._fts_tokenizer_available(cursor, "trigram")
+            if not self.fts_trigram and not self._fts_tokenizer_available(cursor, "unicode61"):
+                print("⚠️ 当前 SQLite 不支持 FTS5，全文搜索不可用")
+                self.fts_enabled = False
+                return
+        self.fts_enabled = True
+        tokenizer = "trigram" if self.fts_trigram else "unicode61"
+        cursor.execute("CREATE TABLE IF NOT EXISTS fts_pending_rebuild (name TEXT PRIMARY KEY)")
+        
+        for table, (content, columns) in FTS_TABLES.items():
+            cursor.execute(f"""
+                CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(
+                    {", ".join(columns)}, content='{content}', content_rowid='id', tokenize='{tokenizer}'
+                )
+            """)
+            new_values = ", ".join(f"new.{column}" for column in columns)
+            old_values = ", ".join(f"old.{column}" for column in columns)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON {content} BEGIN
+                    INSERT INTO {table} (rowid, {", ".join(columns)}) VALUES (new.id, {new_values});
+                END
+            """)
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON {content} BEGIN
+                    INSERT INTO {table} ({table}, rowid, {", ".join(columns)}) VALUES ('delete', old.id, {old_values});
+                END
+            """)
+            # 只在被索引的列变化时更新索引（更新检查结果等不触发）
+            cursor.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE OF {", ".join(columns)} ON {content} BEGIN
+                    INSERT INTO {table} ({table}, rowid, {", ".join(columns)}) VALUES ('delete', old.id, {old_values});
+                    INSERT INTO {table} (rowid, {", ".join(columns)}) VALUES (new.id, {new_values});
+                END
+            """)
+            # 内容表为空时触发器已能保持同步，无需重建
+            if table not in existing and cursor.execute(f"SELECT 1 FROM {content} LIMIT 1").fetchone():
+                cursor.execute("INSERT OR IGNORE INTO fts_pending_rebuild (name) VALUES (?)", (table,))
+    
+    def fts_pending_tables(self) -> List[str]:
+        """尚未用存量数据建立的全文索引表"""
+        if not self.fts_enabled:
+            return []
+        with self.get_connection() as conn:
+            pending = {row[0] for row in conn.execute("SELECT name FROM fts_pending_rebuild")}
+        return [table for table in FTS_TABLES if table in pending]
+    
+    def rebuild_fts_index(self) -> List[str]:
+        """用存量数据建立尚未建立的全文索引，返回建立的索引表（数据量大时耗时较长，由 migrate_database.py 调用）"""
+        pending = self.fts_pending_tables()
+        for table in pending:
+            with self.transaction() as conn:
+                conn.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
+                conn.execute("DELETE FROM fts_pending_rebuild WHERE name = ?", (table,))
+        return pending
+    
+    @staticmethod
+    def _fts_tokenizer_available(cursor: sqlite3.Cursor, tokenizer: str) -> bool:
+        try:
+            cursor.execute(f"CREATE VIRTUAL TABLE temp.fts_probe USING fts5(x, tokenize='{tokenizer}')")
+        except sqlite3.OperationalError:
+            return False
+        cursor.execute("DROP TABLE temp.fts_probe")
+        return True
+    
     def init_database(self):
         """初始化数据库表"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.get_connection() as conn:
             cursor = conn.cursor()
             
             # 创建原始问题表
@@ -26,9 +427,19 @@ class DatabaseManager:
                     answer TEXT NOT NULL,
                     domain_tags TEXT NOT NULL,
                     question_type TEXT NOT NULL,
+                    content_hash TEXT,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
                 )
             """)
+            # 旧数据库补充 content_hash 字段（存量数据的哈希由 migrate_database.py 回填）
+            try:
+                cursor.execute("ALTER TABLE original_questions ADD COLUMN content_hash TEXT")
+            except sqlite3.OperationalError as e:
+                if "duplicate column name" not in str(e):
+                    raise
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_original_questions_content_hash ON original_questions (content_hash)"
+            )
             
             # 创建生成问题表
             cursor.execute("""
@@ -58,6 +469,26 @@ class DatabaseManager:
                 )
             """)
             
+            self.create_tag_tables(cursor)
+            
+            # 存量问题的 LSH 桶号由 migrate_database.py 回填
+            self.create_dedup_table(cursor)
+            
+            self._create_fts_tables(cursor)
+            
+            # 关联查询与按时间倒序分页使用的索引；created_at 索引隐含 rowid，
+            # 可直接满足 ORDER BY created_at DESC, id DESC ... LIMIT 的索引倒序扫描
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_generated_questions_original_question_id "
+                "ON generated_questions (original_question_id)"
+            )
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_question_solutions_question_id ON question_solutions (question_id)"
+            )
+            cursor.execute(
+                "CREATE INDEX IF NOT EXISTS idx_question_solutions_created_at ON question_solutions (created_at)"
+            )
+            
             # 创建只读视图：汇总 问题/思维链/答案，便于统一查看
             cursor.execute(
                 """
@@ -73,39 +504,128 @@ class DatabaseManager:
                 JOIN generated_questions gq ON qs.question_id = gq.id
                 """
             )
-
+            
             conn.commit()
     
     def insert_original_question(self, question: str, thinking_chain: str, 
                                answer: str, domain_tags: List[str], question_type: str) -> int:
         """插入原始问题"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.transaction() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO original_questions 
-                (question, thinking_chain, answer, domain_tags, question_type)
-                VALUES (?, ?, ?, ?, ?)
-            """, (question, thinking_chain, answer, json.dumps(domain_tags), question_type))
-            return cursor.lastrowid
+                (question, thinking_chain, answer, domain_tags, question_type, content_hash)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (question, thinking_chain, answer, json.dumps(domain_tags), question_type,
+                  question_content_hash(question, thinking_chain, answer)))
+            question_id = cursor.lastrowid
+            self._insert_tags(cursor, "original_question_tags", [(question_id, domain_tags)])
+            return question_id
+    
+    def find_original_question_tags(self, question: str, thinking_chain: str,
+                                    answer: str) -> Optional[Tuple[List[str], str]]:
+        """按规范化内容哈希查找已打过标签的原始问题，返回 (领域标签, 题型)"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT domain_tags, question_type
+                FROM original_questions
+                WHERE content_hash = ?
+                ORDER BY id DESC
+                LIMIT 1
+            """, (question_content_hash(question, thinking_chain, answer),))
+            row = cursor.fetchone()
+            if not row:
+                return None
+            return json.loads(row[0]), row[1]
     
     def insert_generated_question(self, original_question_id: int, 
                                 question: str, domain_tags: List[str], question_type: str) -> int:
         """插入生成的问题"""
-        with sqlite3.connect(self.db_path) as conn:
+        buckets = lsh_buckets(char_shingles(question))
+        with self.transaction() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO generated_questions 
                 (original_question_id, question, domain_tags, question_type)
                 VALUES (?, ?, ?, ?)
             """, (original_question_id, question, json.dumps(domain_tags), question_type))
-            return cursor.lastrowid
+            question_id = cursor.lastrowid
+            self._insert_tags(cursor, "generated_question_tags", [(question_id, domain_tags)])
+            self._insert_dedup_buckets(cursor, [(question_id, buckets)])
+            return question_id
+    
+    def insert_generated_questions(self, original_question_id: int,
+                                   rows: Sequence[GeneratedQuestionRow]) -> List[int]:
+        """批量插入生成的问题，返回与 rows 一一对应的ID"""
+        buckets = [lsh_buckets(char_shingles(row[0])) for row in rows]
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT INTO generated_questions 
+                (original_question_id, question, domain_tags, question_type)
+                VALUES (?, ?, ?, ?)
+            """, [(original_question_id, question, json.dumps(domain_tags), question_type)
+                  for question, domain_tags, question_type in rows])
+            question_ids = self._inserted_ids(cursor, len(rows))
+            self._insert_tags(cursor, "generated_question_tags",
+                              [(question_id, row[1]) for question_id, row in zip(question_ids, rows)])
+            self._insert_dedup_buckets(cursor, list(zip(question_ids, buckets)))
+            return question_ids
+    
+    def find_similar_generated_question(self, question: str, threshold: float, max_candidates: int = 32,
+                                        solved_only: bool = False) -> Optional[Tuple[int, float]]:
+        """在全部历史生成问题中查找与 question 近似重复的问题，返回 (问题ID, 相似度)
+        
+        每个桶只沿主键索引取最新的 max_candidates 道题（同一模板的大量题目会形成大桶，
+        不限制时扫描量随题库线性增长），取共享桶最多的候选，再计算精确的 Jaccard 相似度确认。
+        solved_only=True 时只考虑已保存了非空答案的问题。
+        """
+        shingles = char_shingles(question)
+        buckets = lsh_buckets(shingles)
+        per_bucket = " UNION ALL ".join(
+            "SELECT question_id FROM (SELECT question_id FROM generated_question_lsh "
+            "WHERE bucket = ? ORDER BY question_id DESC LIMIT ?)"
+            for _ in buckets
+        )
+        solved = (
+            "WHERE EXISTS (SELECT 1 FROM question_solutions qs WHERE qs.question_id = gq.id AND qs.answer != '')"
+            if solved_only else ""
+        )
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT gq.id, gq.question
+                FROM (
+                    SELECT question_id, COUNT(*) AS shared
+                    FROM ({per_bucket})
+                    GROUP BY question_id
+                    ORDER BY shared DESC, question_id DESC
+                    LIMIT ?
+                ) candidates
+                JOIN generated_questions gq ON gq.id = candidates.question_id
+                {solved}
+            """, (*[value for bucket in buckets for value in (bucket, max_candidates)], max_candidates))
+            best = None
+            for question_id, candidate in cursor.fetchall():
+                similarity = jaccard(shingles, char_shingles(candidate))
+                if similarity >= threshold and (best is None or similarity > best[1]):
+                    best = (question_id, similarity)
+            return best
+    
+    def rebuild_dedup_index(self) -> int:
+        """清空并重建全部生成问题的 LSH 索引（修改 MinHash/LSH 参数后使用），返回索引的问题数"""
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM generated_question_lsh")
+            return self.backfill_dedup_index(cursor)
     
     def insert_question_solution(self, question_id: int, thinking_chain: str, 
                                answer: str, verification_score: Optional[int] = None,
                                verification_passed: Optional[bool] = None,
                                verification_feedback: Optional[str] = None) -> int:
         """插入问题解答"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.transaction() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 INSERT INTO question_solutions 
@@ -114,10 +634,43 @@ class DatabaseManager:
             """, (question_id, thinking_chain, answer, verification_score, verification_passed, verification_feedback))
             return cursor.lastrowid
     
+    def insert_question_solutions(self, rows: Sequence[SolutionRow]) -> List[int]:
+        """批量插入解答（暂不含验证信息），返回与 rows 一一对应的ID"""
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            cursor.executemany("""
+                INSERT INTO question_solutions 
+                (question_id, thinking_chain, answer)
+                VALUES (?, ?, ?)
+            """, list(rows))
+            return self._inserted_ids(cursor, len(rows))
+    
+    def update_solution_content(self, solution_id: int, thinking_chain: str, answer: str):
+        """更新解答的思维链与答案（流式解答过程中持续写入部分内容）"""
+        if self._defer(self.update_solution_content, solution_id, thinking_chain, answer):
+            return
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE question_solutions 
+                SET thinking_chain = ?, answer = ?
+                WHERE id = ?
+            """, (thinking_chain, answer, solution_id))
+    
+    def delete_question_solution(self, solution_id: int):
+        """删除解答"""
+        if self._defer(self.delete_question_solution, solution_id):
+            return
+        with self.transaction() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM question_solutions WHERE id = ?", (solution_id,))
+    
     def update_solution_verification(self, solution_id: int, score: int, 
                                    passed: bool, feedback: str):
         """更新解答的检查结果"""
-        with sqlite3.connect(self.db_path) as conn:
+        if self._defer(self.update_solution_verification, solution_id, score, passed, feedback):
+            return
+        with self.transaction() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 UPDATE question_solutions 
@@ -125,9 +678,20 @@ class DatabaseManager:
                 WHERE id = ?
             """, (score, passed, feedback, solution_id))
     
+    def update_solution_verifications(self, rows: Sequence[VerificationRow]):
+        """批量更新解答的检查结果"""
+        if self._defer(self.update_solution_verifications, rows):
+            return
+        with self.transaction() as conn:
+            conn.executemany("""
+                UPDATE question_solutions 
+                SET verification_score = ?, verification_passed = ?, verification_feedback = ?
+                WHERE id = ?
+            """, [(score, passed, feedback, solution_id) for solution_id, score, passed, feedback in rows])
+    
     def get_generated_questions(self, original_question_id: int) -> List[GeneratedQuestion]:
         """获取生成的问题"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT id, original_question_id, question, domain_tags, question_type, created_at
@@ -147,9 +711,115 @@ class DatabaseManager:
                 ))
             return questions
     
+    def get_tag_counts(self, generated: bool = False) -> List[Tuple[str, int]]:
+        """各领域标签下的问题数（原始问题；generated=True 时为生成的问题），按数量降序"""
+        table = "generated_question_tags" if generated else "original_question_tags"
+        with self.get_connection() as conn:
+            return conn.execute(f"""
+                SELECT tag, COUNT(*) AS question_count
+                FROM {table}
+                GROUP BY tag
+                ORDER BY question_count DESC, tag
+            """).fetchall()
+    
+    def count_questions_with_tag(self, tag: str) -> Tuple[int, int]:
+        """带有该领域标签的 (原始问题数, 生成问题数)"""
+        with self.get_connection() as conn:
+            return (
+                conn.execute("SELECT COUNT(*) FROM original_question_tags WHERE tag = ?", (tag,)).fetchone()[0],
+                conn.execute("SELECT COUNT(*) FROM generated_question_tags WHERE tag = ?", (tag,)).fetchone()[0],
+            )
+    
+    def get_generated_questions_by_tag(self, tag: str, limit: int = 20,
+                                       after_id: Optional[int] = None) -> List[GeneratedQuestion]:
+        """按领域标签查找生成的问题（最新在前），after_id 为上一页最后一道题的ID"""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT gq.id, gq.original_question_id, gq.question, gq.domain_tags, gq.question_type, gq.created_at
+                FROM generated_question_tags t
+                JOIN generated_questions gq ON gq.id = t.question_id
+                WHERE t.tag = ? AND t.question_id < ?
+                ORDER BY t.question_id DESC
+                LIMIT ?
+            """, (tag, after_id if after_id is not None else self.MAX_ROWID, self._limit(limit)))
+            return [
+                GeneratedQuestion(
+                    id=row[0],
+                    original_question_id=row[1],
+                    question=row[2],
+                    domain_tags=json.loads(row[3]),
+                    question_type=row[4],
+                    created_at=datetime.fromisoformat(row[5])
+                )
+                for row in cursor.fetchall()
+            ]
+    
+    def search(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """全文搜索原始问题、生成的问题、思维链与答案，返回按相关度（bm25）排序的命中
+        
+        每条命中包含 type（original_question / generated_question / solution）、id、
+        score（越小越相关）与带【】高亮的 snippet。多个关键词以空格分隔，需同时出现。
+        trigram 分词下不足 3 个字的关键词无法走索引：与其他关键词一起出现时在索引命中上再做 LIKE 过滤，
+        全部关键词都不足 3 个字时退化为扫描全文索引表，按ID倒序返回。
+        旧数据库的全文索引尚未建立时抛出 RuntimeError，而不是返回不完整的结果。
+        """
+        terms = query.split()
+        if not terms or not self.fts_enabled:
+            return []
+        pending = self.fts_pending_tables()
+        if pending:
+            raise RuntimeError(
+                f"全文索引尚未建立（{', '.join(pending)}）：请先运行 python migrate_database.py 为已有数据建立索引"
+            )
+        if self.fts_trigram:
+            indexed = [term for term in terms if len(term) >= 3]
+            filtered = [term for term in terms if len(term) < 3]
+        else:
+            indexed, filtered = terms, []
+        
+        hits = []
+        with self.get_connection() as conn:
+            for table, (_, columns) in FTS_TABLES.items():
+                text = " || ' ' || ".join(columns)
+                conditions = [f"({text}) LIKE ? ESCAPE '\\'"] * len(filtered)
+                params: List[Any] = [self._like_pattern(term) for term in filtered]
+                if indexed:
+                    # 每个关键词作为短语，避免 FTS5 查询语法字符（引号、括号、AND/OR 等）被解释
+                    conditions.insert(0, f"{table} MATCH ?")
+                    params.insert(0, " ".join('"%s"' % term.replace('"', '""') for term in indexed))
+                    select = f"bm25({table}), snippet({table}, -1, '【', '】', '…', 24)"
+                    order = "rank"
+                else:
+                    select = f"0.0, {text}"
+                    order = "rowid DESC"
+                rows = conn.execute(f"""
+                    SELECT rowid, {select}
+                    FROM {table}
+                    WHERE {" AND ".join(conditions)}
+                    ORDER BY {order}
+                    LIMIT ?
+                """, (*params, self._limit(limit))).fetchall()
+                for row_id, score, snippet in rows:
+                    if not indexed:
+                        snippet = self._plain_snippet(snippet, terms[0])
+                    hits.append({"type": FTS_HIT_TYPES[table], "id": row_id, "score": score, "snippet": snippet})
+        hits.sort(key=lambda hit: (hit["score"], -hit["id"]))
+        return hits[:limit] if limit and limit > 0 else hits
+    
+    @staticmethod
+    def _like_pattern(term: str) -> str:
+        return "%" + term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    
+    @staticmethod
+    def _plain_snippet(content: str, term: str, context: int = 20) -> str:
+        """未经过全文索引匹配时，截取关键词附近的文本并高亮"""
+        pos = max(content.find(term), 0)
+        return content[max(0, pos - context):pos + len(term) + context].replace(term, f"【{term}】")
+    
     def get_question_solutions(self, question_id: int) -> List[QuestionSolution]:
         """获取问题解答"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT qs.id, qs.question_id, gq.question, qs.thinking_chain, qs.answer, 
@@ -174,11 +844,14 @@ class DatabaseManager:
                 ))
             return solutions
     
-    def get_all_solutions_with_questions(self, original_question_id: Optional[int] = None) -> List[QuestionSolution]:
-        """获取所有解答，包含问题内容和标签信息"""
-        with sqlite3.connect(self.db_path) as conn:
+    def get_all_solutions_with_questions(self, original_question_id: Optional[int] = None,
+                                         limit: Optional[int] = None) -> List[QuestionSolution]:
+        """获取所有解答（按创建时间倒序），包含问题内容和标签信息；limit 限制返回条数"""
+        with self.get_connection() as conn:
             cursor = conn.cursor()
             
+            # created_at 为 CURRENT_TIMESTAMP 生成的定长文本，直接比较即为时间顺序；
+            # 不能包一层 datetime()，否则无法使用索引，只能全表排序。同一秒内按 id 排序
             if original_question_id:
                 # 获取特定原始问题生成的所有解答
                 cursor.execute("""
@@ -186,16 +859,18 @@ class DatabaseManager:
                     FROM question_solutions qs
                     JOIN generated_questions gq ON qs.question_id = gq.id
                     WHERE gq.original_question_id = ?
-                    ORDER BY qs.created_at DESC
-                """, (original_question_id,))
+                    ORDER BY qs.created_at DESC, qs.id DESC
+                    LIMIT ?
+                """, (original_question_id, self._limit(limit)))
             else:
                 # 获取所有解答
                 cursor.execute("""
                     SELECT qs.id, qs.question_id, gq.question, qs.thinking_chain, qs.answer, qs.created_at
                     FROM question_solutions qs
                     JOIN generated_questions gq ON qs.question_id = gq.id
-                    ORDER BY qs.created_at DESC
-                """)
+                    ORDER BY qs.created_at DESC, qs.id DESC
+                    LIMIT ?
+                """, (self._limit(limit),))
             
             solutions = []
             for row in cursor.fetchall():
@@ -208,18 +883,86 @@ class DatabaseManager:
                     created_at=datetime.fromisoformat(row[5])
                 ))
             return solutions
-
+    
+    def get_solutions_page(self, after_id: Optional[int] = None, limit: int = 20,
+                           original_question_id: Optional[int] = None) -> List[QuestionSolution]:
+        """按解答ID倒序（最新在前）分页获取解答
+        
+        游标分页：after_id 传上一页最后一条解答的ID（第一页为 None），
+        每页都是主键索引上的一次范围扫描，翻到多深都不需要跳过前面的行。
+        """
+        conditions = ["qs.id < ?"] if after_id is not None else []
+        params: List[Any] = [after_id] if after_id is not None else []
+        if original_question_id:
+            conditions.append("gq.original_question_id = ?")
+            params.append(original_question_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT qs.id, qs.question_id, gq.question, qs.thinking_chain, qs.answer, qs.created_at
+                FROM question_solutions qs
+                JOIN generated_questions gq ON qs.question_id = gq.id
+                {where}
+                ORDER BY qs.id DESC
+                LIMIT ?
+            """, (*params, self._limit(limit)))
+            return [
+                QuestionSolution(
+                    id=row[0],
+                    question_id=row[1],
+                    question=row[2],
+                    thinking_chain=row[3],
+                    answer=row[4],
+                    created_at=datetime.fromisoformat(row[5])
+                )
+                for row in cursor.fetchall()
+            ]
+    
+    def get_max_solution_id(self) -> int:
+        """当前最大的解答ID（没有解答时为 0），用于固定导出范围"""
+        with self.get_connection() as conn:
+            return conn.execute("SELECT COALESCE(MAX(id), 0) FROM question_solutions").fetchone()[0]
+    
+    def count_solutions(self, max_id: Optional[int] = None) -> int:
+        """统计解答数量（只统计ID不超过 max_id 的解答）"""
+        with self.get_connection() as conn:
+            if max_id is None:
+                return conn.execute("SELECT COUNT(*) FROM question_solutions").fetchone()[0]
+            return conn.execute("SELECT COUNT(*) FROM question_solutions WHERE id <= ?", (max_id,)).fetchone()[0]
+    
+    def iter_solution_rows(self, batch_size: int = 1000,
+                           max_id: Optional[int] = None) -> Iterator[Tuple[int, int, str, str, str, str]]:
+        """按解答ID升序流式读取 (解答ID, 问题ID, 问题, 思维链, 答案, 创建时间)
+        
+        每批按主键游标查询 batch_size 行，不构造模型对象，内存占用与数据总量无关；
+        传入 max_id 时只读取此前已存在的解答，导出过程中新增的解答不会混入。
+        """
+        last_id = 0
+        while True:
+            with self.get_connection() as conn:
+                rows = conn.execute("""
+                    SELECT qs.id, qs.question_id, gq.question, qs.thinking_chain, qs.answer, qs.created_at
+                    FROM question_solutions qs
+                    JOIN generated_questions gq ON qs.question_id = gq.id
+                    WHERE qs.id > ? AND qs.id <= ?
+                    ORDER BY qs.id
+                    LIMIT ?
+                """, (last_id, max_id if max_id is not None else self.MAX_ROWID, batch_size)).fetchall()
+            if not rows:
+                return
+            yield from rows
+            last_id = rows[-1][0]
+    
     def get_qa_overview(self, limit: Optional[int] = None):
         """获取 QA 总览视图（问题/思维链/答案）"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.get_connection() as conn:
             cursor = conn.cursor()
-            base_sql = (
+            cursor.execute(
                 "SELECT solution_id, question_id, question, thinking_chain, answer, created_at "
-                "FROM qa_overview ORDER BY datetime(created_at) DESC"
+                "FROM qa_overview ORDER BY created_at DESC, solution_id DESC LIMIT ?",
+                (self._limit(limit),)
             )
-            if limit and isinstance(limit, int) and limit > 0:
-                base_sql += f" LIMIT {int(limit)}"
-            cursor.execute(base_sql)
             rows = cursor.fetchall()
             results = []
             for r in rows:
@@ -235,7 +978,7 @@ class DatabaseManager:
     
     def get_solution_with_full_context(self, solution_id: int) -> Optional[dict]:
         """获取解答的完整上下文信息，包括原始问题、生成问题、解答等"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
                 SELECT 
@@ -285,3 +1028,76 @@ class DatabaseManager:
                     "created_at": row[13]
                 }
             }
+
+
+class UnitOfWork:
+    """工作单元：收集不需要立即拿到ID的写操作，commit 时在同一事务内用 executemany 批量写入
+    
+    提供与 DatabaseManager 同名的写方法，多线程共享同一实例是安全的。写操作在提交时才执行，
+    因此 insert_question_solution 不返回新解答的ID，需要ID的调用方应直接使用 DatabaseManager。
+    作为 with 语句使用时在块正常结束时提交，块内抛出异常时丢弃已收集的写操作。
+    """
+    
+    def __init__(self, db_manager: DatabaseManager):
+        self.db_manager = db_manager
+        self._lock = threading.Lock()
+        self._solutions: List[SolutionRow] = []
+        self._verifications: List[VerificationRow] = []
+    
+    def insert_question_solution(self, question_id: int, thinking_chain: str, answer: str) -> None:
+        """登记一条待插入的解答（ID 在提交时才分配，这里不返回）"""
+        with self._lock:
+            self._solutions.append((question_id, thinking_chain, answer))
+    
+    def update_solution_verification(self, solution_id: int, score: int, passed: bool, feedback: str):
+        """登记一次待写入的检查结果"""
+        with self._lock:
+            self._verifications.append((solution_id, score, passed, feedback))
+    
+    def commit(self):
+        """在一个事务内写入已收集的全部操作（后台写入模式下整体入队，不等待落盘）"""
+        with self._lock:
+            solutions, self._solutions = self._solutions, []
+            verifications, self._verifications = self._verifications, []
+        if solutions or verifications:
+            self._write(solutions, verifications)
+    
+    def rollback(self):
+        """丢弃已收集、尚未提交的写操作"""
+        with self._lock:
+            self._solutions = []
+            self._verifications = []
+    
+    def _write(self, solutions: List[SolutionRow], verifications: List[VerificationRow]):
+        if self.db_manager._defer(self._write, solutions, verifications):
+            return
+        with self.db_manager.transaction():
+            self.db_manager.insert_question_solutions(solutions)
+            self.db_manager.update_solution_verifications(verifications)
+    
+    def __enter__(self) -> "UnitOfWork":
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+
+_db_managers: Dict[str, DatabaseManager] = {}
+_db_managers_lock = threading.Lock()
+
+
+def get_db_manager(db_path: str = "questions.db") -> DatabaseManager:
+    """获取进程内共享的数据库管理器：同一数据库的所有代理与工作流共用一个写锁与后台写线程
+    
+    进程退出前会自动写完后台队列。
+    """
+    with _db_managers_lock:
+        db_manager = _db_managers.get(db_path)
+        if db_manager is None:
+            db_manager = DatabaseManager(db_path)
+            _db_managers[db_path] = db_manager
+            atexit.register(db_manager.close)
+        return db_manager
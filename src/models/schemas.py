@@ -1,5 +1,6 @@
-from pydantic import BaseModel
-from typing import List, Optional
+import operator
+from pydantic import BaseModel, field_validator
+from typing import Annotated, List, Optional, Union
 from datetime import datetime
 
 
@@ -50,6 +51,68 @@ class VerificationResult(BaseModel):
     suggestions: List[str] = []
 
 
+def _scalar_to_str(value):
+    """LLM 偶尔把文本字段返回为数字（如答案 5），统一转为字符串"""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    return value
+
+
+class TaggingResponse(BaseModel):
+    """标签识别的LLM响应"""
+    domain_tags: List[str] = []
+    question_type: str = "简答题"
+    
+    _coerce_text = field_validator("question_type", mode="before")(_scalar_to_str)
+
+
+class GeneratedQuestionItem(BaseModel):
+    """问题生成响应中的单道问题；未给出标签或题型时沿用原问题的"""
+    question: str = ""
+    domain_tags: Optional[List[str]] = None
+    question_type: Optional[str] = None
+    
+    _coerce_text = field_validator("question", "question_type", mode="before")(_scalar_to_str)
+
+
+class GenerationResponse(BaseModel):
+    """问题生成的LLM响应（兼容旧格式：问题为纯字符串）"""
+    questions: List[Union[GeneratedQuestionItem, str]] = []
+
+
+class SolutionResponse(BaseModel):
+    """解答的LLM响应"""
+    thinking_chain: str = ""
+    answer: str = ""
+    
+    _coerce_text = field_validator("thinking_chain", "answer", mode="before")(_scalar_to_str)
+
+
+class VerificationResponse(BaseModel):
+    """思维链检查的LLM响应"""
+    score: int = 0
+    passed: bool = False
+    feedback: str = ""
+    suggestions: List[str] = []
+    
+    _coerce_text = field_validator("feedback", mode="before")(_scalar_to_str)
+
+
+class QuestionBranchState(BaseModel):
+    """扇出分支状态：单道生成问题的 解答→检查"""
+    index: int  # 问题在 generated_questions 中的下标
+    question: GeneratedQuestion
+    solution: Optional[QuestionSolution] = None  # 流式生成阶段已提前得到的解答
+
+
+class QuestionBranchResult(BaseModel):
+    """扇出分支结果，由 reducer 汇总回 WorkflowState"""
+    index: int
+    solution: Optional[QuestionSolution] = None
+    verification_result: Optional[VerificationResult] = None
+    error: Optional[str] = None
+
+
 class WorkflowState(BaseModel):
     """工作流状态"""
     input_question: Optional[QuestionInput] = None
@@ -57,5 +120,8 @@ class WorkflowState(BaseModel):
     generated_questions: List[GeneratedQuestion] = []
     solutions: List[QuestionSolution] = []
     verification_results: List[VerificationResult] = []  # 思维链检查结果
+    duplicates_removed: int = 0  # 生成阶段丢弃的近似重复问题数
+    # 扇出模式下各分支的结果，通过 operator.add 合并（完成顺序不定，按 index 还原）
+    branch_results: Annotated[List[QuestionBranchResult], operator.add] = []
     current_step: str = "start"
     error: Optional[str] = None
@@ -1,51 +1,112 @@
-from typing import List
+import os
+import threading
+from typing import Dict, List, Optional, Sequence
 from .templates.tagging_prompt import TAGGING_PROMPT
-from .templates.generation_prompt import QUESTION_GENERATION_PROMPT  
+from .templates.generation_prompt import QUESTION_GENERATION_PROMPT
 from .templates.solution_prompt import SOLUTION_PROMPT
 from .templates.verification_prompt import VERIFICATION_PROMPT
+from ..utils.text_utils import compact_text, estimate_tokens
 
 
 class PromptManager:
     """提示词管理器"""
     
-    @staticmethod
-    def get_tagging_prompt(question: str, thinking_chain: str, answer: str) -> str:
+    # 种子问题的思维链与答案可能长达数千字：标签识别与问题生成提示词可按模板设置 token 预算
+    # （环境变量 PROMPT_TOKEN_BUDGET_<模板>，默认 0 即不限制），超出时按确定性策略压缩
+    # 思维链、答案（问题本身不压缩），相同输入总是得到相同的提示词，不影响响应缓存命中。
+    # 压缩会丢掉种子的部分推理细节，因此默认关闭，由使用者按需开启
+    DEFAULT_TOKEN_BUDGETS = {"tagging": 0, "generation": 0}
+    TEMPLATE_LABELS = {"tagging": "标签识别", "generation": "问题生成", "solution": "解答", "verification": "检查"}
+    # 压缩后每个字段至少保留的 token 数
+    MIN_FIELD_TOKENS = 64
+    
+    # 各模板的提示词 token 估算（进程内所有实例共享）
+    _stats_lock = threading.Lock()
+    _token_stats: Dict[str, Dict[str, int]] = {}
+    
+    def __init__(self):
+        self.token_budgets: Dict[str, int] = {
+            name: int(os.getenv(f"PROMPT_TOKEN_BUDGET_{name.upper()}", str(default)))
+            for name, default in self.DEFAULT_TOKEN_BUDGETS.items()
+        }
+    
+    def _render(self, name: str, template: str, fields: Dict[str, str],
+                compressible: Sequence[str] = ()) -> str:
+        """填充模板；超出该模板的 token 预算时依次压缩 compressible 中的字段，并记录 token 估算"""
+        prompt = template.format(**fields)
+        original_tokens = estimate_tokens(prompt)
+        tokens = original_tokens
+        budget = self.token_budgets.get(name, 0)
+        if budget > 0 and tokens > budget:
+            fields = dict(fields)
+            for field in compressible:
+                field_tokens = estimate_tokens(fields[field])
+                target = max(self.MIN_FIELD_TOKENS, field_tokens - (tokens - budget))
+                if target < field_tokens:
+                    fields[field] = compact_text(fields[field], target)
+                    prompt = template.format(**fields)
+                    tokens = estimate_tokens(prompt)
+                if tokens <= budget:
+                    break
+            print(f"⚠️ {self.TEMPLATE_LABELS[name]}提示词超出预算 {budget}，已压缩种子的思维链与答案: "
+                  f"约 {original_tokens} → {tokens} tokens")
+        self._record(name, original_tokens, tokens)
+        return prompt
+    
+    @classmethod
+    def _record(cls, name: str, original_tokens: int, tokens: int):
+        with cls._stats_lock:
+            stats = cls._token_stats.setdefault(
+                name, {"prompts": 0, "compacted": 0, "original_tokens": 0, "tokens": 0}
+            )
+            stats["prompts"] += 1
+            stats["compacted"] += tokens < original_tokens
+            stats["original_tokens"] += original_tokens
+            stats["tokens"] += tokens
+    
+    @classmethod
+    def get_token_stats(cls, name: Optional[str] = None) -> Dict[str, Dict[str, int]]:
+        """各模板的提示词数、被压缩数与压缩前后的估算 token 总数"""
+        with cls._stats_lock:
+            return {
+                template: dict(stats) for template, stats in cls._token_stats.items()
+                if name is None or template == name
+            }
+    
+    def get_tagging_prompt(self, question: str, thinking_chain: str, answer: str) -> str:
         """获取问题标签识别提示词"""
-        return TAGGING_PROMPT.format(
-            question=question,
-            thinking_chain=thinking_chain,
-            answer=answer
-        )
-    
-    @staticmethod
-    def get_question_generation_prompt(domain_tags: List[str], question_type: str,
-                                     original_question: str, thinking_chain: str, answer: str) -> str:
+        return self._render("tagging", TAGGING_PROMPT, {
+            "question": question,
+            "thinking_chain": thinking_chain,
+            "answer": answer
+        }, compressible=("thinking_chain", "answer"))
+    
+    def get_question_generation_prompt(self, domain_tags: List[str], question_type: str,
+                                       original_question: str, thinking_chain: str, answer: str) -> str:
         """获取问题生成提示词"""
-        return QUESTION_GENERATION_PROMPT.format(
-            domain_tags="、".join(domain_tags) if domain_tags else "教育",
-            original_question=original_question,
-            thinking_chain=thinking_chain,
-            answer=answer,
-            question_type=question_type
-        )
-    
-    @staticmethod
-    def get_solution_prompt(domain_tags: List[str], question_type: str, question: str) -> str:
+        return self._render("generation", QUESTION_GENERATION_PROMPT, {
+            "domain_tags": "、".join(domain_tags) if domain_tags else "教育",
+            "original_question": original_question,
+            "thinking_chain": thinking_chain,
+            "answer": answer,
+            "question_type": question_type
+        }, compressible=("thinking_chain", "answer"))
+    
+    def get_solution_prompt(self, domain_tags: List[str], question_type: str, question: str) -> str:
         """获取问题解答提示词"""
-        return SOLUTION_PROMPT.format(
-            domain_tags="、".join(domain_tags) if domain_tags else "教育",
-            question=question,
-            question_type=question_type
-        )
-    
-    @staticmethod
-    def get_verification_prompt(domain_tags: List[str], question_type: str, 
-                              question: str, thinking_chain: str, answer: str) -> str:
-        """获取思维链检查提示词"""
-        return VERIFICATION_PROMPT.format(
-            domain_tags="、".join(domain_tags) if domain_tags else "教育",
-            question=question,
-            question_type=question_type,
-            thinking_chain=thinking_chain,
-            answer=answer
-        )
+        return self._render("solution", SOLUTION_PROMPT, {
+            "domain_tags": "、".join(domain_tags) if domain_tags else "教育",
+            "question": question,
+            "question_type": question_type
+        })
+    
+    def get_verification_prompt(self, domain_tags: List[str], question_type: str,
+                                question: str, thinking_chain: str, answer: str) -> str:
+        """获取思维链检查提示词（被检查的解答需要完整保留，不压缩）"""
+        return self._render("verification", VERIFICATION_PROMPT, {
+            "domain_tags": "、".join(domain_tags) if domain_tags else "教育",
+            "question": question,
+            "question_type": question_type,
+            "thinking_chain": thinking_chain,
+            "answer": answer
+        })
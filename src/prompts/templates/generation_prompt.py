@@ -1,24 +1,15 @@
 """
 问题生成提示词模板
 基于原题生成相似问题
+静态说明在前、原题与标签在后，便于提供方复用提示词前缀缓存
 """
 
 QUESTION_GENERATION_PROMPT = """
-你是一位{domain_tags}领域的出题专家，擅长根据给定的题目生成同类型的相似问题。
+你是一位出题专家，擅长根据给定的题目生成同类型的相似问题。
 
-原题目：{original_question}
-
-原题思维链：{thinking_chain}
-
-原题答案：{answer}
-
-原题标签：
-- 领域标签：{domain_tags}
-- 题型标签：{question_type}
-
-请基于以上原题，生成5道同样知识点和题型的相似问题。要求：
+请基于最后给出的原题，生成5道同样知识点和题型的相似问题。要求：
 1. 保持相同的知识点和解题思路
-2. 保持相同的题型（{question_type}）
+2. 保持相同的题型（原题的题型标签）
 3. 改变问题的具体情境、数值或背景
 4. 确保问题有明确的答案
 5. 如若没有情境，可为其补充一个合理的情境
@@ -32,36 +23,48 @@ QUESTION_GENERATION_PROMPT = """
    - 避免包含误导性假设的问题
    - 避免重复或高度相似的问题   
 
-请以JSON格式返回，例如：
+请以JSON格式返回，格式如下：
 {{
     "questions": [
         {{
             "question": "问题1内容",
             "domain_tags": ["数学", "统计学"],
-            "question_type": "{question_type}"
+            "question_type": "原题的题型标签"
         }},
         {{
             "question": "问题2内容", 
             "domain_tags": ["数学", "统计学"],
-            "question_type": "{question_type}"
+            "question_type": "原题的题型标签"
         }},
         {{
             "question": "问题3内容",
             "domain_tags": ["数学", "统计学"], 
-            "question_type": "{question_type}"
+            "question_type": "原题的题型标签"
         }},
         {{
             "question": "问题4内容",
             "domain_tags": ["数学", "统计学"],
-            "question_type": "{question_type}"
+            "question_type": "原题的题型标签"
         }},
         {{
             "question": "问题5内容",
             "domain_tags": ["数学", "统计学"],
-            "question_type": "{question_type}"
+            "question_type": "原题的题型标签"
         }}
     ]
 }}
 
 只返回JSON，不要其他解释。
+
+## 原题
+
+原题标签：
+- 领域标签：{domain_tags}
+- 题型标签：{question_type}
+
+原题目：{original_question}
+
+原题思维链：{thinking_chain}
+
+原题答案：{answer}
 """
@@ -1,21 +1,16 @@
 """
 问题解答提示词模板
 为生成的问题提供详细解答
+静态说明在前、问题与标签在后，便于提供方复用提示词前缀缓存
 """
 
 SOLUTION_PROMPT = """
-你是一位{domain_tags}领域的解题专家，请详细解答以下问题。
-
-问题：{question}
-
-问题标签：
-- 领域标签：{domain_tags}
-- 题型标签：{question_type}
+你是一位解题专家，请详细解答最后给出的问题。
 
 ## 特殊要求 - 领域与受众适配(MGA)：
 根据以下领域与受众组合，调整你的回答风格和深度：
 
-**当前领域**: {domain_tags}
+**当前领域**: 问题标签中的领域标签
 **目标受众**: 本科计算机类学生
 
 ## Skills:
@@ -66,4 +61,12 @@ SOLUTION_PROMPT = """
 - 符合题型要求的解答格式
 
 只返回JSON，不要其他解释。
+
+## 待解答的问题
+
+问题标签：
+- 领域标签：{domain_tags}
+- 题型标签：{question_type}
+
+问题：{question}
 """
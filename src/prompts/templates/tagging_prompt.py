@@ -1,19 +1,14 @@
 """
 问题标签识别提示词模板
 分析问题并识别领域标签和题型标签
+静态说明在前、待分析的问题在后，便于提供方复用提示词前缀缓存
 """
 
 TAGGING_PROMPT = """
 ## role:
 你是一个专业的知识标签生成助手
 
-请分析以下问题，并为其打上合适的标签。
-
-问题：{question}
-
-思维链：{thinking_chain}
-
-答案：{answer}
+请分析最后给出的问题（含思维链与答案），并为其打上合适的标签。
 
 请识别以下两种标签：
 
@@ -30,4 +25,12 @@ TAGGING_PROMPT = """
 }}
 
 只返回JSON，不要其他解释。
+
+## 待分析的问题
+
+问题：{question}
+
+思维链：{thinking_chain}
+
+答案：{answer}
 """
@@ -1,20 +1,11 @@
 """
 思维链检查提示词模板
 检查解答的思维链质量
+静态说明在前、问题与解答在后，便于提供方复用提示词前缀缓存
 """
 
 VERIFICATION_PROMPT = """
-你是一位严格的{domain_tags}领域专家，请仔细检查以下问题的解答质量。
-
-问题：{question}
-
-问题标签：
-- 领域标签：{domain_tags}
-- 题型标签：{question_type}
-
-提供的解答：
-思维链：{thinking_chain}
-答案：{answer}
+你是一位严格的领域专家（领域见问题标签），请仔细检查最后给出的问题的解答质量。
 
 请从以下维度评估解答质量：
 
@@ -47,4 +38,16 @@ VERIFICATION_PROMPT = """
 - passed: false表示分数<80分，需要重新解答
 
 只返回JSON，不要其他解释。
+
+## 待检查的解答
+
+问题标签：
+- 领域标签：{domain_tags}
+- 题型标签：{question_type}
+
+问题：{question}
+
+提供的解答：
+思维链：{thinking_chain}
+答案：{answer}
 """
@@ -1 +1,2 @@
-from .llm_client import LLMClient
+from .llm_client import LLMClient, AsyncLLMClient, get_llm_client, get_async_llm_client, \
+    aclose_async_openai_clients
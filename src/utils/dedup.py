@@ -0,0 +1,91 @@
+"""
+近似重复检测
+基于字符 n-gram 分片（shingle）的 Jaccard 相似度，适合不以空格分词的中文文本：
+同一次生成结果中与已保留问题过于相似的问题在解答之前被丢弃，节省后续的解答与检查调用。
+跨运行的历史去重使用 MinHash 签名的 LSH 分桶（见 lsh_buckets），桶号存入数据库后按索引查找候选。
+"""
+
+import hashlib
+import re
+import struct
+from typing import FrozenSet, List, Optional, Tuple
+
+from .text_utils import normalize_text
+
+# 分片前去除空白与常见标点，使仅标点/空格不同的问题视为相同
+_IGNORED_CHARS_RE = re.compile(r"[\s,.;:!?，。；：！？、“”‘’\"'()（）【】\[\]]+")
+
+# MinHash/LSH 参数：64 个哈希函数分为 16 个带、每带 4 行，相似度 s 的两个问题
+# 至少落入一个相同桶的概率为 1-(1-s^4)^16（s=0.8 时约 99.98%，s=0.5 时约 64%），
+# 候选再按精确的 Jaccard 相似度确认。修改这些参数后需要重建数据库中的索引
+MINHASH_PERMUTATIONS = 64
+LSH_BANDS = 16
+_MAX_HASH = (1 << 32) - 1
+# SHAKE-128 对每个分片输出 64 个 32 位整数，每一位置相当于一个独立的哈希函数；
+# 与进程无关（内置 hash() 每次启动随机化），签名可以持久化
+_HASH_VALUES = struct.Struct(f"<{MINHASH_PERMUTATIONS}I")
+_BAND_KEY = struct.Struct(f"<I{MINHASH_PERMUTATIONS // LSH_BANDS}I")
+
+
+def char_shingles(text: str, size: int = 3) -> FrozenSet[str]:
+    """文本规范化后的字符 n-gram 集合；短于 size 的文本整体作为一个分片"""
+    text = _IGNORED_CHARS_RE.sub("", normalize_text(text).lower())
+    if len(text) <= size:
+        return frozenset([text]) if text else frozenset()
+    return frozenset(text[i:i + size] for i in range(len(text) - size + 1))
+
+
+def minhash_signature(shingles: FrozenSet[str]) -> List[int]:
+    """分片集合的 MinHash 签名：每个哈希函数下的最小哈希值"""
+    if not shingles:
+        return [_MAX_HASH] * MINHASH_PERMUTATIONS
+    return list(map(min, zip(*(
+        _HASH_VALUES.unpack(hashlib.shake_128(shingle.encode("utf-8")).digest(_HASH_VALUES.size))
+        for shingle in shingles
+    ))))
+
+
+def lsh_buckets(shingles: FrozenSet[str]) -> List[int]:
+    """分片集合的 LSH 桶号（每个带一个，带序号参与哈希）：近似重复的文本大概率至少共享一个桶
+    
+    桶号为有符号 64 位整数，可直接存入 SQLite INTEGER 列。
+    """
+    signature = minhash_signature(shingles)
+    rows = MINHASH_PERMUTATIONS // LSH_BANDS
+    return [
+        int.from_bytes(
+            hashlib.blake2b(_BAND_KEY.pack(band, *signature[band * rows:(band + 1) * rows]), digest_size=8).digest(),
+            "little", signed=True
+        )
+        for band in range(LSH_BANDS)
+    ]
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """两个分片集合的 Jaccard 相似度"""
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class NearDuplicateFilter:
+    """单次运行内的近似重复过滤器：与已保留文本的相似度达到阈值即判为重复"""
+    
+    def __init__(self, threshold: float = 0.8, shingle_size: int = 3):
+        self.threshold = threshold
+        self.shingle_size = shingle_size
+        self._kept: List[FrozenSet[str]] = []
+        self.dropped = 0
+        # 由调用方记录的与历史问题重复的数量（同样计入 dropped）
+        self.history_dropped = 0
+    
+    def check_and_add(self, text: str) -> Optional[Tuple[int, float]]:
+        """文本与已保留的第 i 条重复时返回 (i, 相似度) 并计入 dropped；否则保留该文本并返回 None"""
+        shingles = char_shingles(text, self.shingle_size)
+        for index, kept in enumerate(self._kept):
+            similarity = jaccard(shingles, kept)
+            if similarity >= self.threshold:
+                self.dropped += 1
+                return index, similarity
+        self._kept.append(shingles)
+        return None
@@ -0,0 +1,162 @@
+"""
+容错 JSON 解析
+单趟线性扫描修复LLM输出中常见的 JSON 格式问题，替代多轮正则清洗：
+- 字符串内的裸换行、制表符等控制字符
+- 对象/数组末尾的多余逗号
+- LaTeX 等非法反斜杠转义（如 \\( 、\\sqrt ）
+- 字符串内未转义的双引号
+- 响应被截断：丢弃最外层数组中不完整的元素（或对象中不完整的键值对）后补齐括号
+"""
+
+import json
+import re
+from typing import Any, List
+
+_VALID_ESCAPES = set('"\\/bfnrt')
+_HEX_DIGITS = set("0123456789abcdefABCDEF")
+_CONTROL_ESCAPES = {"\n": "\\n", "\r": "", "\t": "\\t", "\b": "\\b", "\f": "\\f"}
+_CLOSERS = {"{": "}", "[": "]"}
+# 定位下一个需要处理的字符，其余字符成段原样复制；单一字符类的查找不存在回溯
+_STRING_SPECIAL = re.compile(r'["\\\x00-\x1f]')
+_STRUCTURAL = re.compile(r'["{}\[\],]')
+# 字符串内的双引号之后（跳过空白）是 , : } ] 或文本结束时，才视为结束引号
+_STRING_END = re.compile(r'[ \t\r\n]*(?:[,:}\]]|\Z)')
+# 无需修改的完整字符串（不含转义与控制字符），一次匹配跳过
+_CLEAN_STRING = re.compile(r'[^"\\\x00-\x1f]*"(?=[ \t\r\n]*(?:[,:}\]]|\Z))')
+_DECODER = json.JSONDecoder()
+# 允许字符串内出现裸控制字符（换行、制表符）
+_LENIENT_DECODER = json.JSONDecoder(strict=False)
+
+
+def _find_start(text: str) -> int:
+    """JSON 起始位置：优先取第一个 {，没有对象时再取第一个 ["""
+    start = text.find("{")
+    return start if start != -1 else text.find("[")
+
+
+def repair_json(text: str) -> str:
+    """把从第一个 {（或 [）开始的 JSON 文本修复为合法 JSON，根容器闭合后的内容被忽略
+    
+    只在需要修改处切分输出，其余内容成段复制；每个字符只被查看常数次
+    （判断结束引号时跳过的空白只属于这一个引号），耗时与输入长度成线性关系。
+    """
+    start = _find_start(text)
+    if start == -1:
+        return text
+    
+    out: List[str] = []
+    seg = start  # 尚未复制到 out 的原文起点
+    # 栈元素：[开括号, 最近一个完整元素结束处的输出状态 (len(out), seg, 原文位置)]
+    stack: List[list] = []
+    pending_comma = -1  # 尚未确认是否为尾随逗号的逗号在原文中的位置
+    in_string = False
+    n = len(text)
+    i = start
+    while i < n:
+        if in_string:
+            match = _STRING_SPECIAL.search(text, i)
+            if not match:
+                break
+            i = match.start()
+            ch = text[i]
+            if ch == "\\":
+                nxt = text[i + 1] if i + 1 < n else ""
+                if nxt in _VALID_ESCAPES:
+                    i += 2
+                elif nxt == "u" and i + 6 <= n and all(c in _HEX_DIGITS for c in text[i + 2:i + 6]):
+                    i += 6
+                else:
+                    out.append(text[seg:i])
+                    if nxt:
+                        # 非法转义（常见于 LaTeX）：补一个反斜杠，保留原有的反斜杠本身
+                        out.append("\\")
+                        seg = i
+                    else:
+                        # 截断在反斜杠处，丢弃这个不完整的转义
+                        seg = i + 1
+                    i += 1
+            elif ch == '"':
+                if _STRING_END.match(text, i + 1):
+                    in_string = False
+                else:
+                    # 字符串内未转义的双引号
+                    out.append(text[seg:i])
+                    out.append("\\")
+                    seg = i
+                i += 1
+            else:
+                # 裸换行等控制字符
+                out.append(text[seg:i])
+                out.append(_CONTROL_ESCAPES.get(ch, "\\u%04x" % ord(ch)))
+                i += 1
+                seg = i
+            continue
+        
+        match = _STRUCTURAL.search(text, i)
+        if not match:
+            break
+        i = match.start()
+        ch = text[i]
+        if ch == '"':
+            pending_comma = -1
+            clean = _CLEAN_STRING.match(text, i + 1)
+            if clean:
+                i = clean.end()
+            else:
+                in_string = True
+                i += 1
+        elif ch in "{[":
+            pending_comma = -1
+            i += 1
+            stack.append([ch, (len(out), seg, i)])
+        elif ch in "}]":
+            if pending_comma >= 0 and not text[pending_comma + 1:i].strip():
+                # 尾随逗号：跳过逗号本身
+                out.append(text[seg:pending_comma])
+                seg = pending_comma + 1
+            pending_comma = -1
+            opener = stack.pop()[0]
+            if _CLOSERS[opener] != ch:
+                # 括号不匹配：先按栈顶的开括号补齐，当前闭括号留给外层容器
+                out.append(text[seg:i])
+                out.append(_CLOSERS[opener])
+                seg = i
+            else:
+                i += 1
+            if not stack:
+                out.append(text[seg:i])
+                return "".join(out)
+        else:
+            stack[-1][1] = (len(out), seg, i)
+            pending_comma = i
+            i += 1
+    
+    # 文本被截断：回退到最外层数组（没有数组时为最内层对象）最后一个完整元素之后，再补齐括号，
+    # 例如 questions 数组中被截断的最后一道题会被整体丢弃
+    level = len(stack) - 1
+    for depth, (opener, _) in enumerate(stack):
+        if opener == "[":
+            level = depth
+            break
+    out_len, seg, end = stack[level][1]
+    del out[out_len:]
+    out.append(text[seg:end])
+    del stack[level + 1:]
+    while stack:
+        out.append(_CLOSERS[stack.pop()[0]])
+    return "".join(out)
+
+
+def loads_tolerant(text: str) -> Any:
+    """解析LLM输出中的 JSON：合法 JSON 直接解析，否则修复后再解析（失败时抛出 json.JSONDecodeError）"""
+    start = _find_start(text)
+    if start == -1:
+        return json.loads(text)
+    # 快速路径：代码块围栏等前后缀由 raw_decode 跳过；最常见的格式问题是字符串内的裸换行，
+    # 非严格模式直接接受（含 \r 时仍走修复，与修复器丢弃 \r 的结果保持一致）
+    decoder = _LENIENT_DECODER if "\r" not in text else _DECODER
+    try:
+        return decoder.raw_decode(text, start)[0]
+    except json.JSONDecodeError:
+        pass
+    return json.loads(repair_json(text[start:]))
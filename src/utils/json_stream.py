@@ -0,0 +1,104 @@
+"""
+流式 JSON 增量解析
+在LLM流式输出的过程中识别 {"<key>": [ ... ]} 数组中已经完整到达的元素，
+使下游可以在整个响应结束之前开始处理前面的元素
+"""
+
+import json
+import re
+from typing import Any, Callable, List
+
+
+class StreamingJSONArrayParser:
+    """增量解析指定键对应的 JSON 数组，每个元素的结束括号/引号一到达就产出该元素
+    
+    每个字符只扫描一次；元素文本交给 loads 解析（可传入更宽容的解析函数）。
+    某个元素解析失败后不再继续产出，剩余元素由调用方对完整响应做整体解析兜底。
+    """
+    
+    def __init__(self, key: str, loads: Callable[[str], Any] = json.loads):
+        self.key = key
+        self.loads = loads
+        self._key_re = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+        # 已产出的元素数，重试时保留，避免对同一位置的元素重复产出
+        self.emitted = 0
+        self.reset()
+    
+    def reset(self):
+        """丢弃已接收的文本，从头开始解析（LLM 调用重试时使用）"""
+        self._text = ""
+        self._pos = 0
+        self._seek_from = 0
+        self._in_array = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._item_start = 0
+        self._index = 0
+        self.complete = False
+        self.broken = False
+    
+    def feed(self, delta: str) -> List[Any]:
+        """追加一段文本，返回其中新完整到达的数组元素"""
+        self._text += delta
+        items: List[Any] = []
+        if self.complete:
+            return items
+        
+        text = self._text
+        if not self._in_array:
+            match = self._key_re.search(text, self._seek_from)
+            if not match:
+                # 键名可能被切分在两段文本之间，下次从末尾附近重新查找
+                self._seek_from = max(0, len(text) - len(self.key) - 32)
+                return items
+            self._in_array = True
+            self._pos = match.end()
+        
+        pos = self._pos
+        n = len(text)
+        while pos < n:
+            ch = text[pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 0:
+                        # 兼容旧格式：数组元素为纯字符串
+                        self._emit(text[self._item_start:pos + 1], items)
+            elif ch == '"':
+                self._in_string = True
+                if self._depth == 0:
+                    self._item_start = pos
+            elif ch in '{[':
+                if self._depth == 0:
+                    self._item_start = pos
+                self._depth += 1
+            elif ch in '}]':
+                if self._depth == 0:
+                    if ch == ']':
+                        self.complete = True
+                        pos += 1
+                        break
+                else:
+                    self._depth -= 1
+                    if self._depth == 0:
+                        self._emit(text[self._item_start:pos + 1], items)
+            pos += 1
+        self._pos = pos
+        return items
+    
+    def _emit(self, item_text: str, items: List[Any]):
+        index = self._index
+        self._index += 1
+        if self.broken or index < self.emitted:
+            return
+        try:
+            items.append(self.loads(item_text))
+        except Exception:
+            self.broken = True
+            return
+        self.emitted += 1
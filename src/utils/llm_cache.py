@@ -0,0 +1,166 @@
+"""
+LLM响应缓存
+以 后端地址+模型+消息+温度（及 JSON 模式、max_tokens）的哈希为键，把响应持久化到本地 SQLite 文件，
+按最近访问时间做基于容量的 LRU 淘汰，并支持可选的 TTL
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+
+class LLMResponseCache:
+    """基于 SQLite 的内容寻址LLM响应缓存"""
+    
+    def __init__(self, db_path: str = "llm_cache.db", max_bytes: int = 512 * 1024 * 1024,
+                 ttl: Optional[float] = None):
+        self.db_path = db_path
+        self.max_bytes = max_bytes
+        self.ttl = ttl if ttl and ttl > 0 else None
+        self.hits = 0
+        self.misses = 0
+        # 单连接 + 锁，供多个线程共享
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache (last_access)")
+        self._conn.commit()
+        self._total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+    
+    @staticmethod
+    def make_key(model: str, messages: List[Dict[str, str]], temperature: float,
+                 json_mode: bool = False, max_tokens: Optional[int] = None,
+                 base_url: Optional[str] = None) -> str:
+        """计算缓存键：后端地址、模型、消息、温度以及影响响应内容的请求参数（JSON 模式、max_tokens）的 SHA-256
+        
+        包含 base_url，两个后端使用同名模型时不会互相拿到对方的响应。
+        """
+        payload = json.dumps(
+            {"base_url": base_url, "model": model, "messages": messages, "temperature": temperature,
+             "json_mode": json_mode, "max_tokens": max_tokens},
+            ensure_ascii=False, sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    
+    def get(self, key: str) -> Optional[str]:
+        """读取缓存，命中时刷新访问时间；过期条目视为未命中并删除"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT response, size, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row and self.ttl and now - row[2] > self.ttl:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self._total_bytes -= row[1]
+                row = None
+            if not row:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return row[0]
+    
+    def put(self, key: str, response: str):
+        """写入缓存，超出容量上限时淘汰最久未访问的条目"""
+        size = len(response.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            self._conn.execute("""
+                INSERT OR REPLACE INTO llm_cache (key, response, size, created_at, last_access)
+                VALUES (?, ?, ?, ?, ?)
+            """, (key, response, size, now, now))
+            self._total_bytes += size - (old[0] if old else 0)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+    
+    def delete(self, key: str):
+        """删除一个条目（如已缓存的响应无法解析）"""
+        with self._lock:
+            row = self._conn.execute("SELECT size FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row:
+                self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                self._total_bytes -= row[0]
+    
+    def _evict(self):
+        """按 LRU 淘汰到容量上限的 90%，顺带清理过期条目（调用方持有锁）"""
+        if self.ttl:
+            expired = self._conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl,)
+            ).fetchone()[0]
+            self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl,))
+            self._total_bytes -= expired
+        
+        target = int(self.max_bytes * 0.9)
+        if self._total_bytes <= target:
+            return
+        
+        to_free = self._total_bytes - target
+        freed = 0
+        victims = []
+        for key, size in self._conn.execute("SELECT key, size FROM llm_cache ORDER BY last_access"):
+            victims.append((key,))
+            freed += size
+            if freed >= to_free:
+                break
+        self._conn.executemany("DELETE FROM llm_cache WHERE key = ?", victims)
+        self._total_bytes -= freed
+    
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+            self._total_bytes = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        """命中/未命中计数与当前占用"""
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / total if total else 0.0,
+            "entries": entries,
+            "bytes": self._total_bytes,
+        }
+
+
+_shared_caches: Dict[str, LLMResponseCache] = {}
+_shared_caches_lock = threading.Lock()
+
+
+def get_response_cache() -> Optional[LLMResponseCache]:
+    """按环境变量获取进程内共享的缓存实例；默认关闭，LLM_CACHE_ENABLED=true 时才启用
+    
+    生成阶段以 0.7 的温度采样，开启缓存后重跑同一种子会拿回上次完全相同的"新"问题，
+    因此只适合调试提示词、重放失败批次等需要复现响应的场景。
+    """
+    if os.getenv("LLM_CACHE_ENABLED", "false").lower() not in ("1", "true", "yes"):
+        return None
+    db_path = os.getenv("LLM_CACHE_PATH", "llm_cache.db")
+    with _shared_caches_lock:
+        if db_path not in _shared_caches:
+            _shared_caches[db_path] = LLMResponseCache(
+                db_path=db_path,
+                max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", "512")) * 1024 * 1024),
+                ttl=float(os.getenv("LLM_CACHE_TTL", "0"))
+            )
+        return _shared_caches[db_path]
@@ -1,148 +1,639 @@
+import asyncio
+import email.utils
+import inspect
 import openai
 import json
 import os
-from typing import List, Dict, Any
+import random
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Type, TypeVar
 from dotenv import load_dotenv
-import re
+from pydantic import BaseModel, ValidationError
+from .json_repair import loads_tolerant
+from .llm_cache import get_response_cache
+from .rate_limiter import get_rate_limiter
+from .text_utils import estimate_messages_tokens, estimate_tokens
 
 load_dotenv()
 
+ModelT = TypeVar("ModelT", bound=BaseModel)
 
-class LLMClient:
-    """LLM客户端封装"""
+
+# ---- 进程级客户端注册表 ----
+# 所有代理、所有工作流共享同一组 openai 客户端及其 HTTP 连接池，
+# TLS 握手与连接建立只发生一次，连接通过 keep-alive 复用
+
+_registry_lock = threading.RLock()
+_openai_clients: Dict[Tuple[str, str], openai.OpenAI] = {}
+# 异步连接池绑定在事件循环上，因此按事件循环分别缓存，循环收尾时关闭并移除
+_async_openai_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Tuple[str, str], openai.AsyncOpenAI]]" = \
+    weakref.WeakKeyDictionary()
+# 各事件循环中负责关闭客户端的守护任务（事件循环只弱引用任务，这里持有强引用）
+_async_close_tasks: Set[asyncio.Task] = set()
+_llm_client: Optional["LLMClient"] = None
+_async_llm_client: Optional["AsyncLLMClient"] = None
+
+
+def _connection_limits():
+    """连接池参数；Limits 类型取自 SDK 默认值，保证与 SDK 所用的 HTTP 库一致"""
+    limits_cls = type(openai.DEFAULT_CONNECTION_LIMITS)
+    return limits_cls(
+        max_connections=int(os.getenv("LLM_POOL_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("LLM_POOL_MAX_KEEPALIVE", "20")),
+        keepalive_expiry=float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+    )
+
+
+def get_openai_client(api_key: Optional[str], base_url: str) -> openai.OpenAI:
+    """获取进程内共享的 openai.OpenAI 客户端"""
+    key = (api_key or "", base_url)
+    with _registry_lock:
+        if key not in _openai_clients:
+            _openai_clients[key] = openai.OpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                # 重试由 BaseLLMClient 按错误分类统一处理，关闭 SDK 自带重试避免重复退避
+                max_retries=0,
+                http_client=openai.DefaultHttpxClient(limits=_connection_limits())
+            )
+        return _openai_clients[key]
+
+
+def get_async_openai_client(api_key: Optional[str], base_url: str) -> openai.AsyncOpenAI:
+    """获取当前事件循环内共享的 openai.AsyncOpenAI 客户端（需在事件循环中调用）"""
+    loop = asyncio.get_running_loop()
+    key = (api_key or "", base_url)
+    with _registry_lock:
+        clients = _async_openai_clients.get(loop)
+        if clients is None:
+            clients = _async_openai_clients[loop] = {}
+            task = loop.create_task(_close_on_loop_shutdown(), name="openai-client-closer")
+            _async_close_tasks.add(task)
+            task.add_done_callback(_async_close_tasks.discard)
+        if key not in clients:
+            clients[key] = openai.AsyncOpenAI(
+                api_key=api_key,
+                base_url=base_url,
+                max_retries=0,
+                http_client=openai.DefaultAsyncHttpxClient(limits=_connection_limits())
+            )
+        return clients[key]
+
+
+async def _aclose_loop_clients(loop: asyncio.AbstractEventLoop):
+    with _registry_lock:
+        clients = _async_openai_clients.pop(loop, {})
+    for client in clients.values():
+        await client.close()
+
+
+async def _close_on_loop_shutdown():
+    """常驻到事件循环收尾：asyncio.run 结束前会取消仍在运行的任务，此时关闭本循环创建的客户端"""
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await _aclose_loop_clients(asyncio.get_running_loop())
+
+
+async def aclose_async_openai_clients():
+    """关闭当前事件循环内共享的 openai.AsyncOpenAI 客户端，之后再获取时重新创建
+    
+    经 asyncio.run 运行时无需调用；自行管理事件循环（不取消剩余任务就关闭循环）时，在关闭前调用。
+    """
+    loop = asyncio.get_running_loop()
+    tasks = [task for task in _async_close_tasks if task.get_loop() is loop]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await _aclose_loop_clients(loop)
+
+
+def get_llm_client() -> "LLMClient":
+    """获取进程内共享的同步LLM客户端"""
+    global _llm_client
+    with _registry_lock:
+        if _llm_client is None:
+            _llm_client = LLMClient()
+        return _llm_client
+
+
+def get_async_llm_client() -> "AsyncLLMClient":
+    """获取进程内共享的异步LLM客户端"""
+    global _async_llm_client
+    with _registry_lock:
+        if _async_llm_client is None:
+            _async_llm_client = AsyncLLMClient()
+        return _async_llm_client
+
+
+class BaseLLMClient:
+    """LLM客户端公共逻辑（同步/异步客户端共用）"""
+    
+    # 除连接错误与 5xx 外，以下状态码也视为临时错误：请求超时、冲突、限流
+    RETRYABLE_STATUS_CODES = {408, 409, 429}
     
     def __init__(self):
-        self.client = openai.OpenAI(
-            api_key=os.getenv("DEEPSEEK_API_KEY", os.getenv("OPENAI_API_KEY")),
-            base_url=os.getenv("OPENAI_BASE_URL", "https://api.deepseek.com/v1")
-        )
+        self.api_key = os.getenv("DEEPSEEK_API_KEY", os.getenv("OPENAI_API_KEY"))
+        self.base_url = os.getenv("OPENAI_BASE_URL", "https://api.deepseek.com/v1")
         self.model = "deepseek-chat"
+        self.max_tokens = 4000
+        # 进程内共享的响应缓存，默认关闭（None），LLM_CACHE_ENABLED=true 时启用
+        self.cache = get_response_cache()
+        # 进程内共享的 RPM/TPM 限流器，超出额度时排队等待
+        self.rate_limiter = get_rate_limiter()
+        # 重试策略：可重试错误按指数退避+抖动重试，受最大尝试次数与总时长预算约束
+        self.max_attempts = max(1, int(os.getenv("LLM_MAX_ATTEMPTS", "5")))
+        self.retry_base_delay = float(os.getenv("LLM_RETRY_BASE_DELAY", "1"))
+        self.retry_max_delay = float(os.getenv("LLM_RETRY_MAX_DELAY", "30"))
+        self.retry_budget = float(os.getenv("LLM_RETRY_BUDGET", "120"))
+        self._stats_lock = threading.Lock()
+        self.retry_stats = {"retries": 0, "recovered": 0, "exhausted": 0, "fatal": 0}
+        self.stream_stats = {"streams": 0, "ttft_seconds": 0.0, "tokens": 0, "generation_seconds": 0.0}
+        # 结构化输出：请求 JSON 对象格式的响应；后端不支持时自动关闭，回退为普通文本 + 容错解析
+        self.json_mode = os.getenv("LLM_JSON_MODE", "true").lower() in ("1", "true", "yes")
+        self.parse_stats = {"structured": 0, "repaired": 0, "failed": 0}
+        # 提供方前缀缓存：按调用方标签（tagging/generation/solving/verification）累计提示词与缓存命中 token
+        self.prompt_cache_stats: Dict[str, Dict[str, int]] = {}
     
-    def chat_completion(self, messages: List[Dict[str, str]], 
-                       temperature: float = 0.7) -> str:
-        """调用聊天完成API"""
+    def _cache_key(self, messages: List[Dict[str, str]], temperature: float, use_cache: bool,
+                   json_mode: bool = False) -> Optional[str]:
+        """计算缓存键（包含后端地址、实际生效的 JSON 模式与 max_tokens）；未启用缓存或调用方要求绕过缓存时返回 None"""
+        if not use_cache or self.cache is None:
+            return None
+        return self.cache.make_key(
+            self.model, messages, temperature, json_mode=json_mode and self.json_mode, max_tokens=self.max_tokens,
+            base_url=self.base_url
+        )
+    
+    @staticmethod
+    def _cacheable(content: Optional[str], response_model: Optional[Type[BaseModel]],
+                   finish_reason: Optional[str] = None) -> bool:
+        """响应能否写入（或继续使用）缓存：非空、没有因 max_tokens 被截断，
+        指定 response_model 时还要能解析为该模型；否则一次格式错误的响应会在之后每次运行中被原样重放"""
+        if not content or finish_reason == "length":
+            return False
+        if response_model is None:
+            return True
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=temperature,
-                max_tokens=4000
-            )
-            return response.choices[0].message.content
-        except Exception as e:
-            # 规范化各种可能的错误格式（OpenAI SDK 异常、字典形式的错误等）
+            response_model.model_validate_json(content)
+        except ValidationError:
+            try:
+                response_model.model_validate(loads_tolerant(content))
+            except ValueError:
+                return False
+        return True
+    
+    def _build_request(self, messages: List[Dict[str, str]], temperature: float,
+                       stream: bool = False, json_mode: bool = False) -> Dict[str, Any]:
+        """构造聊天完成请求参数；流式请求额外要求在最后一个分块中返回用量"""
+        request = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": self.max_tokens
+        }
+        if json_mode and self.json_mode:
+            request["response_format"] = {"type": "json_object"}
+        if stream:
+            request["stream"] = True
+            request["stream_options"] = {"include_usage": True}
+        return request
+    
+    def _reserved_tokens(self, messages: List[Dict[str, str]]) -> int:
+        """TPM 预留量：估算的提示词 token 数加上最大输出 token 数，完成后按实际用量校正"""
+        return estimate_messages_tokens(messages) + self.max_tokens
+    
+    @staticmethod
+    def _cached_tokens(usage) -> int:
+        """提示词中命中提供方前缀缓存的 token 数：OpenAI 返回 prompt_tokens_details.cached_tokens，
+        DeepSeek 返回 prompt_cache_hit_tokens，都没有时为 0"""
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) if details else None
+        if cached is None:
+            cached = getattr(usage, "prompt_cache_hit_tokens", None)
+        return cached or 0
+    
+    def _record_usage(self, usage, agent: Optional[str]) -> Optional[int]:
+        """按调用方标签累计提示词 token 与缓存命中 token，返回实际 token 总用量"""
+        if not usage:
+            return None
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        if prompt_tokens:
+            with self._stats_lock:
+                stats = self.prompt_cache_stats.setdefault(
+                    agent or "other", {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0}
+                )
+                stats["requests"] += 1
+                stats["prompt_tokens"] += prompt_tokens
+                stats["cached_tokens"] += self._cached_tokens(usage)
+        return getattr(usage, "total_tokens", None)
+    
+    @classmethod
+    def is_retryable(cls, e: Exception) -> bool:
+        """区分可重试错误（连接失败、超时、限流、5xx）与致命错误（鉴权失败、参数错误等）"""
+        if isinstance(e, openai.APIConnectionError):
+            return True
+        if isinstance(e, openai.APIStatusError):
+            return e.status_code in cls.RETRYABLE_STATUS_CODES or e.status_code >= 500
+        return False
+    
+    @staticmethod
+    def _retry_after(e: Exception) -> Optional[float]:
+        """读取服务端给出的 Retry-After（支持 retry-after-ms、秒数与 HTTP 日期三种形式）"""
+        headers = getattr(getattr(e, "response", None), "headers", None)
+        if not headers:
+            return None
+        try:
+            value = headers.get("retry-after-ms")
+            if value:
+                return max(0.0, float(value) / 1000)
+            value = headers.get("retry-after")
+            if not value:
+                return None
             try:
-                if hasattr(e, 'args') and e.args and isinstance(e.args[0], dict):
-                    err_info = e.args[0]
-                    err_payload = err_info.get('error', err_info)
-                    message = json.dumps(err_payload, ensure_ascii=False)
-                else:
-                    message = str(e)
-            except Exception:
+                return max(0.0, float(value))
+            except ValueError:
+                retry_at = email.utils.parsedate_to_datetime(value)
+                return max(0.0, retry_at.timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+    
+    def _count(self, stats: Dict[str, int], name: str):
+        with self._stats_lock:
+            stats[name] += 1
+    
+    def _reject_json_mode(self, e: Exception) -> bool:
+        """后端拒绝 response_format 参数时关闭结构化输出，返回 True 表示应立即以普通文本格式重发"""
+        if not self.json_mode or not isinstance(e, openai.APIStatusError) or e.status_code not in (400, 422):
+            return False
+        if "response_format" not in str(e):
+            return False
+        self.json_mode = False
+        print("⚠️ 后端不支持 JSON 输出格式，已改为普通文本输出并使用容错解析")
+        return True
+    
+    def _retry_delay(self, e: Exception, attempt: int, deadline: float) -> Optional[float]:
+        """计算第 attempt 次失败后的等待秒数；致命错误、次数或时间预算用尽时返回 None"""
+        if not self.is_retryable(e):
+            self._count(self.retry_stats, "fatal")
+            return None
+        delay = self._retry_after(e)
+        if delay is None:
+            # 指数退避 + 全抖动，避免并发调用在同一时刻集中重试
+            delay = random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** (attempt - 1)))
+        if attempt >= self.max_attempts or time.monotonic() + delay > deadline:
+            self._count(self.retry_stats, "exhausted")
+            return None
+        self._count(self.retry_stats, "retries")
+        print(f"⚠️ LLM调用失败（第{attempt}次），{delay:.1f}秒后重试: {e}")
+        return delay
+    
+    def _record_stream(self, start: float, first_token_at: Optional[float], content: str, usage,
+                       agent: Optional[str] = None) -> Optional[int]:
+        """记录一次流式响应的首 token 延迟与生成速度，返回实际 token 用量"""
+        end = time.monotonic()
+        completion_tokens = getattr(usage, "completion_tokens", None) or estimate_tokens(content)
+        ttft = (first_token_at or end) - start
+        generation_seconds = end - (first_token_at or end)
+        with self._stats_lock:
+            self.stream_stats["streams"] += 1
+            self.stream_stats["ttft_seconds"] += ttft
+            self.stream_stats["tokens"] += completion_tokens
+            self.stream_stats["generation_seconds"] += generation_seconds
+        tokens_per_second = completion_tokens / generation_seconds if generation_seconds > 0 else 0.0
+        print(f"⏱️ 流式响应：首token {ttft:.2f}s，{tokens_per_second:.1f} tokens/s")
+        return self._record_usage(usage, agent)
+    
+    def get_stream_stats(self) -> Dict[str, float]:
+        """流式响应统计：streams 次数、avg_ttft 平均首 token 延迟（秒）、tokens_per_second 平均生成速度"""
+        with self._stats_lock:
+            stats = dict(self.stream_stats)
+        return {
+            "streams": stats["streams"],
+            "avg_ttft": stats["ttft_seconds"] / stats["streams"] if stats["streams"] else 0.0,
+            "tokens_per_second": stats["tokens"] / stats["generation_seconds"] if stats["generation_seconds"] else 0.0,
+        }
+    
+    def get_prompt_cache_stats(self) -> Dict[str, Dict[str, float]]:
+        """各调用方的请求数、提示词 token 数、缓存命中 token 数与命中率（本地响应缓存命中的调用不计入）"""
+        with self._stats_lock:
+            stats = {agent: dict(values) for agent, values in self.prompt_cache_stats.items()}
+        for values in stats.values():
+            values["hit_ratio"] = values["cached_tokens"] / values["prompt_tokens"] if values["prompt_tokens"] else 0.0
+        return stats
+    
+    def get_parse_stats(self) -> Dict[str, int]:
+        """结构化解析计数：structured 直接校验成功、repaired 经容错修复后成功、failed 解析失败"""
+        with self._stats_lock:
+            return dict(self.parse_stats)
+    
+    def get_retry_stats(self) -> Dict[str, int]:
+        """重试计数：retries 重试次数、recovered 重试后成功、exhausted 重试用尽、fatal 不可重试的错误"""
+        with self._stats_lock:
+            return dict(self.retry_stats)
+    
+    @staticmethod
+    def _normalize_error(e: Exception) -> RuntimeError:
+        """规范化各种可能的错误格式（OpenAI SDK 异常、字典形式的错误等）"""
+        try:
+            if hasattr(e, 'args') and e.args and isinstance(e.args[0], dict):
+                err_info = e.args[0]
+                err_payload = err_info.get('error', err_info)
+                message = json.dumps(err_payload, ensure_ascii=False)
+            else:
                 message = str(e)
-
-            print(f"LLM调用错误: {message}")
-            # 抛出一个明确的 RuntimeError，便于上层捕获并将信息写入 state.error
-            raise RuntimeError(message)
+        except Exception:
+            message = str(e)
+        
+        print(f"LLM调用错误: {message}")
+        # 返回一个明确的 RuntimeError，便于上层捕获并将信息写入 state.error
+        return RuntimeError(message)
+    
+    def parse_structured(self, response: str, model: Type[ModelT]) -> ModelT:
+        """把响应直接校验为 pydantic 模型；响应不是规范的 JSON 时才退回容错修复解析"""
+        try:
+            parsed = model.model_validate_json(response)
+            self._count(self.parse_stats, "structured")
+            return parsed
+        except ValidationError:
+            pass
+        try:
+            parsed = model.model_validate(self.parse_json_response(response))
+        except (json.JSONDecodeError, ValidationError):
+            self._count(self.parse_stats, "failed")
+            raise
+        self._count(self.parse_stats, "repaired")
+        return parsed
     
     def parse_json_response(self, response: str) -> Dict[str, Any]:
-        """解析JSON响应"""
+        """解析JSON响应；格式不规范（裸换行、尾随逗号、LaTeX 转义、被截断等）时单趟修复后再解析"""
+        # 如果已经是 dict，直接返回（防止重复解析）
+        if isinstance(response, dict):
+            return response
         try:
-            # 如果已经是 dict，直接返回（防止重复解析）
-            if isinstance(response, dict):
-                return response
-            # 尝试找到JSON部分
-            start_idx = response.find('{')
-            end_idx = response.rfind('}') + 1
-            if start_idx != -1 and end_idx != 0:
-                json_str = response[start_idx:end_idx]
-
-                # 将字符串内部的裸换行替换为 \n，并移除尾随逗号
-                def _sanitize_for_json(s: str) -> str:
-                    out = []
-                    in_string = False
-                    escape = False
-                    for ch in s:
-                        if in_string:
-                            if escape:
-                                out.append(ch)
-                                escape = False
-                            else:
-                                if ch == '\\':
-                                    out.append(ch)
-                                    escape = True
-                                elif ch == '"':
-                                    out.append(ch)
-                                    in_string = False
-                                elif ch == '\n':
-                                    out.append('\\n')
-                                elif ch == '\r':
-                                    # 忽略 CR 或在需要时可转换
-                                    continue
-                                else:
-                                    out.append(ch)
-                        else:
-                            if ch == '"':
-                                out.append(ch)
-                                in_string = True
-                            else:
-                                out.append(ch)
-                    res = ''.join(out)
-                    # 去掉对象/数组末尾的尾随逗号
-                    res = re.sub(r',\s*([}\]])', r'\1', res)
-                    return res
-
-                json_str = _sanitize_for_json(json_str)
-                # 修复常见的非法反斜杠转义（如 \()）：为未知转义符前再补一个反斜杠
-                try:
-                    json_str = re.sub(r'\\(?!["\\/bfnrtu])', r'\\\\', json_str)
-                except Exception:
-                    pass
-                return json.loads(json_str)
-            else:
-                # 如果没找到JSON，尝试直接解析整个响应
-                return json.loads(response)
+            return loads_tolerant(response)
         except json.JSONDecodeError as e:
             print(f"JSON解析错误: {e}")
             print(f"原始响应: {response}")
-            # 容错：若包含 questions 列表但整体 JSON 不完整，尽力提取可用的问题文本
+            raise
+
+
+class LLMClient(BaseLLMClient):
+    """LLM客户端封装"""
+    
+    def __init__(self):
+        super().__init__()
+        self.client = get_openai_client(self.api_key, self.base_url)
+    
+    def _call_with_retry(self, messages: List[Dict[str, str]], request: Callable[[], Tuple[Any, Optional[int]]],
+                         json_mode: bool = False):
+        """执行请求；可重试错误按退避策略重试，每次尝试单独占用限流额度
+        
+        request 返回 (结果, 实际 token 用量)，用量用于校正限流器的预留额度
+        """
+        deadline = time.monotonic() + self.retry_budget
+        attempt = 0
+        while True:
+            attempt += 1
+            reserved = self._reserved_tokens(messages)
+            self.rate_limiter.acquire(reserved)
             try:
-                if isinstance(response, str) and '"questions"' in response:
-                    # 提取所有完整的一行形式的 question 字段，忽略被截断的最后一项
-                    matches = re.findall(r'\"question\"\s*:\s*\"([^\"\n\r]*)\"', response)
-                    if matches:
-                        return {"questions": matches}
-            except Exception:
-                pass
-            # 容错回退：尝试用正则直接提取 thinking_chain 与 answer 字段（处理含未转义反斜杠的情况）
+                result, used_tokens = request()
+            except Exception as e:
+                # 请求失败时退还预留的 token 额度
+                self.rate_limiter.settle(reserved, 0)
+                if json_mode and self._reject_json_mode(e):
+                    attempt -= 1
+                    continue
+                delay = self._retry_delay(e, attempt, deadline)
+                if delay is None:
+                    raise self._normalize_error(e)
+                time.sleep(delay)
+                continue
+            self.rate_limiter.settle(reserved, used_tokens)
+            if attempt > 1:
+                self._count(self.retry_stats, "recovered")
+            return result
+    
+    def _create(self, messages: List[Dict[str, str]], temperature: float, json_mode: bool,
+                agent: Optional[str] = None) -> Tuple[str, Optional[str]]:
+        """发送一次非流式请求，返回 (响应文本, 结束原因)"""
+        def _request():
+            response = self.client.chat.completions.create(
+                **self._build_request(messages, temperature, json_mode=json_mode)
+            )
+            choice = response.choices[0]
+            return (choice.message.content, getattr(choice, "finish_reason", None)), \
+                self._record_usage(getattr(response, "usage", None), agent)
+        
+        return self._call_with_retry(messages, _request, json_mode)
+    
+    def _stream(self, messages: List[Dict[str, str]], temperature: float,
+                on_delta: Optional[Callable[[str], None]], on_retry: Optional[Callable[[], None]],
+                json_mode: bool, agent: Optional[str] = None) -> Tuple[str, Optional[str]]:
+        """发送一次流式请求，每收到一段文本回调 on_delta，返回 (完整响应文本, 结束原因)"""
+        attempts = 0
+        
+        def _request():
+            nonlocal attempts
+            attempts += 1
+            if attempts > 1 and on_retry:
+                on_retry()
+            start = time.monotonic()
+            first_token_at = None
+            parts = []
+            usage = None
+            finish_reason = None
+            stream = self.client.chat.completions.create(
+                **self._build_request(messages, temperature, stream=True, json_mode=json_mode)
+            )
+            for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                finish_reason = getattr(chunk.choices[0], "finish_reason", None) or finish_reason
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if first_token_at is None:
+                    first_token_at = time.monotonic()
+                parts.append(delta)
+                if on_delta:
+                    on_delta(delta)
+            content = "".join(parts)
+            return (content, finish_reason), self._record_stream(start, first_token_at, content, usage, agent)
+        
+        return self._call_with_retry(messages, _request, json_mode)
+    
+    def chat_completion(self, messages: List[Dict[str, str]], 
+                       temperature: float = 0.7, use_cache: bool = True, json_mode: bool = False,
+                       agent: Optional[str] = None, response_model: Optional[Type[BaseModel]] = None) -> str:
+        """调用聊天完成API；use_cache=False 时绕过响应缓存（如需要重新采样的场景），
+        json_mode=True 时在后端支持的情况下要求返回 JSON 对象，agent 为前缀缓存统计使用的调用方标签，
+        response_model 为调用方将要解析的模型：只有能解析为该模型的响应才写入缓存"""
+        cache_key = self._cache_key(messages, temperature, use_cache, json_mode)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                if self._cacheable(cached, response_model):
+                    return cached
+                # 早先写入的无效响应：删除后重新请求
+                self.cache.delete(cache_key)
+        
+        content, finish_reason = self._create(messages, temperature, json_mode, agent)
+        if cache_key and self._cacheable(content, response_model, finish_reason):
+            self.cache.put(cache_key, content)
+        return content
+    
+    def stream_chat_completion(self, messages: List[Dict[str, str]], temperature: float = 0.7,
+                               on_delta: Optional[Callable[[str], None]] = None,
+                               on_retry: Optional[Callable[[], None]] = None,
+                               use_cache: bool = True, json_mode: bool = False,
+                               agent: Optional[str] = None,
+                               response_model: Optional[Type[BaseModel]] = None) -> str:
+        """流式调用聊天完成API，每收到一段增量文本回调 on_delta，返回完整响应文本
+        
+        重试时会从头重新生成：新一次尝试开始前回调 on_retry，调用方应丢弃已收到的文本；
+        缓存命中时一次性回调完整文本；response_model 的含义与 chat_completion 相同
+        """
+        cache_key = self._cache_key(messages, temperature, use_cache, json_mode)
+        if cache_key:
+            cached = self.cache.get(cache_key)
+            if cached is not None and self._cacheable(cached, response_model):
+                if on_delta:
+                    on_delta(cached)
+                return cached
+            if cached is not None:
+                self.cache.delete(cache_key)
+        
+        content, finish_reason = self._stream(messages, temperature, on_delta, on_retry, json_mode, agent)
+        if cache_key and self._cacheable(content, response_model, finish_reason):
+            self.cache.put(cache_key, content)
+        return content
+
+
+class AsyncLLMClient(BaseLLMClient):
+    """基于 openai.AsyncOpenAI 的异步LLM客户端，接口与 LLMClient 保持一致"""
+    
+    @property
+    def client(self) -> openai.AsyncOpenAI:
+        """当前事件循环共享的 AsyncOpenAI 客户端"""
+        return get_async_openai_client(self.api_key, self.base_url)
+    
+    async def _call_with_retry(self, messages: List[Dict[str, str]], request, json_mode: bool = False):
+        """LLMClient._call_with_retry 的协程版本，退避等待期间不阻塞事件循环"""
+        deadline = time.monotonic() + self.retry_budget
+        attempt = 0
+        while True:
+            attempt += 1
+            reserved = self._reserved_tokens(messages)
+            await self.rate_limiter.aacquire(reserved)
             try:
-                # 使用更宽松的正则，匹配双引号之间的内容，允许未转义的反斜杠
-                tc_match = re.search(r'"thinking_chain"\s*:\s*"((?:[^"\\]|\\.|\\[^"])*)"', response, re.DOTALL)
-                ans_match = re.search(r'"answer"\s*:\s*"((?:[^"\\]|\\.|\\[^"])*)"', response, re.DOTALL)
-                
-                if tc_match or ans_match:
-                    def _clean_content(s: str) -> str:
-                        # 处理常见的转义序列和LaTeX符号
-                        # 先处理正确的JSON转义
-                        s = s.replace('\\"', '"')
-                        s = s.replace('\\\\', '\\')
-                        s = s.replace('\\n', '\n')
-                        s = s.replace('\\t', '\t')
-                        s = s.replace('\\r', '\r')
-                        # 保留LaTeX符号（如 \frac, \( \) 等）不做处理
-                        return s
-
-                    result = {}
-                    if tc_match:
-                        result['thinking_chain'] = _clean_content(tc_match.group(1))
-                    if ans_match:
-                        result['answer'] = _clean_content(ans_match.group(1))
-                    
-                    print(f"容错提取成功: thinking_chain={bool(tc_match)}, answer={bool(ans_match)}")
-                    return result
-            except Exception as regex_err:
-                print(f"正则提取失败: {regex_err}")
-                pass
-
-            # 最终仍无法解析，抛出原始异常以便上层处理
-            raise e
+                result, used_tokens = await request()
+            except Exception as e:
+                self.rate_limiter.settle(reserved, 0)
+                if json_mode and self._reject_json_mode(e):
+                    attempt -= 1
+                    continue
+                delay = self._retry_delay(e, attempt, deadline)
+                if delay is None:
+                    raise self._normalize_error(e)
+                await asyncio.sleep(delay)
+                continue
+            self.rate_limiter.settle(reserved, used_tokens)
+            if attempt > 1:
+                self._count(self.retry_stats, "recovered")
+            return result
+    
+    async def _create(self, messages: List[Dict[str, str]], temperature: float, json_mode: bool,
+                      agent: Optional[str] = None) -> Tuple[str, Optional[str]]:
+        async def _request():
+            response = await self.client.chat.completions.create(
+                **self._build_request(messages, temperature, json_mode=json_mode)
+            )
+            choice = response.choices[0]
+            return (choice.message.content, getattr(choice, "finish_reason", None)), \
+                self._record_usage(getattr(response, "usage", None), agent)
+        
+        return await self._call_with_retry(messages, _request, json_mode)
+    
+    async def _stream(self, messages: List[Dict[str, str]], temperature: float, on_delta, on_retry,
+                      json_mode: bool, agent: Optional[str] = None) -> Tuple[str, Optional[str]]:
+        attempts = 0
+        
+        async def _request():
+            nonlocal attempts
+            attempts += 1
+            if attempts > 1 and on_retry:
+                on_retry()
+            start = time.monotonic()
+            first_token_at = None
+            parts = []
+            usage = None
+            finish_reason = None
+            stream = await self.client.chat.completions.create(
+                **self._build_request(messages, temperature, stream=True, json_mode=json_mode)
+            )
+            async for chunk in stream:
+                if getattr(chunk, "usage", None):
+                    usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                finish_reason = getattr(chunk.choices[0], "finish_reason", None) or finish_reason
+                delta = chunk.choices[0].delta.content
+                if not delta:
+                    continue
+                if first_token_at is None:
+                    first_token_at = time.monotonic()
+                parts.append(delta)
+                if on_delta:
+                    result = on_delta(delta)
+                    if inspect.isawaitable(result):
+                        await result
+            content = "".join(parts)
+            return (content, finish_reason), self._record_stream(start, first_token_at, content, usage, agent)
+        
+        return await self._call_with_retry(messages, _request, json_mode)
+    
+    async def chat_completion(self, messages: List[Dict[str, str]], 
+                             temperature: float = 0.7, use_cache: bool = True, json_mode: bool = False,
+                             agent: Optional[str] = None, response_model: Optional[Type[BaseModel]] = None) -> str:
+        """异步调用聊天完成API；缓存读写在线程中执行，避免阻塞事件循环"""
+        cache_key = self._cache_key(messages, temperature, use_cache, json_mode)
+        if cache_key:
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None:
+                if self._cacheable(cached, response_model):
+                    return cached
+                await asyncio.to_thread(self.cache.delete, cache_key)
+        
+        content, finish_reason = await self._create(messages, temperature, json_mode, agent)
+        if cache_key and self._cacheable(content, response_model, finish_reason):
+            await asyncio.to_thread(self.cache.put, cache_key, content)
+        return content
+    
+    async def stream_chat_completion(self, messages: List[Dict[str, str]], temperature: float = 0.7,
+                                     on_delta=None, on_retry: Optional[Callable[[], None]] = None,
+                                     use_cache: bool = True, json_mode: bool = False,
+                                     agent: Optional[str] = None,
+                                     response_model: Optional[Type[BaseModel]] = None) -> str:
+        """异步流式调用；on_delta 可以是普通函数或协程函数"""
+        cache_key = self._cache_key(messages, temperature, use_cache, json_mode)
+        if cache_key:
+            cached = await asyncio.to_thread(self.cache.get, cache_key)
+            if cached is not None and self._cacheable(cached, response_model):
+                if on_delta:
+                    result = on_delta(cached)
+                    if inspect.isawaitable(result):
+                        await result
+                return cached
+            if cached is not None:
+                await asyncio.to_thread(self.cache.delete, cache_key)
+        
+        content, finish_reason = await self._stream(messages, temperature, on_delta, on_retry, json_mode, agent)
+        if cache_key and self._cacheable(content, response_model, finish_reason):
+            await asyncio.to_thread(self.cache.put, cache_key, content)
+        return content
@@ -0,0 +1,203 @@
+"""
+进程级令牌桶限流器
+同时约束每分钟请求数（RPM）与每分钟 token 数（TPM），
+超出额度的调用排队等待而不是直接失败；线程与协程共用同一组令牌桶
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional
+
+
+class TokenBucket:
+    """按分钟额度匀速补充的令牌桶；limit<=0 表示不限制"""
+    
+    def __init__(self, limit_per_minute: float, now: float):
+        self.capacity = float(limit_per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated_at = now
+    
+    @property
+    def unlimited(self) -> bool:
+        return self.capacity <= 0
+    
+    def refill(self, now: float):
+        if self.unlimited:
+            return
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+    
+    def wait_time(self, amount: float) -> float:
+        """凑够 amount 个令牌还需等待的秒数（调用前需先 refill）"""
+        if self.unlimited or self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """
+    RPM + TPM 双令牌桶限流器
+    额度不足的调用方按到达顺序排队，只有队首可以扣减额度，
+    避免 token 估算量大的请求被源源不断的小请求饿死
+    """
+    
+    # 非队首的调用方轮询队列的间隔（秒）
+    poll_interval = 0.05
+    
+    def __init__(self, rpm: float = 0, tpm: float = 0,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep,
+                 async_sleep: Callable[[float], Awaitable[None]] = asyncio.sleep):
+        # clock/sleep 可替换，便于用假时钟做确定性测试
+        self._clock = clock
+        self._sleep = sleep
+        self._async_sleep = async_sleep
+        now = clock()
+        self._requests = TokenBucket(rpm, now)
+        self._tokens = TokenBucket(tpm, now)
+        self._lock = threading.Lock()
+        self._queue: Deque[object] = deque()
+        self.total_wait_seconds = 0.0
+    
+    @property
+    def enabled(self) -> bool:
+        return not (self._requests.unlimited and self._tokens.unlimited)
+    
+    @property
+    def queue_depth(self) -> int:
+        """当前排队等待额度的调用数（不含无需等待直接通过的调用）"""
+        return len(self._queue)
+    
+    def _clamp(self, tokens: int) -> float:
+        # 单次请求的估算量超过桶容量时按容量计，避免永远等不到
+        if self._tokens.unlimited:
+            return 0.0
+        return float(min(tokens, self._tokens.capacity))
+    
+    def _wait_locked(self, amount: float) -> float:
+        """补充令牌并返回凑够一次请求额度还需等待的秒数（需持有锁）"""
+        now = self._clock()
+        self._requests.refill(now)
+        self._tokens.refill(now)
+        return max(self._requests.wait_time(1), self._tokens.wait_time(amount))
+    
+    def _reserve_locked(self, amount: float) -> float:
+        """额度足够时立即扣减并返回 0，否则返回还需等待的秒数（需持有锁）"""
+        wait = self._wait_locked(amount)
+        if wait <= 0:
+            if not self._requests.unlimited:
+                self._requests.tokens -= 1
+            if not self._tokens.unlimited:
+                self._tokens.tokens -= amount
+        return wait
+    
+    def _enter(self, amount: float) -> Optional[object]:
+        """无人排队且额度足够时直接扣减并返回 None，否则排到队尾并返回排队凭据"""
+        with self._lock:
+            if not self._queue and self._reserve_locked(amount) <= 0:
+                return None
+            ticket = object()
+            self._queue.append(ticket)
+            return ticket
+    
+    def _poll(self, ticket: object, amount: float) -> float:
+        """排队中的调用方检查一次额度：返回 0 表示已扣减并出队，否则返回建议的等待秒数"""
+        with self._lock:
+            if self._queue[0] is not ticket:
+                return self.poll_interval
+            wait = self._reserve_locked(amount)
+            if wait <= 0:
+                self._queue.popleft()
+            return wait
+    
+    def _leave(self, ticket: object, start: float) -> float:
+        """结束排队并累计等待时间；因异常或取消退出时让出队位"""
+        with self._lock:
+            if ticket in self._queue:
+                self._queue.remove(ticket)
+            waited = self._clock() - start
+            self.total_wait_seconds += waited
+            return waited
+    
+    def current_wait_time(self, tokens: int = 0) -> float:
+        """估算一个新请求（含 tokens 个 token）现在需要等待的秒数"""
+        amount = self._clamp(tokens)
+        with self._lock:
+            return self._wait_locked(amount)
+    
+    def acquire(self, tokens: int = 0) -> float:
+        """阻塞直到额度可用，返回实际等待的秒数"""
+        if not self.enabled:
+            return 0.0
+        amount = self._clamp(tokens)
+        start = self._clock()
+        ticket = self._enter(amount)
+        if ticket is None:
+            return 0.0
+        try:
+            while True:
+                wait = self._poll(ticket, amount)
+                if wait <= 0:
+                    break
+                # 分段睡眠，额度被其他调用方退还时能及时醒来
+                self._sleep(min(wait, 1.0))
+        finally:
+            waited = self._leave(ticket, start)
+        return waited
+    
+    async def aacquire(self, tokens: int = 0) -> float:
+        """acquire 的协程版本，等待期间不阻塞事件循环；与线程共用同一个队列"""
+        if not self.enabled:
+            return 0.0
+        amount = self._clamp(tokens)
+        start = self._clock()
+        ticket = self._enter(amount)
+        if ticket is None:
+            return 0.0
+        try:
+            while True:
+                wait = self._poll(ticket, amount)
+                if wait <= 0:
+                    break
+                await self._async_sleep(min(wait, 1.0))
+        finally:
+            waited = self._leave(ticket, start)
+        return waited
+    
+    def settle(self, reserved_tokens: int, actual_tokens: Optional[int]):
+        """请求完成后按实际用量校正 TPM 桶：多预留的退还，少预留的补扣"""
+        if self._tokens.unlimited or actual_tokens is None:
+            return
+        with self._lock:
+            self._tokens.tokens = min(
+                self._tokens.capacity,
+                self._tokens.tokens + self._clamp(reserved_tokens) - actual_tokens
+            )
+    
+    def stats(self) -> Dict[str, Any]:
+        """当前限流状态"""
+        return {
+            "queue_depth": self.queue_depth,
+            "current_wait_time": self.current_wait_time(),
+            "total_wait_seconds": self.total_wait_seconds,
+        }
+
+
+_shared_limiter: Optional[RateLimiter] = None
+_shared_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """获取进程内共享的限流器（LLM_RPM_LIMIT / LLM_TPM_LIMIT，0 表示不限制）"""
+    global _shared_limiter
+    with _shared_limiter_lock:
+        if _shared_limiter is None:
+            _shared_limiter = RateLimiter(
+                rpm=float(os.getenv("LLM_RPM_LIMIT", "0")),
+                tpm=float(os.getenv("LLM_TPM_LIMIT", "0"))
+            )
+        return _shared_limiter
@@ -0,0 +1,150 @@
+"""
+文本处理工具
+"""
+
+import hashlib
+import re
+import unicodedata
+from typing import Dict, List, Optional
+
+_WHITESPACE_RE = re.compile(r"\s+")
+# 中日韩文字、标点与全角字符
+_CJK_RE = re.compile(r"[\u2e80-\u9fff\uac00-\ud7af\uff00-\uffef]")
+
+
+def normalize_text(text: str) -> str:
+    """规范化文本：NFKC 统一全角/半角与兼容字符，折叠连续空白并去除首尾空白"""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKC", text)
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def question_content_hash(question: str, thinking_chain: str, answer: str) -> str:
+    """计算 问题/思维链/答案 规范化后的内容哈希，用于识别重复的种子问题"""
+    payload = "\x1f".join(normalize_text(part) for part in (question, thinking_chain, answer))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算文本的 token 数：中日韩字符约 0.6 token/字，其余字符约 0.3 token/字"""
+    if not text:
+        return 0
+    cjk = len(_CJK_RE.findall(text))
+    return int(cjk * 0.6 + (len(text) - cjk) * 0.3) + 1
+
+
+def estimate_messages_tokens(messages: List[Dict[str, str]]) -> int:
+    """估算对话消息的 token 数（每条消息另计少量格式开销）"""
+    return sum(estimate_tokens(m.get("content") or "") + 4 for m in messages)
+
+
+# 压缩时优先保留的关键行：公式、推导与结论
+_KEY_SEGMENT_RE = re.compile(r"[=≈≠≤≥<>±×÷√∑∏∫∞^_$\\]|答案|结论|所以|因此|综上|故|即")
+# 按换行与句末标点切分，标点与紧随的换行留在所在片段末尾
+_SEGMENT_RE = re.compile(r"[^\n。；！？;!?]*[。；！？;!?]*\n?")
+_OMITTED = "……"
+
+
+def _truncate_middle(text: str, max_tokens: int) -> str:
+    """保留首尾、省略中间，使估算 token 数不超过 max_tokens"""
+    keep = len(text) * max_tokens // max(1, estimate_tokens(text))
+    while keep > 0:
+        head = keep * 2 // 3
+        truncated = text[:head] + _OMITTED + text[len(text) - (keep - head):]
+        if estimate_tokens(truncated) <= max_tokens:
+            return truncated
+        keep = keep * 9 // 10
+    return _OMITTED
+
+
+def compact_text(text: str, max_tokens: int) -> str:
+    """把文本压缩到约 max_tokens 个 token 以内，结果只取决于输入（相同输入总是得到相同输出）
+    
+    按行/句切分后依次保留：第一句（题设）、最后一句（结论）、含公式或推导关键词的句子、其余句子，
+    放不下的句子省略并以“……”标记，保留的句子维持原有顺序；单句就超出预算时保留首尾截断中间。
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    segments = [segment for segment in _SEGMENT_RE.findall(text) if segment.strip()]
+    last = len(segments) - 1
+    order = sorted(
+        range(len(segments)),
+        key=lambda i: (0 if i in (0, last) else 1 if _KEY_SEGMENT_RE.search(segments[i]) else 2, i)
+    )
+    kept = set()
+    used = 0
+    for i in order:
+        # 每个片段另计一个可能的省略标记
+        cost = estimate_tokens(segments[i]) + estimate_tokens(_OMITTED)
+        if used + cost <= max_tokens:
+            kept.add(i)
+            used += cost
+    if not kept:
+        return _truncate_middle(text, max_tokens)
+    
+    # 连续省略的片段合并为一个标记，被省略部分以换行结尾时标记后同样换行
+    parts = []
+    for i, segment in enumerate(segments):
+        if i in kept:
+            parts.append(segment)
+            continue
+        if i == 0 or i - 1 in kept:
+            parts.append(_OMITTED)
+        if segment.endswith("\n") and (i == last or i + 1 in kept):
+            parts.append("\n")
+    compacted = "".join(parts)
+    return compacted if estimate_tokens(compacted) <= max_tokens else _truncate_middle(compacted, max_tokens)
+
+
+_HEX4 = re.compile(r'[0-9a-fA-F]{4}')
+_JSON_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+
+def extract_partial_json_string(text: str, key: str) -> Optional[str]:
+    """从可能尚未生成完整的 JSON 文本中提取字符串字段 key 的当前值
+    
+    用于流式响应：字段的结束引号尚未到达时返回已收到的部分；
+    非法转义（如 LaTeX 的 \\( ）按原样保留，末尾不完整的转义序列会被忽略
+    """
+    match = re.search(r'"%s"\s*:\s*"' % re.escape(key), text)
+    if not match:
+        return None
+    out = []
+    i = match.end()
+    n = len(text)
+    while i < n:
+        ch = text[i]
+        if ch == '"':
+            break
+        if ch != '\\':
+            out.append(ch)
+            i += 1
+            continue
+        if i + 1 >= n:
+            break
+        nxt = text[i + 1]
+        if nxt == 'u':
+            code = text[i + 2:i + 6]
+            if len(code) < 4:
+                break
+            if not _HEX4.fullmatch(code):
+                out.append(text[i:i + 6])
+                i += 6
+                continue
+            value = int(code, 16)
+            if 0xD800 <= value < 0xDC00:
+                # 代理对的高位：低位尚未到达时等待后续内容，避免产出半个字符
+                low = text[i + 6:i + 12]
+                if len(low) < 6:
+                    break
+                low_value = int(low[2:], 16) if low[:2] == '\\u' and _HEX4.fullmatch(low[2:]) else -1
+                if 0xDC00 <= low_value < 0xE000:
+                    value = 0x10000 + ((value - 0xD800) << 10) + (low_value - 0xDC00)
+                    i += 6
+            out.append(chr(value))
+            i += 6
+            continue
+        out.append(_JSON_ESCAPES.get(nxt, ch + nxt))
+        i += 2
+    return "".join(out)
@@ -1,6 +1,11 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
 from langgraph.graph import StateGraph, END
-from typing import Dict, Any
-from .models.schemas import WorkflowState, QuestionInput
+from langgraph.types import Send
+from typing import Dict, Any, List, Optional, Union
+from .database.db_manager import get_db_manager
+from .models.schemas import WorkflowState, QuestionInput, QuestionBranchState, QuestionBranchResult
 from .agents.question_agents import (
     QuestionTaggingAgent, 
     QuestionGenerationAgent, 
@@ -12,29 +17,62 @@ from .agents.question_agents import (
 class QuestionGenerationWorkflow:
     """问题生成工作流"""
     
-    def __init__(self):
+    def __init__(self, fan_out: Optional[bool] = None):
         self.tagging_agent = QuestionTaggingAgent()
         self.generation_agent = QuestionGenerationAgent()
         self.solving_agent = QuestionSolvingAgent()
         self.verification_agent = QuestionVerificationAgent()
+        # 与各代理共用的数据库管理器，运行结束时等待后台写入落盘
+        self.db_manager = get_db_manager()
+        # 扇出模式：每道生成的问题独立走 解答→检查 分支，而不是整阶段串行推进
+        if fan_out is None:
+            fan_out = os.getenv("WORKFLOW_FAN_OUT", "false").lower() in ("1", "true", "yes")
+        self.fan_out = fan_out
         self.workflow = self._build_workflow()
+        # 异步节点版本的工作流图，供 arun 通过 ainvoke 驱动
+        self.async_workflow = self._build_workflow(asynchronous=True)
     
-    def _build_workflow(self) -> StateGraph:
+    def _build_workflow(self, asynchronous: bool = False) -> StateGraph:
         """构建工作流图"""
         # 创建状态图
         workflow = StateGraph(WorkflowState)
         
         # 添加节点
-        workflow.add_node("tag_question", self._tag_question_node)
-        workflow.add_node("generate_questions", self._generate_questions_node)
-        workflow.add_node("solve_questions", self._solve_questions_node)
-        workflow.add_node("verify_solutions", self._verify_solutions_node)
-        
-        # 添加边
+        if asynchronous:
+            workflow.add_node("tag_question", self._atag_question_node)
+            workflow.add_node("generate_questions", self._agenerate_questions_node)
+        else:
+            workflow.add_node("tag_question", self._tag_question_node)
+            workflow.add_node("generate_questions", self._generate_questions_node)
         workflow.add_edge("tag_question", "generate_questions")
-        workflow.add_edge("generate_questions", "solve_questions")
-        workflow.add_edge("solve_questions", "verify_solutions")
-        workflow.add_edge("verify_solutions", END)
+        
+        if self.fan_out:
+            # 每道问题通过 Send 派发到独立的 解答→检查 分支，分支结果由 reducer 汇总
+            if asynchronous:
+                workflow.add_node("solve_and_verify", self._asolve_and_verify_node)
+            else:
+                workflow.add_node("solve_and_verify", self._solve_and_verify_node)
+            workflow.add_node("collect_branches", self._collect_branches_node)
+            
+            workflow.add_conditional_edges(
+                "generate_questions",
+                self._dispatch_questions,
+                ["solve_and_verify", "collect_branches", END]
+            )
+            workflow.add_edge("solve_and_verify", "collect_branches")
+            workflow.add_edge("collect_branches", END)
+        else:
+            if asynchronous:
+                workflow.add_node("solve_questions", self._asolve_questions_node)
+                workflow.add_node("verify_solutions", self._averify_solutions_node)
+            else:
+                workflow.add_node("solve_questions", self._solve_questions_node)
+                workflow.add_node("verify_solutions", self._verify_solutions_node)
+            
+            # 添加边
+            workflow.add_edge("generate_questions", "solve_questions")
+            workflow.add_edge("solve_questions", "verify_solutions")
+            workflow.add_edge("verify_solutions", END)
         
         # 设置入口点
         workflow.set_entry_point("tag_question")
@@ -52,12 +90,54 @@ class QuestionGenerationWorkflow:
             return state
         
         print("🔄 开始生成相似问题...")
-        return self.generation_agent.generate_questions(state)
+        if not self.generation_agent.streaming:
+            return self.generation_agent.generate_questions(state)
+        
+        # 流式生成：每解析出一道完整的问题就立即提交解答，生成与解答重叠进行
+        futures = []
+        with ThreadPoolExecutor(max_workers=max(1, self.solving_agent.max_workers)) as executor:
+            state = self.generation_agent.generate_questions(
+                state,
+                on_question=lambda question: futures.append(executor.submit(self.solving_agent.solve_question, question))
+            )
+            try:
+                solutions = [future.result() for future in futures]
+            except Exception as e:
+                if not state.error:
+                    state.error = f"问题解答失败: {str(e)}"
+                    print(f"问题解答错误: {e}")
+                return state
+        if not state.error:
+            state.solutions = solutions
+        return state
+    
+    @staticmethod
+    def _already_solved(state: WorkflowState) -> bool:
+        """流式生成阶段是否已经解答了全部问题"""
+        return bool(state.generated_questions) and len(state.solutions) == len(state.generated_questions)
+    
+    @staticmethod
+    def _all_duplicates(state: WorkflowState) -> bool:
+        """生成的问题是否全部作为近似重复被过滤"""
+        return not state.generated_questions and state.duplicates_removed > 0
+    
+    @staticmethod
+    def _all_duplicates_error(state: WorkflowState) -> str:
+        """全部问题被过滤时的错误信息：本次运行没有产生新的问题，不应报告成功"""
+        return f"问题解答失败: 生成的 {state.duplicates_removed} 道问题均与已有问题近似重复，没有新的问题"
     
     def _solve_questions_node(self, state: WorkflowState) -> WorkflowState:
         """问题解答节点"""
         if state.error:
             return state
+        if self._all_duplicates(state):
+            state.error = self._all_duplicates_error(state)
+            print(f"问题解答错误: {state.error}")
+            return state
+        if self._already_solved(state):
+            print(f"♻️ {len(state.solutions)} 道问题已在生成阶段完成解答")
+            state.current_step = "completed"
+            return state
         
         print("🧠 开始解答生成的问题...")
         return self.solving_agent.solve_questions(state)
@@ -70,12 +150,141 @@ class QuestionGenerationWorkflow:
         print("🔍 开始检查思维链质量...")
         return self.verification_agent.verify_solutions(state)
     
-    def run(self, question: str, thinking_chain: str, answer: str) -> WorkflowState:
-        """运行工作流"""
-        print("🚀 启动问题生成工作流...")
+    async def _atag_question_node(self, state: WorkflowState) -> WorkflowState:
+        """问题标签识别节点（异步）"""
+        print("🏷️ 开始问题标签识别...")
+        return await self.tagging_agent.atag_question(state)
+    
+    async def _agenerate_questions_node(self, state: WorkflowState) -> WorkflowState:
+        """问题生成节点（异步）"""
+        if state.error:
+            return state
         
-        # 创建初始状态
-        initial_state = WorkflowState(
+        print("🔄 开始生成相似问题...")
+        if not self.generation_agent.streaming:
+            return await self.generation_agent.agenerate_questions(state)
+        
+        semaphore = asyncio.Semaphore(max(1, self.solving_agent.max_workers))
+        tasks = []
+        
+        async def _bounded_solve(question):
+            async with semaphore:
+                return await self.solving_agent.asolve_question(question)
+        
+        state = await self.generation_agent.agenerate_questions(
+            state, on_question=lambda question: tasks.append(asyncio.create_task(_bounded_solve(question)))
+        )
+        try:
+            solutions = await asyncio.gather(*tasks)
+        except Exception as e:
+            for task in tasks:
+                task.cancel()
+            if not state.error:
+                state.error = f"问题解答失败: {str(e)}"
+                print(f"问题解答错误: {e}")
+            return state
+        if not state.error:
+            state.solutions = list(solutions)
+        return state
+    
+    async def _asolve_questions_node(self, state: WorkflowState) -> WorkflowState:
+        """问题解答节点（异步）"""
+        if state.error:
+            return state
+        if self._all_duplicates(state):
+            state.error = self._all_duplicates_error(state)
+            print(f"问题解答错误: {state.error}")
+            return state
+        if self._already_solved(state):
+            print(f"♻️ {len(state.solutions)} 道问题已在生成阶段完成解答")
+            state.current_step = "completed"
+            return state
+        
+        print("🧠 开始解答生成的问题...")
+        return await self.solving_agent.asolve_questions(state)
+    
+    async def _averify_solutions_node(self, state: WorkflowState) -> WorkflowState:
+        """思维链检查节点（异步）"""
+        if state.error:
+            return state
+        
+        print("🔍 开始检查思维链质量...")
+        return await self.verification_agent.averify_solutions(state)
+    
+    def _dispatch_questions(self, state: WorkflowState) -> Union[str, List[Send]]:
+        """扇出：为每道生成的问题派发一个 解答→检查 分支"""
+        if state.error:
+            return END
+        if not state.generated_questions:
+            return "collect_branches"
+        
+        print(f"🔀 扇出 {len(state.generated_questions)} 个 解答→检查 分支...")
+        solutions = state.solutions if self._already_solved(state) else [None] * len(state.generated_questions)
+        return [
+            Send("solve_and_verify", QuestionBranchState(index=i, question=question, solution=solution))
+            for i, (question, solution) in enumerate(zip(state.generated_questions, solutions))
+        ]
+    
+    def _solve_and_verify_node(self, branch: QuestionBranchState) -> Dict[str, Any]:
+        """单道问题的 解答→检查 分支节点"""
+        try:
+            solution = branch.solution or self.solving_agent.solve_question(branch.question)
+            verification_result = self.verification_agent.verify_solution(branch.index, branch.question, solution)
+            result = QuestionBranchResult(
+                index=branch.index, solution=solution, verification_result=verification_result
+            )
+        except Exception as e:
+            print(f"第{branch.index+1}题分支错误: {e}")
+            result = QuestionBranchResult(index=branch.index, error=str(e))
+        return {"branch_results": [result]}
+    
+    async def _asolve_and_verify_node(self, branch: QuestionBranchState) -> Dict[str, Any]:
+        """单道问题的 解答→检查 分支节点（异步）"""
+        try:
+            solution = branch.solution or await self.solving_agent.asolve_question(branch.question)
+            verification_result = await self.verification_agent.averify_solution(
+                branch.index, branch.question, solution
+            )
+            result = QuestionBranchResult(
+                index=branch.index, solution=solution, verification_result=verification_result
+            )
+        except Exception as e:
+            print(f"第{branch.index+1}题分支错误: {e}")
+            result = QuestionBranchResult(index=branch.index, error=str(e))
+        return {"branch_results": [result]}
+    
+    def _collect_branches_node(self, state: WorkflowState) -> Dict[str, Any]:
+        """汇总各分支结果，按问题下标还原顺序
+        
+        只返回需要更新的字段：若返回完整状态，branch_results 会被 reducer 再次累加。
+        """
+        if self._all_duplicates(state):
+            return {"error": self._all_duplicates_error(state)}
+        if not state.generated_questions:
+            return {"error": "问题解答失败: 生成的问题为空"}
+        
+        results = sorted(state.branch_results, key=lambda r: r.index)
+        errors = [r.error for r in results if r.error]
+        if errors:
+            return {"error": f"问题解答失败: {errors[0]}"}
+        
+        verification_results = [r.verification_result for r in results]
+        passed_count = sum(1 for r in verification_results if r.passed)
+        print(f"✅ 思维链检查完成: {passed_count}/{len(verification_results)} 题通过检查")
+        return {
+            "solutions": [r.solution for r in results],
+            "verification_results": verification_results,
+            "current_step": "verified"
+        }
+    
+    def _run_config(self) -> Dict[str, Any]:
+        """扇出模式下用解答并发数限制同时运行的分支数"""
+        return {"max_concurrency": self.solving_agent.max_workers} if self.fan_out else {}
+    
+    @staticmethod
+    def _initial_state(question: str, thinking_chain: str, answer: str) -> WorkflowState:
+        """创建初始状态"""
+        return WorkflowState(
             input_question=QuestionInput(
                 question=question,
                 thinking_chain=thinking_chain,
@@ -83,30 +292,21 @@ class QuestionGenerationWorkflow:
             ),
             current_step="start"
         )
+    
+    def run(self, question: str, thinking_chain: str, answer: str) -> WorkflowState:
+        """运行工作流"""
+        print("🚀 启动问题生成工作流...")
+        
+        # 创建初始状态
+        initial_state = self._initial_state(question, thinking_chain, answer)
         
         # 运行工作流
         try:
-            final_state = self.workflow.invoke(initial_state)
-
-            # LangGraph 常常返回字典形式的状态，这里将其转换为 WorkflowState，而不是当成错误
-            if isinstance(final_state, dict):
-                try:
-                    final_state = WorkflowState(**final_state)
-                except Exception:
-                    # 若转换失败，再尝试读取其中的 error 字段
-                    err_msg = final_state.get('error') if isinstance(final_state, dict) else str(final_state)
-                    print(f"❌ 工作流执行失败: {err_msg or final_state}")
-                    return WorkflowState(input_question=initial_state.input_question, error=str(err_msg or final_state))
-
-            if final_state.error:
-                print(f"❌ 工作流执行失败: {final_state.error}")
-            else:
-                print("✅ 工作流执行成功!")
-                print(f"📊 生成了 {len(final_state.generated_questions)} 道问题")
-                print(f"📝 完成了 {len(final_state.solutions)} 个解答")
-
-            return final_state
-            
+            final_state = self.workflow.invoke(initial_state, config=self._run_config())
+            # 屏障：返回前本次运行的所有写入都已提交，后台写入失败时本次运行记为失败
+            self.db_manager.flush()
+            return self._finalize_state(final_state, initial_state)
+        
         except Exception as e:
             print(f"❌ 工作流执行出错: {e}")
             error_state = WorkflowState(
@@ -115,6 +315,66 @@ class QuestionGenerationWorkflow:
             )
             return error_state
     
+    async def arun(self, question: str, thinking_chain: str, answer: str) -> WorkflowState:
+        """异步运行工作流，可在同一事件循环中并发运行多个工作流"""
+        print("🚀 启动问题生成工作流...")
+        
+        # 创建初始状态
+        initial_state = self._initial_state(question, thinking_chain, answer)
+        
+        # 运行工作流
+        try:
+            final_state = await self.async_workflow.ainvoke(initial_state, config=self._run_config())
+            # 屏障：返回前本次运行的所有写入都已提交，后台写入失败时本次运行记为失败
+            await asyncio.to_thread(self.db_manager.flush)
+            return self._finalize_state(final_state, initial_state)
+        
+        except Exception as e:
+            print(f"❌ 工作流执行出错: {e}")
+            error_state = WorkflowState(
+                input_question=initial_state.input_question,
+                error=str(e)
+            )
+            return error_state
+    
+    def _finalize_state(self, final_state, initial_state: WorkflowState) -> WorkflowState:
+        """整理工作流返回的最终状态并输出执行摘要"""
+        # LangGraph 常常返回字典形式的状态，这里将其转换为 WorkflowState，而不是当成错误
+        if isinstance(final_state, dict):
+            try:
+                final_state = WorkflowState(**final_state)
+            except Exception:
+                # 若转换失败，再尝试读取其中的 error 字段
+                err_msg = final_state.get('error') if isinstance(final_state, dict) else str(final_state)
+                print(f"❌ 工作流执行失败: {err_msg or final_state}")
+                return WorkflowState(input_question=initial_state.input_question, error=str(err_msg or final_state))
+        
+        if final_state.error:
+            print(f"❌ 工作流执行失败: {final_state.error}")
+        else:
+            print("✅ 工作流执行成功!")
+            print(f"📊 生成了 {len(final_state.generated_questions)} 道问题")
+            if final_state.duplicates_removed:
+                print(f"🧹 过滤了 {final_state.duplicates_removed} 道近似重复的问题")
+            print(f"📝 完成了 {len(final_state.solutions)} 个解答")
+            self._report_prompt_cache()
+        
+        return final_state
+    
+    def _report_prompt_cache(self):
+        """输出各代理的提示词前缀缓存命中率（进程内累计；提供方未返回缓存命中字段时不输出）"""
+        totals: Dict[str, List[int]] = {}
+        for client in (self.solving_agent.llm_client, self.solving_agent.async_llm_client):
+            for agent, stats in client.get_prompt_cache_stats().items():
+                total = totals.setdefault(agent, [0, 0])
+                total[0] += stats["cached_tokens"]
+                total[1] += stats["prompt_tokens"]
+        if not any(cached for cached, _ in totals.values()):
+            return
+        print("🗄️ 提示词前缀缓存命中率: " + "，".join(
+            f"{agent} {cached / prompt:.0%}" for agent, (cached, prompt) in sorted(totals.items())
+        ))
+    
     def get_results(self, state: WorkflowState) -> Dict[str, Any]:
         """获取结果摘要"""
         if state.error:
@@ -127,6 +387,9 @@ class QuestionGenerationWorkflow:
                 "question_type": state.tagged_question.question_type if state.tagged_question else ""
             },
             "generated_questions": [],
+            "duplicates_removed": state.duplicates_removed,
+            # 每道被过滤的问题至少省去一次解答和一次检查调用
+            "llm_calls_saved": 2 * state.duplicates_removed,
             "solutions": [],
             "verification_summary": {
                 "total": len(state.verification_results),
@@ -0,0 +1,89 @@
+"""
+测试 JSONL 批量运行器的断点续跑功能
+"""
+
+import json
+import os
+import sys
+import tempfile
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.batch import BatchRunner
+from src.models.schemas import WorkflowState, QuestionInput
+
+
+class FakeWorkflow:
+    """不调用LLM的工作流替身，记录被处理的问题"""
+    
+    def __init__(self, fail_questions=()):
+        self.processed = []
+        self.fail_questions = set(fail_questions)
+    
+    def run(self, question, thinking_chain, answer):
+        self.processed.append(question)
+        state = WorkflowState(
+            input_question=QuestionInput(question=question, thinking_chain=thinking_chain, answer=answer)
+        )
+        if question in self.fail_questions:
+            state.error = "模拟失败"
+        return state
+    
+    def get_results(self, state):
+        if state.error:
+            return {"error": state.error}
+        return {"original_question": {"question": state.input_question.question}}
+
+
+def _write_jsonl(path, lines):
+    with open(path, "w", encoding="utf-8") as f:
+        for line in lines:
+            f.write(line + "\n")
+
+
+def test_batch_runner_resume():
+    """测试批量运行、无效记录处理与断点续跑"""
+    print("🧪 测试批量运行器")
+    print("=" * 50)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        input_path = os.path.join(tmp_dir, "seeds.jsonl")
+        records = [
+            json.dumps({"question": f"问题{i}", "thinking_chain": "思维链", "answer": "答案"}, ensure_ascii=False)
+            for i in range(6)
+        ]
+        _write_jsonl(input_path, records[:3] + ["{不是JSON", json.dumps({"question": "缺字段"})] + records[3:])
+        
+        # 第一次运行：问题4失败
+        workflow = FakeWorkflow(fail_questions={"问题4"})
+        stats = BatchRunner(workflow=workflow, workers=3).run(input_path)
+        assert stats["ok"] == 5
+        assert stats["error"] == 1
+        assert stats["invalid"] == 2
+        assert sorted(workflow.processed) == [f"问题{i}" for i in range(6)]
+        
+        with open(stats["output_path"], encoding="utf-8") as f:
+            results = [json.loads(line) for line in f]
+        assert len(results) == 5
+        
+        # 第二次运行：只重跑失败的记录
+        workflow = FakeWorkflow()
+        stats = BatchRunner(workflow=workflow, workers=3).run(input_path)
+        assert workflow.processed == ["问题4"]
+        assert stats["ok"] == 1
+        assert stats["skipped"] == 7
+        
+        # 第三次运行：全部完成，不再处理任何记录
+        workflow = FakeWorkflow()
+        stats = BatchRunner(workflow=workflow, workers=3).run(input_path)
+        assert workflow.processed == []
+        
+        # 忽略进度从头开始
+        workflow = FakeWorkflow()
+        BatchRunner(workflow=workflow, workers=3).run(input_path, resume=False)
+        assert len(workflow.processed) == 6
+    
+    print("✅ 批量运行器测试通过!")
+
+
+if __name__ == "__main__":
+    test_batch_runner_resume()
@@ -4,9 +4,12 @@
 
 import os
 import sys
+import tempfile
+import threading
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from src.database.db_manager import DatabaseManager
+from migrate_database import migrate_database
+from src.database.db_manager import FTS_TABLES, DatabaseManager
 from src.models.schemas import QuestionSolution
 from datetime import datetime
 
@@ -16,90 +19,92 @@ def test_database_relations():
     print("🧪 测试数据库关联查询功能")
     print("=" * 50)
     
-    # 创建测试数据库
-    db_manager = DatabaseManager("test_questions.db")
-    
-    # 插入测试数据
-    print("📝 插入测试数据...")
-    
-    # 插入原始问题
-    original_id = db_manager.insert_original_question(
-        "测试原始问题：求解二元一次方程组",
-        "这是一个线性代数问题，需要使用消元法...",
-        "x=2, y=3",
-        ["数学", "代数"]
-    )
-    
-    # 插入生成的问题
-    question_id1 = db_manager.insert_generated_question(
-        original_id,
-        "求解方程组：x + y = 5, 2x - y = 1",
-        ["数学", "代数"]
-    )
-    
-    question_id2 = db_manager.insert_generated_question(
-        original_id,
-        "求解方程组：3x + 2y = 12, x - y = 1",
-        ["数学", "代数"]
-    )
-    
-    # 插入解答
-    solution_id1 = db_manager.insert_question_solution(
-        question_id1,
-        "使用加减消元法：第一个方程加上第二个方程得到3x=6，所以x=2，代入得y=3",
-        "x=2, y=3"
-    )
-    
-    solution_id2 = db_manager.insert_question_solution(
-        question_id2,
-        "使用代入消元法：从第二个方程得x=y+1，代入第一个方程得3(y+1)+2y=12，解得y=1.8，x=2.8",
-        "x=2.8, y=1.8"
-    )
-    
-    print("✅ 测试数据插入完成")
-    
-    # 测试关联查询
-    print("\n🔍 测试关联查询...")
-    
-    # 测试获取带问题内容的解答
-    print("\n1. 测试 get_question_solutions (带问题内容):")
-    solutions = db_manager.get_question_solutions(question_id1)
-    for solution in solutions:
-        print(f"  解答ID: {solution.id}")
-        print(f"  问题ID: {solution.question_id}")
-        print(f"  问题内容: {solution.question}")
-        print(f"  解答: {solution.answer}")
-    
-    # 测试获取所有解答
-    print("\n2. 测试 get_all_solutions_with_questions:")
-    all_solutions = db_manager.get_all_solutions_with_questions()
-    for solution in all_solutions:
-        print(f"  解答ID: {solution.id}, 问题: {solution.question[:30]}...")
-    
-    # 测试获取特定原始问题的所有解答
-    print("\n3. 测试 get_all_solutions_with_questions (按原始问题过滤):")
-    filtered_solutions = db_manager.get_all_solutions_with_questions(original_id)
-    for solution in filtered_solutions:
-        print(f"  解答ID: {solution.id}, 问题: {solution.question[:30]}...")
-    
-    # 测试获取完整上下文
-    print("\n4. 测试 get_solution_with_full_context:")
-    context = db_manager.get_solution_with_full_context(solution_id1)
-    if context:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # 创建测试数据库
+        db_manager = DatabaseManager(os.path.join(tmp_dir, "relations.db"))
+        
+        # 插入测试数据
+        print("📝 插入测试数据...")
+        
+        # 插入原始问题
+        original_id = db_manager.insert_original_question(
+            "测试原始问题：求解二元一次方程组",
+            "这是一个线性代数问题，需要使用消元法...",
+            "x=2, y=3",
+            ["数学", "代数"],
+            "计算题"
+        )
+        
+        # 插入生成的问题
+        question_id1 = db_manager.insert_generated_question(
+            original_id,
+            "求解方程组：x + y = 5, 2x - y = 1",
+            ["数学", "代数"],
+            "计算题"
+        )
+        
+        question_id2 = db_manager.insert_generated_question(
+            original_id,
+            "求解方程组：3x + 2y = 12, x - y = 1",
+            ["数学", "代数"],
+            "计算题"
+        )
+        
+        # 插入解答
+        solution_id1 = db_manager.insert_question_solution(
+            question_id1,
+            "使用加减消元法：第一个方程加上第二个方程得到3x=6，所以x=2，代入得y=3",
+            "x=2, y=3"
+        )
+        
+        db_manager.insert_question_solution(
+            question_id2,
+            "使用代入消元法：从第二个方程得x=y+1，代入第一个方程得3(y+1)+2y=12，解得y=1.8，x=2.8",
+            "x=2.8, y=1.8"
+        )
+        
+        print("✅ 测试数据插入完成")
+        
+        # 测试关联查询
+        print("\n🔍 测试关联查询...")
+        
+        # 测试获取带问题内容的解答
+        print("\n1. 测试 get_question_solutions (带问题内容):")
+        solutions = db_manager.get_question_solutions(question_id1)
+        for solution in solutions:
+            print(f"  解答ID: {solution.id}")
+            print(f"  问题ID: {solution.question_id}")
+            print(f"  问题内容: {solution.question}")
+            print(f"  解答: {solution.answer}")
+        assert [solution.answer for solution in solutions] == ["x=2, y=3"]
+        assert solutions[0].question == "求解方程组：x + y = 5, 2x - y = 1"
+        
+        # 测试获取所有解答
+        print("\n2. 测试 get_all_solutions_with_questions:")
+        all_solutions = db_manager.get_all_solutions_with_questions()
+        for solution in all_solutions:
+            print(f"  解答ID: {solution.id}, 问题: {solution.question[:30]}...")
+        assert len(all_solutions) == 2
+        
+        # 测试获取特定原始问题的所有解答
+        print("\n3. 测试 get_all_solutions_with_questions (按原始问题过滤):")
+        filtered_solutions = db_manager.get_all_solutions_with_questions(original_id)
+        for solution in filtered_solutions:
+            print(f"  解答ID: {solution.id}, 问题: {solution.question[:30]}...")
+        assert len(filtered_solutions) == 2
+        
+        # 测试获取完整上下文
+        print("\n4. 测试 get_solution_with_full_context:")
+        context = db_manager.get_solution_with_full_context(solution_id1)
+        assert context is not None
         print(f"  原问题: {context['original_question']['question'][:30]}...")
         print(f"  生成问题: {context['generated_question']['question'][:30]}...")
         print(f"  解答: {context['solution']['answer']}")
+        assert context["solution"]["answer"] == "x=2, y=3"
+        
+        db_manager.close()
     
     print("\n✅ 所有测试通过!")
-    
-    # 清理测试数据库（如果可能）
-    try:
-        os.remove("test_questions.db")
-        print("🧹 测试数据库已清理")
-    except PermissionError:
-        print("⚠️ 无法删除 test_questions.db（文件可能仍被占用）。请手动删除该文件或关闭占用程序后重试。")
-    except FileNotFoundError:
-        print("ℹ️ 测试数据库文件已不存在，无需清理。")
 
 
 def test_question_solution_model():
@@ -126,7 +131,303 @@ def test_question_solution_model():
     print(f"  创建时间: {solution.created_at}")
 
 
+def test_database_concurrency():
+    """测试 WAL 模式下多线程写入与长时间读事务并行"""
+    print("\n🧪 测试数据库并发读写")
+    print("=" * 50)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "concurrency.db")
+        db_manager = DatabaseManager(db_path)
+        original_id = db_manager.insert_original_question("原始问题", "思维链", "答案", ["数学"], "计算题")
+        
+        # 另一个管理器（如 db_viewer）持有读事务，不应阻塞写入
+        reader = DatabaseManager(db_path)
+        reader_conn = reader.get_connection()
+        reader_conn.execute("BEGIN")
+        assert reader_conn.execute("SELECT COUNT(*) FROM generated_questions").fetchone()[0] == 0
+        
+        errors = []
+        
+        def _write(worker: int):
+            try:
+                for i in range(20):
+                    question_id = db_manager.insert_generated_question(original_id, f"问题{worker}-{i}", ["数学"], "计算题")
+                    db_manager.insert_question_solution(question_id, "思维链", "答案")
+            except Exception as e:
+                errors.append(e)
+        
+        threads = [threading.Thread(target=_write, args=(worker,)) for worker in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        
+        assert not errors, errors
+        # 读事务看到的仍是开始时的快照
+        assert reader_conn.execute("SELECT COUNT(*) FROM generated_questions").fetchone()[0] == 0
+        reader_conn.execute("COMMIT")
+        assert len(reader.get_all_solutions_with_questions(original_id)) == 80
+        assert db_manager.get_connection().execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        
+        # 日志模式会拼进 PRAGMA 语句，不在允许列表中的值直接拒绝
+        for name, value in (("DB_JOURNAL_MODE", "WAL; DROP TABLE question_solutions"), ("DB_SYNCHRONOUS", "SLOW")):
+            os.environ[name] = value
+            try:
+                DatabaseManager(db_path)
+                assert False, "应当抛出异常"
+            except ValueError as e:
+                assert name in str(e)
+            finally:
+                del os.environ[name]
+        print("✅ 并发读写测试通过!")
+        
+        reader.close()
+        db_manager.close()
+
+
+def test_bulk_writes():
+    """测试批量写入返回的ID、工作单元与事务回滚"""
+    print("\n🧪 测试批量写入")
+    print("=" * 50)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "bulk.db")
+        db_manager = DatabaseManager(db_path)
+        original_id = db_manager.insert_original_question("原始问题", "思维链", "答案", ["数学"], "计算题")
+        db_manager.insert_generated_question(original_id, "单独插入的问题", ["数学"], "计算题")
+        
+        question_ids = db_manager.insert_generated_questions(
+            original_id, [(f"问题{i}", ["数学", "代数"], "计算题") for i in range(5)]
+        )
+        assert len(question_ids) == 5
+        for i, question in enumerate(db_manager.get_generated_questions(original_id)[1:]):
+            assert question.id == question_ids[i] and question.question == f"问题{i}"
+            assert question.domain_tags == ["数学", "代数"]
+        
+        # 标签关联表与问题同步写入
+        assert db_manager.get_tag_counts() == [("数学", 1)]
+        assert db_manager.get_tag_counts(generated=True) == [("数学", 6), ("代数", 5)]
+        assert db_manager.count_questions_with_tag("代数") == (0, 5)
+        assert [q.id for q in db_manager.get_generated_questions_by_tag("代数", limit=2)] == question_ids[:-3:-1]
+        
+        solution_ids = db_manager.insert_question_solutions([(qid, "思维链", f"答案{qid}") for qid in question_ids])
+        assert [db_manager.get_question_solutions(qid)[0].id for qid in question_ids] == solution_ids
+        
+        with db_manager.unit_of_work() as writer:
+            writer.update_solution_verification(solution_ids[0], 90, True, "好")
+            writer.insert_question_solution(question_ids[0], "重新解答", "新答案")
+            # 提交之前不写入数据库
+            assert len(db_manager.get_question_solutions(question_ids[0])) == 1
+        solutions = db_manager.get_question_solutions(question_ids[0])
+        assert len(solutions) == 2
+        assert solutions[0].verification_score == 90 and solutions[0].verification_passed
+        
+        # 块内抛出异常时丢弃已收集的写操作
+        try:
+            with db_manager.unit_of_work() as writer:
+                writer.update_solution_verification(solution_ids[1], 10, False, "不应写入")
+                raise RuntimeError("模拟检查阶段失败")
+        except RuntimeError:
+            pass
+        assert db_manager.get_question_solutions(question_ids[1])[0].verification_score is None
+        
+        # 游标分页：每页接着上一页最后一条解答的ID继续，页与页之间不重不漏
+        pages = []
+        after_id = None
+        while True:
+            page = db_manager.get_solutions_page(after_id=after_id, limit=2)
+            if not page:
+                break
+            pages.append([solution.id for solution in page])
+            after_id = page[-1].id
+        assert [sid for page in pages for sid in page] == sorted(solution_ids + [solutions[1].id], reverse=True)
+        rows = list(db_manager.iter_solution_rows(batch_size=2, max_id=solution_ids[3]))
+        assert [row[0] for row in rows] == solution_ids[:4]
+        
+        try:
+            with db_manager.transaction():
+                db_manager.insert_generated_question(original_id, "会被回滚的问题", ["数学"], "计算题")
+                raise RuntimeError("模拟失败")
+        except RuntimeError:
+            pass
+        assert len(db_manager.get_generated_questions(original_id)) == 6
+        print("✅ 批量写入测试通过!")
+        
+        db_manager.close()
+
+
+def test_write_behind():
+    """测试后台写入：队列满时背压、flush 屏障与批量事务"""
+    print("\n🧪 测试后台写入")
+    print("=" * 50)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "write_behind.db")
+        db_manager = DatabaseManager(db_path)
+        db_manager.write_behind = True
+        db_manager.write_queue_size = 8
+        
+        original_id = db_manager.insert_original_question("原始问题", "思维链", "答案", ["数学"], "计算题")
+        question_id = db_manager.insert_generated_question(original_id, "问题", ["数学"], "计算题")
+        solution_ids = db_manager.insert_question_solutions([(question_id, "", "")] * 50)
+        for i, solution_id in enumerate(solution_ids):
+            db_manager.update_solution_content(solution_id, f"思维链{i}", f"答案{i}")
+            db_manager.update_solution_verification(solution_id, i, i % 2 == 0, "反馈")
+        db_manager.delete_question_solution(solution_ids[-1])
+        with db_manager.unit_of_work() as writer:
+            writer.insert_question_solution(question_id, "重新解答", "新答案")
+        db_manager.flush()
+        
+        solutions = db_manager.get_question_solutions(question_id)
+        assert len(solutions) == 50
+        assert solutions[10].answer == "答案10" and solutions[10].verification_score == 10
+        assert solutions[-1].thinking_chain == "重新解答"
+        stats = db_manager.get_write_stats()
+        assert stats["writes"] == 102 and stats["failed"] == 0 and stats["queued"] == 0
+        # 队列容量为 8，写操作必然分成多个事务批次
+        assert stats["batches"] > 1
+        
+        # 其他线程持续写入时 flush 只等待自己的屏障，不会一直等到队列清空
+        stop = threading.Event()
+        
+        def _produce():
+            while not stop.is_set():
+                db_manager.update_solution_content(solution_ids[1], "持续写入", "答案")
+        
+        producer = threading.Thread(target=_produce)
+        producer.start()
+        try:
+            db_manager.flush(timeout=10)
+        finally:
+            stop.set()
+            producer.join()
+        db_manager.flush()
+        
+        # 失败的后台写操作由之后的 flush 报告，其余写操作照常提交
+        with db_manager.unit_of_work() as writer:
+            writer.insert_question_solution(question_id, None, "缺少思维链")
+        db_manager.update_solution_content(solution_ids[0], "失败之后的写入", "答案")
+        try:
+            db_manager.flush()
+            assert False, "应当抛出异常"
+        except RuntimeError as e:
+            assert "NOT NULL" in str(e)
+        db_manager.flush()
+        assert db_manager.get_question_solutions(question_id)[0].thinking_chain == "失败之后的写入"
+        
+        # close 之前入队的写操作全部提交；之后的写操作由新的写线程执行
+        for solution_id in solution_ids[:10]:
+            db_manager.update_solution_verification(solution_id, 100, True, "关闭前")
+        db_manager.close()
+        assert all(s.verification_score == 100 for s in db_manager.get_question_solutions(question_id)[:10])
+        db_manager.update_solution_verification(solution_ids[0], 0, False, "关闭后")
+        db_manager.flush()
+        assert db_manager.get_question_solutions(question_id)[0].verification_feedback == "关闭后"
+        print(f"✅ 后台写入测试通过! {db_manager.get_write_stats()}")
+        
+        db_manager.close()
+
+
+def test_full_text_search():
+    """测试全文搜索：插入/更新/删除通过触发器同步到全文索引"""
+    print("\n🧪 测试全文搜索")
+    print("=" * 50)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "search.db")
+        db_manager = DatabaseManager(db_path)
+        if not db_manager.fts_enabled:
+            print("⚠️ 当前 SQLite 不支持 FTS5，跳过")
+            return
+        original_id = db_manager.insert_original_question("求圆的面积，半径为5cm", "使用公式 S = πr²", "25π", ["数学"], "计算题")
+        question_ids = db_manager.insert_generated_questions(
+            original_id, [("求正方形的面积，边长为3", ["数学"], "计算题"), ("证明三角形内角和为180度", ["数学"], "证明题")]
+        )
+        solution_ids = db_manager.insert_question_solutions(
+            [(question_ids[0], "正方形面积等于边长的平方", "9"), (question_ids[1], "过顶点作平行线", "180°")]
+        )
+        
+        hits = db_manager.search("面积")
+        assert {(hit["type"], hit["id"]) for hit in hits} == {
+            ("original_question", original_id), ("generated_question", question_ids[0]), ("solution", solution_ids[0])
+        }
+        assert "【面积】" in hits[0]["snippet"]
+        assert [(hit["type"], hit["id"]) for hit in db_manager.search("三角形 内角和")] == [("generated_question", question_ids[1])]
+        assert db_manager.search('"引号(AND') == []
+        
+        db_manager.update_solution_content(solution_ids[0], "边长乘以边长", "9")
+        assert db_manager.search("正方形面积") == []
+        assert db_manager.search("边长乘以")[0]["id"] == solution_ids[0]
+        db_manager.delete_question_solution(solution_ids[1])
+        assert db_manager.search("平行线") == []
+        
+        # 模拟没有全文索引的旧数据库：打开时不重建索引，搜索提示先运行迁移脚本
+        with db_manager.transaction() as conn:
+            for table in FTS_TABLES:
+                conn.execute(f"DROP TABLE {table}")
+                for suffix in ("ai", "ad", "au"):
+                    conn.execute(f"DROP TRIGGER {table}_{suffix}")
+        db_manager.close()
+        db_manager = DatabaseManager(db_path)
+        assert db_manager.fts_pending_tables() == list(FTS_TABLES)
+        try:
+            db_manager.search("面积")
+            assert False, "应当抛出异常"
+        except RuntimeError as e:
+            assert "migrate_database.py" in str(e)
+        migrate_database(db_path)
+        assert db_manager.fts_pending_tables() == []
+        assert {hit["type"] for hit in db_manager.search("面积")} == {"original_question", "generated_question"}
+        assert db_manager.search("边长乘以")[0]["id"] == solution_ids[0]
+        print("✅ 全文搜索测试通过!")
+        
+        db_manager.close()
+
+
+def test_dedup_index():
+    """测试历史近似重复索引：插入时同步写入 LSH 桶号，查找只返回相似度达到阈值的问题"""
+    print("\n🧪 测试近似重复索引")
+    print("=" * 50)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "dedup.db")
+        db_manager = DatabaseManager(db_path)
+        original_id = db_manager.insert_original_question("求圆的面积，半径为5cm", "使用公式 S = πr²", "25π", ["数学"], "计算题")
+        question_ids = db_manager.insert_generated_questions(original_id, [
+            ("已知二次函数 f(x)=x^2-4x+3，求其最小值及取得最小值时 x 的值。", ["数学"], "计算题"),
+            ("一个圆的半径为 3 cm，求它的周长和面积。", ["数学"], "计算题"),
+        ])
+        single_id = db_manager.insert_generated_question(original_id, "计算 12 与 18 的最大公约数和最小公倍数。", ["数学"], "计算题")
+        
+        match = db_manager.find_similar_generated_question("已知二次函数f(x)=x^2-4x+3，求其最小值及取得最小值时x的值", 0.8)
+        assert match is not None and match[0] == question_ids[0] and match[1] >= 0.8
+        match = db_manager.find_similar_generated_question("计算 12 与 18 的最大公约数和最小公倍数", 0.8)
+        assert match is not None and match[0] == single_id
+        assert db_manager.find_similar_generated_question("证明三角形的内角和等于 180 度。", 0.8) is None
+        assert db_manager.find_similar_generated_question("已知二次函数 f(x)=x^2-6x+5，求其图像与 x 轴的交点坐标。", 0.8) is None
+        
+        # solved_only：没有解答（或只有空的流式占位记录）的问题不算历史重复
+        similar = "计算 12 与 18 的最大公约数和最小公倍数"
+        assert db_manager.find_similar_generated_question(similar, 0.8, solved_only=True) is None
+        db_manager.insert_question_solution(single_id, "", "")
+        assert db_manager.find_similar_generated_question(similar, 0.8, solved_only=True) is None
+        db_manager.insert_question_solution(single_id, "辗转相除法", "6 和 36")
+        assert db_manager.find_similar_generated_question(similar, 0.8, solved_only=True)[0] == single_id
+        
+        # 重建索引后结果不变
+        assert db_manager.rebuild_dedup_index() == 3
+        assert db_manager.find_similar_generated_question("一个圆的半径为3cm，求它的周长和面积", 0.8)[0] == question_ids[1]
+        print("✅ 近似重复索引测试通过!")
+        
+        db_manager.close()
+
 if __name__ == "__main__":
     test_question_solution_model()
+    test_database_concurrency()
+    test_bulk_writes()
+    test_write_behind()
     test_database_relations()
+    test_full_text_search()
+    test_dedup_index()
     print("\n🎉 所有测试完成!")
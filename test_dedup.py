@@ -0,0 +1,46 @@
+"""
+测试生成问题的近似重复过滤
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.utils.dedup import NearDuplicateFilter, char_shingles, jaccard
+
+
+def test_char_shingles():
+    """测试分片忽略全角/半角、空白与标点差异"""
+    assert char_shingles("求解方程 x+1=0。") == char_shingles("求解方程ｘ＋１＝０")
+    assert char_shingles("ab") == frozenset(["ab"])
+    assert char_shingles("  ") == frozenset()
+    assert jaccard(char_shingles("已知函数f(x)=x^2"), char_shingles("求圆的面积")) == 0.0
+    print("✅ 分片测试通过!")
+
+
+def test_near_duplicate_filter():
+    """测试只丢弃与已保留问题相似度达到阈值的问题"""
+    dedup = NearDuplicateFilter(threshold=0.8)
+    questions = [
+        "已知二次函数 f(x)=x^2-4x+3，求其最小值及取得最小值时 x 的值。",
+        "已知二次函数f(x)=x^2-4x+3，求其最小值及取得最小值时x的值",
+        "已知二次函数 f(x)=x^2-6x+5，求其图像与 x 轴的交点坐标。",
+        "一个圆的半径为 3 cm，求它的周长和面积。",
+    ]
+    results = [dedup.check_and_add(question) for question in questions]
+    assert results[0] is None
+    assert results[1] is not None and results[1][0] == 0 and results[1][1] >= 0.8
+    assert results[2] is None and results[3] is None
+    assert dedup.dropped == 1
+    
+    # 阈值为 1 时只过滤规范化后完全相同的问题
+    strict = NearDuplicateFilter(threshold=1.0)
+    assert strict.check_and_add(questions[0]) is None
+    assert strict.check_and_add(questions[1]) is not None
+    assert strict.check_and_add(questions[0].replace("最小值", "最大值")) is None
+    print("✅ 近似重复过滤测试通过!")
+
+
+if __name__ == "__main__":
+    test_char_shingles()
+    test_near_duplicate_filter()
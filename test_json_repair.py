@@ -0,0 +1,65 @@
+"""
+测试容错 JSON 解析
+"""
+
+import json
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.utils.json_repair import loads_tolerant, repair_json
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "malformed_responses.jsonl")
+
+
+def test_common_repairs():
+    """测试裸换行、尾随逗号、LaTeX 转义与未转义引号的修复"""
+    result = loads_tolerant('说明文字 {"thinking_chain": "第一步\n由 \\(x^2\\) 与 \\sqrt{4} 得 2", "answer": "2",}')
+    assert result == {"thinking_chain": "第一步\n由 \\(x^2\\) 与 \\sqrt{4} 得 2", "answer": "2"}
+    
+    result = loads_tolerant('{"feedback": "第三步中"显然"缺少论证", "suggestions": ["补充推导",],}')
+    assert result == {"feedback": '第三步中"显然"缺少论证', "suggestions": ["补充推导"]}
+    
+    # 合法的转义保持不变
+    assert loads_tolerant('{"a": "\\\\(x\\\\) \\u4e2d \\"q\\""}') == {"a": '\\(x\\) 中 "q"'}
+    
+    # 只含裸换行、制表符时走快速路径，结果与修复后解析一致；含 \r 时仍丢弃 \r
+    text = '```json\n{"thinking_chain": "第一步\n\t第二步", "answer": "2"}\n```'
+    assert loads_tolerant(text) == json.loads(repair_json(text)) == {"thinking_chain": "第一步\n\t第二步", "answer": "2"}
+    assert loads_tolerant('{"answer": "第一行\r\n第二行"}') == {"answer": "第一行\n第二行"}
+    print("✅ 常见修复测试通过!")
+
+
+def test_truncated_responses():
+    """测试被截断的响应：丢弃不完整的元素后补齐括号"""
+    result = loads_tolerant('{"questions": [{"question": "q1", "domain_tags": ["数学"]}, {"question": "q2", "domain_tags": ["数')
+    assert result == {"questions": [{"question": "q1", "domain_tags": ["数学"]}]}
+    assert loads_tolerant('{"score": 90, "feedback": "推理正') == {"score": 90}
+    assert loads_tolerant('{"a": [1, 2,') == {"a": [1, 2]}
+    print("✅ 截断修复测试通过!")
+
+
+def test_corpus_and_worst_case():
+    """测试基准样本集全部可解析，且最坏情况输入耗时线性增长"""
+    with open(CORPUS_PATH, encoding="utf-8") as f:
+        cases = [json.loads(line) for line in f if line.strip()]
+    for case in cases:
+        result = loads_tolerant(case["response"])
+        for key, value in case["expect"].items():
+            if key == "questions_len":
+                assert len(result["questions"]) == value, case["name"]
+            else:
+                assert result[key] == value, case["name"]
+    
+    # 旧实现的回退正则在约 30 个反斜杠时就需要数分钟
+    start = time.perf_counter()
+    loads_tolerant('{"thinking_chain": "' + "\\a" * 50000)
+    assert time.perf_counter() - start < 2
+    print("✅ 样本集与最坏情况测试通过!")
+
+
+if __name__ == "__main__":
+    test_common_repairs()
+    test_truncated_responses()
+    test_corpus_and_worst_case()
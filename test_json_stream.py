@@ -0,0 +1,88 @@
+"""
+测试流式 JSON 数组增量解析
+"""
+
+import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.utils.json_stream import StreamingJSONArrayParser
+from src.utils.text_utils import extract_partial_json_string
+
+
+def _feed_in_chunks(parser, text, size):
+    items = []
+    for i in range(0, len(text), size):
+        items.extend(parser.feed(text[i:i + size]))
+    return items
+
+
+def test_items_emitted_as_they_complete():
+    """测试每个元素在其结束括号到达时立即产出"""
+    questions = [{"question": f"问题{i}: 求 {{x}} 的值", "tags": ["数学", "代数"]} for i in range(5)]
+    text = json.dumps({"questions": questions}, ensure_ascii=False)
+    
+    for size in (1, 3, 17, len(text)):
+        parser = StreamingJSONArrayParser("questions")
+        assert _feed_in_chunks(parser, text, size) == questions
+        assert parser.complete and not parser.broken
+    
+    # 第一个元素到达后即可产出，不必等待整个数组
+    parser = StreamingJSONArrayParser("questions")
+    first_end = text.index("]}") + 2
+    assert parser.feed(text[:first_end]) == [questions[0]]
+    print("✅ 增量产出测试通过!")
+
+
+def test_string_items_and_broken_item():
+    """测试纯字符串元素与格式错误的元素"""
+    parser = StreamingJSONArrayParser("questions")
+    assert _feed_in_chunks(parser, '{"questions": ["a \\"b\\"", "c]"]}', 2) == ['a "b"', "c]"]
+    
+    parser = StreamingJSONArrayParser("questions")
+    items = parser.feed('{"questions": [{"q": 1}, {"q": 2 "x": 3}, {"q": 4}]}')
+    assert items == [{"q": 1}]
+    assert parser.broken and parser.emitted == 1
+    print("✅ 字符串元素与错误元素测试通过!")
+
+
+def test_reset_skips_emitted_items():
+    """测试重试后不重复产出已产出位置的元素"""
+    parser = StreamingJSONArrayParser("questions")
+    assert parser.feed('{"questions": [{"q": 1}, {"q"') == [{"q": 1}]
+    parser.reset()
+    assert parser.feed('{"questions": [{"q": 10}, {"q": 20}]}') == [{"q": 20}]
+    assert parser.emitted == 2
+    print("✅ 重试测试通过!")
+
+
+def test_partial_json_string():
+    """测试从未完成的 JSON 中提取字符串字段：转义、unicode、截断与缺失的键"""
+    text = json.dumps({"thinking_chain": '第一步\n设 "x" 为\t未知数 \\ 😀', "answer": "x=2"}, ensure_ascii=True)
+    assert extract_partial_json_string(text, "thinking_chain") == '第一步\n设 "x" 为\t未知数 \\ 😀'
+    assert extract_partial_json_string(text, "answer") == "x=2"
+    
+    # 逐字符截断：每个前缀的结果都是完整值的前缀，不会产出半个转义或半个代理对
+    full = extract_partial_json_string(text, "thinking_chain")
+    for end in range(len(text)):
+        partial = extract_partial_json_string(text[:end], "thinking_chain")
+        assert partial is None or full.startswith(partial), (end, partial)
+    assert extract_partial_json_string('{"answer": "中\\u4e', "answer") == "中"
+    assert extract_partial_json_string('{"answer": "a\\', "answer") == "a"
+    
+    # 非法转义（LaTeX）原样保留，未转义的中文直接透传
+    assert extract_partial_json_string('{"answer": "\\(x^2\\) \\uZZZZ 圆"}', "answer") == "\\(x^2\\) \\uZZZZ 圆"
+    
+    # 键不存在或值不是字符串时返回 None
+    assert extract_partial_json_string('{"thinking_chain": "思考"', "answer") is None
+    assert extract_partial_json_string('{"answer": 42}', "answer") is None
+    assert extract_partial_json_string("", "answer") is None
+    print("✅ 部分 JSON 字符串提取测试通过!")
+
+
+if __name__ == "__main__":
+    test_items_emitted_as_they_complete()
+    test_string_items_and_broken_item()
+    test_reset_skips_emitted_items()
+    test_partial_json_string()
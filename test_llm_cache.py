@@ -0,0 +1,102 @@
+"""
+测试LLM响应缓存的命中、LRU淘汰与TTL
+"""
+
+import os
+import sys
+import tempfile
+import time
+from unittest import mock
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.utils.llm_cache import LLMResponseCache, get_response_cache
+
+
+def test_cache_hit_and_key():
+    """测试缓存键与命中计数"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = LLMResponseCache(os.path.join(tmp_dir, "cache.db"))
+        messages = [{"role": "user", "content": "求圆的面积"}]
+        key = cache.make_key("deepseek-chat", messages, 0.7)
+        
+        assert key == cache.make_key("deepseek-chat", list(messages), 0.7)
+        assert key != cache.make_key("deepseek-chat", messages, 0.2)
+        # JSON 模式与 max_tokens 不同的请求不共享缓存
+        assert key != cache.make_key("deepseek-chat", messages, 0.7, json_mode=True)
+        assert key != cache.make_key("deepseek-chat", messages, 0.7, max_tokens=100)
+        # 不同后端的同名模型不共享缓存
+        assert cache.make_key("deepseek-chat", messages, 0.7, base_url="http://a/v1") != \
+            cache.make_key("deepseek-chat", messages, 0.7, base_url="http://b/v1")
+        assert cache.get(key) is None
+        
+        cache.put(key, '{"answer": "25π"}')
+        assert cache.get(key) == '{"answer": "25π"}'
+        
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["entries"] == 1
+        
+        # 重新打开后缓存仍然存在
+        reopened = LLMResponseCache(os.path.join(tmp_dir, "cache.db"))
+        assert reopened.get(key) == '{"answer": "25π"}'
+        assert reopened.stats()["bytes"] == stats["bytes"]
+        reopened.delete(key)
+        assert reopened.get(key) is None and reopened.stats()["bytes"] == 0
+        cache._conn.close()
+        reopened._conn.close()
+    print("✅ 缓存命中测试通过!")
+
+
+def test_cache_lru_eviction():
+    """测试超出容量时淘汰最久未访问的条目"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = LLMResponseCache(os.path.join(tmp_dir, "cache.db"), max_bytes=300)
+        for i in range(3):
+            cache.put(f"k{i}", "x" * 100)
+            time.sleep(0.01)
+        
+        # 访问 k0 使其成为最近使用
+        assert cache.get("k0") is not None
+        cache.put("k3", "x" * 100)
+        
+        assert cache.get("k1") is None
+        assert cache.get("k0") is not None
+        assert cache.get("k3") is not None
+        assert cache.stats()["bytes"] <= 300
+        cache._conn.close()
+    print("✅ LRU淘汰测试通过!")
+
+
+def test_cache_ttl():
+    """测试过期条目视为未命中"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = LLMResponseCache(os.path.join(tmp_dir, "cache.db"), ttl=0.05)
+        cache.put("k", "v")
+        assert cache.get("k") == "v"
+        time.sleep(0.1)
+        assert cache.get("k") is None
+        assert cache.stats()["entries"] == 0
+        cache._conn.close()
+    print("✅ TTL测试通过!")
+
+
+def test_cache_disabled_by_default():
+    """测试未设置 LLM_CACHE_ENABLED 时不启用缓存：生成以非零温度采样，重跑同一种子应得到新的问题"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        env = {"LLM_CACHE_PATH": os.path.join(tmp_dir, "cache.db")}
+        with mock.patch.dict(os.environ, env):
+            os.environ.pop("LLM_CACHE_ENABLED", None)
+            assert get_response_cache() is None
+            os.environ["LLM_CACHE_ENABLED"] = "true"
+            cache = get_response_cache()
+            assert isinstance(cache, LLMResponseCache)
+            cache._conn.close()
+    print("✅ 缓存默认关闭测试通过!")
+
+
+if __name__ == "__main__":
+    test_cache_hit_and_key()
+    test_cache_lru_eviction()
+    test_cache_ttl()
+    test_cache_disabled_by_default()
@@ -0,0 +1,205 @@
+"""
+测试LLM客户端的错误分类与退避重试
+"""
+
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import openai
+from src.models.schemas import SolutionResponse, TaggingResponse, VerificationResponse
+from src.utils.llm_cache import LLMResponseCache
+from src.utils.llm_client import LLMClient
+
+# 测试期间使用假密钥并关闭响应缓存（只在各测试运行期间生效，不影响同一进程中的其他测试）
+TEST_ENV = {"OPENAI_API_KEY": "test-key", "LLM_CACHE_ENABLED": "false"}
+
+
+def _status_error(status_code, headers=None, message="模拟错误"):
+    response = SimpleNamespace(status_code=status_code, headers=headers or {}, request=None)
+    return openai.APIStatusError(message, response=response, body=None)
+
+
+class FlakyCompletions:
+    """前若干次调用抛出指定错误，之后返回正常响应"""
+    
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = 0
+        self.requests = []
+    
+    def create(self, **kwargs):
+        self.calls += 1
+        self.requests.append(kwargs)
+        if self.errors:
+            raise self.errors.pop(0)
+        message = SimpleNamespace(content='{"answer": "42"}')
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=None)
+
+
+def _client(errors):
+    client = LLMClient()
+    client.retry_base_delay = 0.01
+    completions = FlakyCompletions(errors)
+    client.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return client, completions
+
+
+@mock.patch.dict(os.environ, TEST_ENV)
+def test_error_classification():
+    """测试可重试/致命错误的分类"""
+    assert LLMClient.is_retryable(_status_error(429))
+    assert LLMClient.is_retryable(_status_error(503))
+    assert LLMClient.is_retryable(openai.APIConnectionError(request=None))
+    assert not LLMClient.is_retryable(_status_error(400))
+    assert not LLMClient.is_retryable(_status_error(401))
+    assert not LLMClient.is_retryable(ValueError("bad"))
+    assert LLMClient._retry_after(_status_error(429, {"retry-after": "2"})) == 2.0
+    assert LLMClient._retry_after(_status_error(429, {"retry-after-ms": "150"})) == 0.15
+    print("✅ 错误分类测试通过!")
+
+
+@mock.patch.dict(os.environ, TEST_ENV)
+def test_retry_recovers():
+    """测试临时错误重试后成功"""
+    client, completions = _client([_status_error(503), _status_error(429, {"retry-after": "0"})])
+    assert client.chat_completion([{"role": "user", "content": "1+1"}]) == '{"answer": "42"}'
+    assert completions.calls == 3
+    stats = client.get_retry_stats()
+    assert stats["retries"] == 2
+    assert stats["recovered"] == 1
+    print("✅ 重试恢复测试通过!")
+
+
+@mock.patch.dict(os.environ, TEST_ENV)
+def test_fatal_and_exhausted():
+    """测试致命错误不重试、重试次数用尽后抛出 RuntimeError"""
+    client, completions = _client([_status_error(401)])
+    try:
+        client.chat_completion([{"role": "user", "content": "1+1"}])
+        assert False, "应当抛出异常"
+    except RuntimeError:
+        pass
+    assert completions.calls == 1
+    assert client.get_retry_stats()["fatal"] == 1
+    
+    client, completions = _client([_status_error(500)] * 10)
+    client.max_attempts = 3
+    try:
+        client.chat_completion([{"role": "user", "content": "1+1"}])
+        assert False, "应当抛出异常"
+    except RuntimeError:
+        pass
+    assert completions.calls == 3
+    assert client.get_retry_stats()["exhausted"] == 1
+    print("✅ 致命错误与重试用尽测试通过!")
+
+
+@mock.patch.dict(os.environ, TEST_ENV)
+def test_json_mode_fallback():
+    """测试后端拒绝 response_format 时关闭 JSON 模式并立即重发"""
+    client, completions = _client([_status_error(400, message="unsupported parameter: response_format")])
+    assert client.chat_completion([{"role": "user", "content": "1+1"}], json_mode=True) == '{"answer": "42"}'
+    assert completions.calls == 2
+    assert completions.requests[0]["response_format"] == {"type": "json_object"}
+    assert "response_format" not in completions.requests[1]
+    assert not client.json_mode
+    assert client.get_retry_stats()["fatal"] == 0
+    print("✅ JSON 模式回退测试通过!")
+
+
+@mock.patch.dict(os.environ, TEST_ENV)
+def test_parse_structured():
+    """测试结构化解析：合法 JSON 直接校验，不规范的输出走容错解析"""
+    client, _ = _client([])
+    result = client.parse_structured('{"thinking_chain": "思考", "answer": 42}', SolutionResponse)
+    assert result.answer == "42"
+    result = client.parse_structured('说明文字 {"score": 85, "passed": true, "feedback": "\\(x\\)",}', VerificationResponse)
+    assert result.score == 85 and result.passed
+    try:
+        client.parse_structured("没有 JSON", SolutionResponse)
+        assert False, "应当抛出异常"
+    except ValueError:
+        pass
+    assert client.get_parse_stats() == {"structured": 1, "repaired": 1, "failed": 1}
+    print("✅ 结构化解析测试通过!")
+
+
+@mock.patch.dict(os.environ, TEST_ENV)
+def test_cache_only_valid_responses():
+    """测试只缓存能解析的完整响应：被截断或无法解析的响应不写入缓存，早先缓存的无效响应被删除"""
+    client, completions = _client([])
+    responses = [
+        ('{"domain_tags": ["数学"], "question_type": "计', "length"),
+        ("抱歉，我无法回答", "stop"),
+        ('{"domain_tags": ["数学"], "question_type": "计算题"}', "stop"),
+    ]
+    
+    def create(**kwargs):
+        completions.calls += 1
+        content, finish_reason = responses.pop(0)
+        choice = SimpleNamespace(message=SimpleNamespace(content=content), finish_reason=finish_reason)
+        return SimpleNamespace(choices=[choice], usage=None)
+    
+    completions.create = create
+    messages = [{"role": "user", "content": "打标签"}]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        client.cache = LLMResponseCache(os.path.join(tmp_dir, "cache.db"))
+        for _ in range(3):
+            client.chat_completion(messages, json_mode=True, response_model=TaggingResponse)
+        assert completions.calls == 3
+        assert client.chat_completion(messages, json_mode=True, response_model=TaggingResponse).endswith('"计算题"}')
+        assert completions.calls == 3
+        
+        # 缓存键包含 JSON 模式：非 JSON 模式的请求不会拿到上面缓存的响应
+        responses.append(("普通文本", "stop"))
+        assert client.chat_completion(messages) == "普通文本"
+        assert completions.calls == 4
+        
+        key = client._cache_key(messages, 0.7, True, json_mode=True)
+        client.cache.put(key, "旧版本缓存的无效响应")
+        responses.append(('{"domain_tags": ["物理"], "question_type": "计算题"}', "stop"))
+        assert "物理" in client.chat_completion(messages, json_mode=True, response_model=TaggingResponse)
+        assert "物理" in client.cache.get(key)
+        client.cache._conn.close()
+    print("✅ 响应缓存校验测试通过!")
+
+
+@mock.patch.dict(os.environ, TEST_ENV)
+def test_prompt_cache_stats():
+    """测试按调用方标签累计提供方返回的前缀缓存命中 token（兼容 OpenAI 与 DeepSeek 的字段）"""
+    client, completions = _client([])
+    usages = [
+        SimpleNamespace(prompt_tokens=1000, total_tokens=1100,
+                        prompt_tokens_details=SimpleNamespace(cached_tokens=768)),
+        SimpleNamespace(prompt_tokens=1000, total_tokens=1100, prompt_tokens_details=None,
+                        prompt_cache_hit_tokens=900, prompt_cache_miss_tokens=100),
+        SimpleNamespace(prompt_tokens=500, total_tokens=600),
+    ]
+    
+    def create(**kwargs):
+        message = SimpleNamespace(content='{"answer": "42"}')
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usages.pop(0))
+    
+    completions.create = create
+    client.chat_completion([{"role": "user", "content": "解答"}], agent="solving")
+    client.chat_completion([{"role": "user", "content": "解答"}], agent="solving")
+    client.chat_completion([{"role": "user", "content": "检查"}], agent="verification")
+    
+    stats = client.get_prompt_cache_stats()
+    assert stats["solving"] == {"requests": 2, "prompt_tokens": 2000, "cached_tokens": 1668, "hit_ratio": 0.834}
+    assert stats["verification"]["cached_tokens"] == 0 and stats["verification"]["hit_ratio"] == 0.0
+    print("✅ 前缀缓存统计测试通过!")
+
+
+if __name__ == "__main__":
+    test_error_classification()
+    test_retry_recovers()
+    test_fatal_and_exhausted()
+    test_json_mode_fallback()
+    test_parse_structured()
+    test_cache_only_valid_responses()
+    test_prompt_cache_stats()
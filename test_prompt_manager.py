@@ -0,0 +1,93 @@
+"""
+测试提示词 token 预算与确定性压缩
+"""
+
+import os
+import re
+import sys
+from unittest import mock
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.prompts.prompt_manager import PromptManager
+from src.prompts.templates.tagging_prompt import TAGGING_PROMPT
+from src.prompts.templates.generation_prompt import QUESTION_GENERATION_PROMPT
+from src.prompts.templates.solution_prompt import SOLUTION_PROMPT
+from src.prompts.templates.verification_prompt import VERIFICATION_PROMPT
+from src.utils.text_utils import compact_text, estimate_tokens
+
+LONG_CHAIN = (
+    "设圆的半径为 r。\n"
+    + "这一步只是复述题目背景，没有新的信息。\n" * 60
+    + "由面积公式 S = πr^2，代入 r = 5 得 S = 25π。\n"
+    + "再补充一些与计算无关的说明。\n" * 30
+    + "因此答案为 25π。"
+)
+
+
+def test_compact_text():
+    """测试压缩结果不超出预算、保留首尾与公式行，且相同输入结果相同"""
+    compacted = compact_text(LONG_CHAIN, 100)
+    assert estimate_tokens(compacted) <= 100
+    assert compacted.startswith("设圆的半径为 r。\n")
+    assert "S = πr^2" in compacted and compacted.endswith("因此答案为 25π。")
+    assert "……" in compacted
+    assert compact_text(LONG_CHAIN, 100) == compacted
+    assert compact_text("短文本", 100) == "短文本"
+    # 单句超出预算时保留首尾、截断中间
+    truncated = compact_text("甲" * 2000, 50)
+    assert estimate_tokens(truncated) <= 50 and truncated.startswith("甲") and truncated.endswith("甲")
+    print("✅ 文本压缩测试通过!")
+
+
+def test_prompt_budget():
+    """测试超出模板预算的种子输入被压缩，并记录压缩前后的 token 估算"""
+    with mock.patch.dict(os.environ, {"PROMPT_TOKEN_BUDGET_GENERATION": "600", "PROMPT_TOKEN_BUDGET_TAGGING": "0"}):
+        manager = PromptManager()
+    before = PromptManager.get_token_stats()
+    
+    prompt = manager.get_question_generation_prompt(["数学"], "计算题", "求半径为5的圆的面积", LONG_CHAIN, "25π")
+    assert estimate_tokens(prompt) <= 600
+    assert "求半径为5的圆的面积" in prompt and "S = πr^2" in prompt and "25π" in prompt
+    assert prompt == manager.get_question_generation_prompt(["数学"], "计算题", "求半径为5的圆的面积", LONG_CHAIN, "25π")
+    
+    # 预算为 0 时不压缩
+    assert LONG_CHAIN in manager.get_tagging_prompt("求半径为5的圆的面积", LONG_CHAIN, "25π")
+    
+    stats = PromptManager.get_token_stats()["generation"]
+    previous = before.get("generation", {"prompts": 0, "compacted": 0, "original_tokens": 0, "tokens": 0})
+    assert stats["prompts"] - previous["prompts"] == 2
+    assert stats["compacted"] - previous["compacted"] == 2
+    assert stats["original_tokens"] - previous["original_tokens"] > stats["tokens"] - previous["tokens"]
+    
+    # 未配置预算时默认不压缩
+    with mock.patch.dict(os.environ):
+        for name in PromptManager.DEFAULT_TOKEN_BUDGETS:
+            os.environ.pop(f"PROMPT_TOKEN_BUDGET_{name.upper()}", None)
+        default_manager = PromptManager()
+    assert LONG_CHAIN in default_manager.get_question_generation_prompt(["数学"], "计算题", "求半径为5的圆的面积", LONG_CHAIN, "25π")
+    print("✅ 提示词预算测试通过!")
+
+
+def test_static_prefix_first():
+    """测试模板的全部静态说明都位于第一个变量之前，便于提供方复用提示词前缀缓存"""
+    for template in (TAGGING_PROMPT, QUESTION_GENERATION_PROMPT, SOLUTION_PROMPT, VERIFICATION_PROMPT):
+        first_field = re.search(r"(?<!\{)\{[a-z_]+\}", template).start()
+        assert "只返回JSON" in template[:first_field]
+        assert first_field > len(template) * 0.75
+    
+    manager = PromptManager()
+    prompts = [manager.get_solution_prompt(["数学"], "计算题", question) for question in ("求 1+1", "证明勾股定理")]
+    prompts.append(manager.get_solution_prompt(["物理"], "简答题", "解释牛顿第一定律"))
+    prefix = os.path.commonprefix(prompts)
+    assert prefix.endswith("领域标签：")
+    
+    # 生成模板的示例不写死具体题型，避免把生成的问题引向某一种题型
+    static_part = QUESTION_GENERATION_PROMPT[:QUESTION_GENERATION_PROMPT.index("## 原题")]
+    assert not any(question_type in static_part for question_type in ("计算题", "证明题", "简答题"))
+    print("✅ 静态前缀测试通过!")
+
+
+if __name__ == "__main__":
+    test_compact_text()
+    test_prompt_budget()
+    test_static_prefix_first()
@@ -0,0 +1,154 @@
+"""
+用假时钟确定性地测试令牌桶限流器：补充速率、TPM 记账、settle 校正与排队顺序
+"""
+
+import asyncio
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.utils.rate_limiter import RateLimiter, TokenBucket
+
+
+class FakeClock:
+    """手动推进的时钟；sleep 直接把时间往前拨"""
+    
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self):
+        return self.now
+    
+    def sleep(self, seconds):
+        self.now += seconds
+    
+    async def async_sleep(self, seconds):
+        self.now += seconds
+        await asyncio.sleep(0)
+
+
+def _limiter(rpm=0, tpm=0):
+    clock = FakeClock()
+    limiter = RateLimiter(rpm=rpm, tpm=tpm, clock=clock, sleep=clock.sleep, async_sleep=clock.async_sleep)
+    return limiter, clock
+
+
+def test_token_bucket_refill():
+    """测试令牌按分钟额度匀速补充且不超过容量"""
+    bucket = TokenBucket(60, now=0.0)
+    bucket.tokens = 0
+    bucket.refill(10.0)
+    assert bucket.tokens == 10
+    assert bucket.wait_time(15) == 5.0
+    bucket.refill(1000.0)
+    assert bucket.tokens == 60 and bucket.wait_time(60) == 0.0
+    assert TokenBucket(0, now=0.0).unlimited
+    print("✅ 令牌桶补充测试通过!")
+
+
+def test_tpm_accounting_and_settle():
+    """测试 TPM 扣减、超额请求按容量计，以及 settle 退还/补扣"""
+    limiter, clock = _limiter(tpm=600)
+    assert limiter.acquire(400) == 0.0
+    assert limiter.current_wait_time(300) == 10.0
+    
+    # 实际只用了 100，退还多预留的 300
+    limiter.settle(400, 100)
+    assert limiter.current_wait_time(500) == 0.0
+    # 实际用了 700，补扣少预留的 200
+    limiter.settle(100, 300)
+    assert limiter._tokens.tokens == 300
+    
+    # 估算量超过桶容量时按容量计，等桶满即可通过
+    waited = limiter.acquire(10000)
+    assert waited == 30.0 and clock.now == 30.0
+    assert limiter.total_wait_seconds == 30.0
+    print("✅ TPM 记账测试通过!")
+
+
+def test_queue_depth_counts_blocked_only():
+    """测试 queue_depth 只统计真正排队的调用"""
+    limiter, clock = _limiter(rpm=60)
+    depths = []
+    
+    def sleep(seconds):
+        # 记录睡眠时的排队深度
+        depths.append(limiter.queue_depth)
+        clock.sleep(seconds)
+    
+    limiter._sleep = sleep
+    
+    for _ in range(60):
+        assert limiter.acquire() == 0.0
+    assert limiter.queue_depth == 0 and not depths
+    
+    assert limiter.acquire() == 1.0
+    assert depths == [1] and limiter.queue_depth == 0
+    assert limiter.stats()["total_wait_seconds"] == 1.0
+    print("✅ 排队深度测试通过!")
+
+
+def test_fifo_large_request_not_starved():
+    """测试额度不足时按到达顺序放行：大请求不会被后到的小请求饿死"""
+    limiter, clock = _limiter(tpm=600)
+    assert limiter.acquire(600) == 0.0
+    order = []
+    
+    async def request(name, tokens):
+        await limiter.aacquire(tokens)
+        order.append((name, clock.now))
+    
+    async def main():
+        tasks = [asyncio.ensure_future(request("large", 600))]
+        await asyncio.sleep(0)
+        tasks += [asyncio.ensure_future(request(f"small{i}", 10)) for i in range(5)]
+        await asyncio.gather(*tasks)
+    
+    asyncio.run(main())
+    assert [name for name, _ in order] == ["large", "small0", "small1", "small2", "small3", "small4"]
+    assert order[0][1] >= 60.0
+    assert limiter.queue_depth == 0
+    print("✅ 先到先得测试通过!")
+
+
+def test_cancelled_waiter_leaves_queue():
+    """测试排队中的协程被取消后让出队位，后面的调用方不受影响"""
+    limiter, clock = _limiter(rpm=60)
+    for _ in range(60):
+        limiter.acquire()
+    
+    async def main():
+        task = asyncio.ensure_future(limiter.aacquire())
+        await asyncio.sleep(0)
+        assert limiter.queue_depth == 1
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        assert limiter.queue_depth == 0
+        return await limiter.aacquire()
+    
+    # 被取消的协程已经睡过 1 秒，补充的额度留给下一个调用方
+    assert asyncio.run(main()) == 0.0
+    assert limiter.queue_depth == 0 and clock.now == 1.0
+    print("✅ 取消排队测试通过!")
+
+
+def test_disabled_limiter():
+    """测试未配置额度时不限流"""
+    limiter, clock = _limiter()
+    assert not limiter.enabled
+    for _ in range(1000):
+        assert limiter.acquire(10 ** 6) == 0.0
+    assert clock.now == 0.0
+    print("✅ 不限流测试通过!")
+
+
+if __name__ == "__main__":
+    test_token_bucket_refill()
+    test_tpm_accounting_and_settle()
+    test_queue_depth_counts_blocked_only()
+    test_fifo_large_request_not_starved()
+    test_cancelled_waiter_leaves_queue()
+    test_disabled_limiter()
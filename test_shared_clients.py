@@ -0,0 +1,132 @@
+"""
+测试进程内共享的LLM客户端、连接池与数据库管理器
+"""
+
+import asyncio
+import gc
+import os
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.database.db_manager import DatabaseManager, get_db_manager
+from src.utils import llm_client as llm_client_module
+from src.utils.llm_client import (
+    aclose_async_openai_clients, get_async_llm_client, get_async_openai_client, get_llm_client, get_openai_client
+)
+from src.workflow import QuestionGenerationWorkflow
+
+# 测试期间使用假密钥并关闭响应缓存（只在各测试运行期间生效，不影响同一进程中的其他测试）
+TEST_ENV = {"OPENAI_API_KEY": "test-key", "LLM_CACHE_ENABLED": "false"}
+
+
+@mock.patch.dict(os.environ, TEST_ENV)
+def test_sync_client_shared():
+    """测试同步客户端与 openai 连接池在进程内只创建一次"""
+    client = get_llm_client()
+    assert get_llm_client() is client
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        assert all(c is client for c in executor.map(lambda _: get_llm_client(), range(16)))
+    
+    assert client.client is get_openai_client(client.api_key, client.base_url)
+    assert get_openai_client("key", "http://a/v1") is get_openai_client("key", "http://a/v1")
+    assert get_openai_client("key", "http://a/v1") is not get_openai_client("key", "http://b/v1")
+    print("✅ 同步客户端共享测试通过!")
+
+
+@mock.patch.dict(os.environ, TEST_ENV)
+def test_async_client_per_loop():
+    """测试异步连接池按事件循环分别共享：同一循环内复用，跨循环各自创建，循环收尾时关闭并释放"""
+    async_client = get_async_llm_client()
+    assert get_async_llm_client() is async_client
+    
+    async def get_twice():
+        first = async_client.client
+        assert first is async_client.client
+        assert first is get_async_openai_client(async_client.api_key, async_client.base_url)
+        return first, asyncio.get_running_loop()
+    
+    first, first_loop = asyncio.run(get_twice())
+    second, second_loop = asyncio.run(get_twice())
+    assert first_loop is not second_loop
+    assert first is not second
+    
+    # asyncio.run 收尾时关闭本循环创建的客户端
+    assert first.is_closed() and second.is_closed()
+    registry = llm_client_module._async_openai_clients
+    assert first_loop not in registry and second_loop not in registry
+    assert not llm_client_module._async_close_tasks
+    del first, second, first_loop, second_loop
+    gc.collect()
+    assert len(registry) == 0
+    
+    # 自行管理的事件循环在关闭前显式关闭客户端
+    async def get_and_close():
+        client = get_async_openai_client(async_client.api_key, async_client.base_url)
+        await aclose_async_openai_clients()
+        assert client.is_closed() and asyncio.get_running_loop() not in registry
+        assert get_async_openai_client(async_client.api_key, async_client.base_url) is not client
+        await aclose_async_openai_clients()
+    
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(get_and_close())
+    finally:
+        loop.close()
+    assert not llm_client_module._async_close_tasks
+    
+    # 事件循环之外无法获取异步连接池
+    try:
+        get_async_openai_client("key", "http://a/v1")
+        assert False, "应当抛出异常"
+    except RuntimeError:
+        pass
+    print("✅ 异步连接池按事件循环共享测试通过!")
+
+
+@mock.patch.dict(os.environ, TEST_ENV)
+def test_db_manager_shared():
+    """测试同一数据库路径共用一个数据库管理器，不同路径各自独立"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "questions.db")
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            managers = list(executor.map(lambda _: get_db_manager(path), range(16)))
+        assert all(m is managers[0] for m in managers)
+        other = get_db_manager(os.path.join(tmp_dir, "other.db"))
+        assert other is not managers[0]
+        managers[0].close()
+        other.close()
+    print("✅ 数据库管理器共享测试通过!")
+
+
+@mock.patch.dict(os.environ, TEST_ENV)
+def test_agents_share_client_and_pool():
+    """测试所有代理与多个工作流共用同一个LLM客户端、连接池与统计计数"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_manager = DatabaseManager(os.path.join(tmp_dir, "questions.db"))
+        with mock.patch("src.agents.question_agents.get_db_manager", return_value=db_manager), \
+                mock.patch("src.workflow.get_db_manager", return_value=db_manager):
+            workflows = [QuestionGenerationWorkflow(), QuestionGenerationWorkflow()]
+        agents = [agent for workflow in workflows for agent in (
+            workflow.tagging_agent, workflow.generation_agent, workflow.solving_agent, workflow.verification_agent
+        )]
+        assert all(agent.llm_client is get_llm_client() for agent in agents)
+        assert all(agent.async_llm_client is get_async_llm_client() for agent in agents)
+        # 各代理使用同一个 openai 客户端，即同一个HTTP连接池
+        assert len({id(agent.llm_client.client) for agent in agents}) == 1
+        db_manager.close()
+    
+    with mock.patch.dict(os.environ, {"LLM_POOL_MAX_CONNECTIONS": "7", "LLM_POOL_MAX_KEEPALIVE": "3",
+                                      "LLM_KEEPALIVE_EXPIRY": "5"}):
+        limits = llm_client_module._connection_limits()
+    assert (limits.max_connections, limits.max_keepalive_connections, limits.keepalive_expiry) == (7, 3, 5.0)
+    print("✅ 代理共享客户端测试通过!")
+
+
+if __name__ == "__main__":
+    test_sync_client_shared()
+    test_async_client_per_loop()
+    test_db_manager_shared()
+    test_agents_share_client_and_pool()
@@ -0,0 +1,348 @@
+"""
+用模拟的LLM客户端端到端测试问题生成工作流（不访问网络）
+"""
+
+import asyncio
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from unittest import mock
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from src.agents.question_agents import _PartialSolutionBuffer
+from src.database.db_manager import DatabaseManager
+from src.utils.llm_client import BaseLLMClient
+from src.workflow import QuestionGenerationWorkflow
+
+# 测试期间使用假密钥并关闭响应缓存（只在各测试运行期间生效，不影响同一进程中的其他测试）
+TEST_ENV = {"OPENAI_API_KEY": "test-key", "LLM_CACHE_ENABLED": "false"}
+
+SEED = ("一个圆的半径是5cm，求这个圆的面积。", "S = πr² = 25π", "25π cm²")
+GENERATED = [f"第{i}题：一个圆的半径是{i + 2}cm，求这个圆的周长与面积。" for i in range(5)]
+_INDEX_RE = re.compile(r"第(\d+)题")
+
+
+class FakeLLMClient(BaseLLMClient):
+    """按调用方标签返回固定响应的同步客户端，记录每次调用的标签"""
+    
+    def __init__(self, questions=GENERATED, fail_solving=(), break_solving=(), chunk_size=7, solve_delay=0.0,
+                 fail_verification=()):
+        super().__init__()
+        self.questions = list(questions)
+        self.fail_verification = set(fail_verification)
+        # 解答第 i 题前等待 (题数 - i) * solve_delay 秒，使后面的题目先完成
+        self.solve_delay = solve_delay
+        self.fail_solving = set(fail_solving)
+        # 流式解答这些题目时只产出一半的增量文本就中断
+        self.break_solving = set(break_solving)
+        self.chunk_size = chunk_size
+        self.calls = []
+    
+    def respond(self, messages, agent):
+        self.calls.append(agent)
+        prompt = messages[-1]["content"]
+        if agent == "tagging":
+            return json.dumps({"domain_tags": ["数学", "几何"], "question_type": "计算题"}, ensure_ascii=False)
+        if agent == "generation":
+            # 模型填写的题型与原题不同：保留模型的值，只输出提示
+            questions = [{"question": q, "question_type": "证明题"} for q in self.questions]
+            return json.dumps({"questions": questions}, ensure_ascii=False)
+        # 解答与检查提示词以问题结尾，从中取出题号
+        index = int(_INDEX_RE.findall(prompt)[-1])
+        if agent == "solving" and index in self.fail_solving:
+            raise RuntimeError(f"模拟第{index}题解答失败")
+        if agent == "solving":
+            return json.dumps({"thinking_chain": f"解答第{index}题", "answer": f"答案{index}"}, ensure_ascii=False)
+        if index in self.fail_verification:
+            raise RuntimeError(f"模拟第{index}题检查失败")
+        return json.dumps({"score": 90, "passed": True, "feedback": "正确"}, ensure_ascii=False)
+    
+    def delay(self, messages, agent):
+        if agent != "solving" or not self.solve_delay:
+            return 0.0
+        index = int(_INDEX_RE.findall(messages[-1]["content"])[-1])
+        return (len(self.questions) - index) * self.solve_delay
+    
+    def chunks(self, messages, agent):
+        """把响应切成小段增量文本，返回 (增量列表, 是否在产出后中断)"""
+        response = self.respond(messages, agent)
+        deltas = [response[i:i + self.chunk_size] for i in range(0, len(response), self.chunk_size)]
+        broken = agent == "solving" and int(_INDEX_RE.findall(messages[-1]["content"])[-1]) in self.break_solving
+        return (deltas[:len(deltas) // 2] if broken else deltas), broken
+    
+    def chat_completion(self, messages, temperature=0.7, use_cache=True, json_mode=False, agent=None,
+                        response_model=None):
+        time.sleep(self.delay(messages, agent))
+        return self.respond(messages, agent)
+    
+    def stream_chat_completion(self, messages, temperature=0.7, on_delta=None, on_retry=None, use_cache=True,
+                               json_mode=False, agent=None, response_model=None):
+        deltas, broken = self.chunks(messages, agent)
+        for delta in deltas:
+            on_delta(delta)
+        if broken:
+            raise RuntimeError("模拟流式响应中断")
+        return "".join(deltas)
+
+
+class FakeAsyncLLMClient(FakeLLMClient):
+    """FakeLLMClient 的异步版本"""
+    
+    async def chat_completion(self, messages, temperature=0.7, use_cache=True, json_mode=False, agent=None,
+                              response_model=None):
+        await asyncio.sleep(self.delay(messages, agent))
+        return self.respond(messages, agent)
+    
+    async def stream_chat_completion(self, messages, temperature=0.7, on_delta=None, on_retry=None,
+                                     use_cache=True, json_mode=False, agent=None, response_model=None):
+        deltas, broken = self.chunks(messages, agent)
+        for delta in deltas:
+            result = on_delta(delta)
+            if asyncio.iscoroutine(result):
+                await result
+        if broken:
+            raise RuntimeError("模拟流式响应中断")
+        return "".join(deltas)
+
+
+def make_workflow(db_manager, fan_out=False, llm_client=None, async_llm_client=None):
+    """创建使用模拟客户端与指定数据库的工作流"""
+    llm_client = llm_client or FakeLLMClient()
+    async_llm_client = async_llm_client or FakeAsyncLLMClient()
+    with mock.patch("src.agents.question_agents.get_llm_client", return_value=llm_client), \
+            mock.patch("src.agents.question_agents.get_async_llm_client", return_value=async_llm_client), \
+            mock.patch("src.agents.question_agents.get_db_manager", return_value=db_manager), \
+            mock.patch("src.workflow.get_db_manager", return_value=db_manager):
+        return QuestionGenerationWorkflow(fan_out=fan_out)
+
+
+@mock.patch.dict(os.environ, TEST_ENV)
+def test_history_duplicates_fail():
+    """测试历史去重：默认关闭；开启时生成的问题全部重复则本次运行记为失败"""
+    print("🧪 测试历史近似重复")
+    print("=" * 50)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_manager = DatabaseManager(os.path.join(tmp_dir, "questions.db"))
+        workflow = make_workflow(db_manager)
+        assert not workflow.generation_agent.dedup_history
+        
+        # 同一种子重跑（响应缓存会返回相同的生成结果）：默认仍然解答全部问题
+        for _ in range(2):
+            state = workflow.run(*SEED)
+            assert not state.error and len(state.solutions) == 5
+        
+        workflow.generation_agent.dedup_history = True
+        state = workflow.run(*SEED)
+        assert state.error and "近似重复" in state.error
+        assert state.duplicates_removed == 5 and not state.solutions
+        assert "error" in workflow.get_results(state)
+        db_manager.close()
+    print("✅ 历史近似重复测试通过!")
+
+
+@mock.patch.dict(os.environ, TEST_ENV)
+def test_failed_solve_keeps_completed():
+    """测试解答阶段有题目失败时，同一阶段已完成的解答仍然入库（同步与异步）"""
+    print("🧪 测试解答失败时保留已完成的解答")
+    print("=" * 50)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_manager = DatabaseManager(os.path.join(tmp_dir, "questions.db"))
+        workflow = make_workflow(
+            db_manager, llm_client=FakeLLMClient(fail_solving={2}), async_llm_client=FakeAsyncLLMClient(fail_solving={2})
+        )
+        for run in (workflow.run, lambda *seed: asyncio.run(workflow.arun(*seed))):
+            before = db_manager.count_solutions()
+            state = run(*SEED)
+            assert state.error and "第2题" in state.error
+            answers = sorted(row[4] for row in db_manager.iter_solution_rows() if row[0] > before)
+            assert answers == ["答案0", "答案1", "答案3", "答案4"]
+        
+        # 单线程逐题解答时保留失败之前完成的解答
+        workflow.solving_agent.max_workers = 1
+        before = db_manager.count_solutions()
+        assert workflow.run(*SEED).error
+        assert sorted(row[4] for row in db_manager.iter_solution_rows() if row[0] > before) == ["答案0", "答案1"]
+        db_manager.close()
+    print("✅ 解答失败保留测试通过!")
+
+
+@mock.patch.dict(os.environ, TEST_ENV)
+def test_failed_verification_keeps_completed():
+    """测试检查阶段有题目失败时，其余题目的检查结果仍然写入数据库（同步与异步）"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_manager = DatabaseManager(os.path.join(tmp_dir, "questions.db"))
+        workflow = make_workflow(
+            db_manager, llm_client=FakeLLMClient(fail_verification={3}),
+            async_llm_client=FakeAsyncLLMClient(fail_verification={3})
+        )
+        for run in (workflow.run, lambda *seed: asyncio.run(workflow.arun(*seed))):
+            before = db_manager.count_solutions()
+            state = run(*SEED)
+            assert state.error and "第3题" in state.error
+            scores = {
+                row[4]: db_manager.get_question_solutions(row[1])[0].verification_score
+                for row in db_manager.iter_solution_rows() if row[0] > before
+            }
+            assert scores == {"答案0": 90, "答案1": 90, "答案2": 90, "答案3": None, "答案4": 90}
+        db_manager.close()
+    print("✅ 检查失败保留测试通过!")
+
+
+def _assert_in_question_order(state, db_manager):
+    """检查解答与检查结果按生成顺序排列、数量与入库记录一致"""
+    assert not state.error, state.error
+    assert [solution.answer for solution in state.solutions] == [f"答案{i}" for i in range(5)]
+    assert [solution.question_id for solution in state.solutions] == [q.id for q in state.generated_questions]
+    assert len(state.verification_results) == 5
+    assert all(question.question_type == "证明题" for question in state.generated_questions)
+    assert all(solution.verification_passed for solution in state.solutions)
+    assert db_manager.count_solutions() == 5
+
+
+@mock.patch.dict(os.environ, TEST_ENV)
+def test_fan_out_order_and_counts():
+    """测试扇出开关两种模式：分支乱序完成时结果仍按问题顺序汇总，reducer 不重复累加"""
+    print("🧪 测试扇出分支汇总")
+    print("=" * 50)
+    
+    for fan_out in (False, True):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_manager = DatabaseManager(os.path.join(tmp_dir, "questions.db"))
+            llm_client = FakeLLMClient(solve_delay=0.02)
+            workflow = make_workflow(db_manager, fan_out=fan_out, llm_client=llm_client)
+            assert workflow.fan_out is fan_out
+            
+            state = workflow.run(*SEED)
+            _assert_in_question_order(state, db_manager)
+            assert llm_client.calls.count("solving") == 5 and llm_client.calls.count("verification") == 5
+            assert len(state.branch_results) == (5 if fan_out else 0)
+            db_manager.close()
+    print("✅ 扇出分支汇总测试通过!")
+
+
+@mock.patch.dict(os.environ, TEST_ENV)
+def test_async_run_end_to_end():
+    """测试 arun 端到端：全程走异步客户端，结果与同步运行一致，同一事件循环可并发运行多个工作流"""
+    print("🧪 测试异步工作流")
+    print("=" * 50)
+    
+    for fan_out in (False, True):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            db_manager = DatabaseManager(os.path.join(tmp_dir, "questions.db"))
+            llm_client = FakeLLMClient()
+            async_llm_client = FakeAsyncLLMClient(solve_delay=0.02)
+            workflow = make_workflow(db_manager, fan_out=fan_out, llm_client=llm_client,
+                                     async_llm_client=async_llm_client)
+            
+            state = asyncio.run(workflow.arun(*SEED))
+            _assert_in_question_order(state, db_manager)
+            assert state.current_step == "verified"
+            assert not llm_client.calls
+            assert sorted(set(async_llm_client.calls)) == ["generation", "solving", "tagging", "verification"]
+            
+            async def run_concurrently():
+                return await asyncio.gather(workflow.arun(*SEED), workflow.arun(*SEED))
+            
+            states = asyncio.run(run_concurrently())
+            assert all(not s.error and len(s.solutions) == 5 for s in states)
+            assert db_manager.count_solutions() == 15
+            db_manager.close()
+    print("✅ 异步工作流测试通过!")
+
+
+@mock.patch.dict(os.environ, TEST_ENV)
+def test_repeated_seed_reuses_tags():
+    """测试同一种子问题（仅空白或全角/半角不同）再次运行时复用已保存的标签，不再调用LLM"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_manager = DatabaseManager(os.path.join(tmp_dir, "questions.db"))
+        llm_client = FakeLLMClient()
+        async_llm_client = FakeAsyncLLMClient()
+        workflow = make_workflow(db_manager, llm_client=llm_client, async_llm_client=async_llm_client)
+        
+        assert not workflow.run(*SEED).error
+        assert llm_client.calls.count("tagging") == 1
+        
+        variant = ("  一个圆的半径是５cm，求这个圆的面积。\n", SEED[1].replace(" ", "  "), SEED[2])
+        state = workflow.run(*variant)
+        assert not state.error and llm_client.calls.count("tagging") == 1
+        assert state.tagged_question.domain_tags == ["数学", "几何"]
+        assert state.tagged_question.question == variant[0]
+        state = asyncio.run(workflow.arun(*variant))
+        assert not state.error and "tagging" not in async_llm_client.calls
+        
+        # 内容不同的种子问题仍然调用LLM打标签
+        assert not workflow.run("一个正方形的边长是3cm，求面积。", "S = a²", "9 cm²").error
+        assert llm_client.calls.count("tagging") == 2
+        db_manager.close()
+    print("✅ 标签复用测试通过!")
+
+
+@mock.patch.dict(os.environ, TEST_ENV)
+def test_partial_solution_buffer():
+    """测试流式解答缓冲：分段增量拼成完整的思维链与答案，按间隔节流，重试时清空"""
+    text = json.dumps({"thinking_chain": "第一步：r=5\n第二步：S=πr²", "answer": "25π"}, ensure_ascii=False)
+    buffer = _PartialSolutionBuffer(flush_interval=0)
+    snapshots = [buffer.feed(text[i:i + 4]) for i in range(0, len(text), 4)]
+    assert all(snapshot is not None for snapshot in snapshots)
+    assert snapshots[-1] == ("第一步：r=5\n第二步：S=πr²", "25π")
+    # 快照只会增长：每次写入的内容都是最终内容的前缀
+    assert all(s[0] == snapshots[-1][0][:len(s[0])] for s in snapshots)
+    
+    throttled = _PartialSolutionBuffer(flush_interval=3600)
+    assert all(throttled.feed(text[i:i + 4]) is None for i in range(0, len(text), 4))
+    assert throttled.snapshot() == snapshots[-1]
+    throttled.reset()
+    assert throttled.snapshot() == ("", "")
+    print("✅ 流式解答缓冲测试通过!")
+
+
+@mock.patch.dict(os.environ, TEST_ENV)
+def test_streaming_solve_persists():
+    """测试流式解答：过程中写入部分思维链，完成后覆盖为完整解答；中断时保留已收到的部分（同步与异步）"""
+    print("🧪 测试流式解答入库")
+    print("=" * 50)
+    
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_manager = DatabaseManager(os.path.join(tmp_dir, "questions.db"))
+        workflow = make_workflow(
+            db_manager,
+            llm_client=FakeLLMClient(fail_solving={4}, break_solving={2}),
+            async_llm_client=FakeAsyncLLMClient(fail_solving={4}, break_solving={2})
+        )
+        workflow.solving_agent.streaming = True
+        workflow.solving_agent.stream_flush_interval = 0
+        
+        for run in (workflow.run, lambda *seed: asyncio.run(workflow.arun(*seed))):
+            before = db_manager.count_solutions()
+            with mock.patch.object(db_manager, "update_solution_content",
+                                   wraps=db_manager.update_solution_content) as update:
+                state = run(*SEED)
+            assert state.error
+            
+            rows = {row[4]: row[3] for row in db_manager.iter_solution_rows() if row[0] > before}
+            # 第4题在收到任何内容前失败，占位记录被删除；第2题中断，保留已收到的部分思维链（答案为空）
+            assert sorted(rows) == ["", "答案0", "答案1", "答案3"]
+            assert all(rows[f"答案{i}"] == f"解答第{i}题" for i in (0, 1, 3))
+            assert rows[""] and "解答第2题".startswith(rows[""])
+            
+            # 完成前按增量写入过部分内容
+            written = [call.args[1] for call in update.call_args_list]
+            assert any(text and text != "解答第0题" and "解答第0题".startswith(text) for text in written)
+        db_manager.close()
+    print("✅ 流式解答入库测试通过!")
+
+
+if __name__ == "__main__":
+    test_history_duplicates_fail()
+    test_fan_out_order_and_counts()
+    test_async_run_end_to_end()
+    test_repeated_seed_reuses_tags()
+    test_failed_solve_keeps_completed()
+    test_failed_verification_keeps_completed()
+    test_partial_solution_buffer()
+    test_streaming_solve_persists()